@@ -264,9 +264,14 @@ doctype_js = {
 }
 doctype_list_js = {
     "Sales Invoice": "public/js/bulk_submit.js",         
-    "Purchase Invoice": "public/js/bulk_submit_pur.js"
+    "Purchase Invoice": "public/js/bulk_submit_pur.js",
+    "Customer": "public/js/customer_list.js"
 }
 doc_events = {
+    "Company": {
+        "on_update": "uae_erpgulf.uae_erpgulf.credentials.invalidate_credentials",
+        "on_trash": "uae_erpgulf.uae_erpgulf.credentials.invalidate_credentials"
+    },
     "Sales Invoice": {
         "on_submit": "uae_erpgulf.uae_erpgulf.test.generate_and_send_einvoice",
         "before_submit": "uae_erpgulf.uae_erpgulf.validation.validate_accredited_service_provider"
@@ -274,6 +279,21 @@ doc_events = {
     "Purchase Invoice": {
         "on_submit": "uae_erpgulf.uae_erpgulf.send_purchase.generate_and_send_einvoice",
         "before_submit": "uae_erpgulf.uae_erpgulf.validation.validate_accredited_service_provider"
+    },
+    "Item Tax Template": {
+        "on_update": "uae_erpgulf.uae_erpgulf.master_cache.invalidate_master_data",
+        "on_trash": "uae_erpgulf.uae_erpgulf.master_cache.invalidate_master_data",
+        "after_rename": "uae_erpgulf.uae_erpgulf.master_cache.invalidate_master_data"
+    },
+    "Mode of Payment": {
+        "on_update": "uae_erpgulf.uae_erpgulf.master_cache.invalidate_master_data",
+        "on_trash": "uae_erpgulf.uae_erpgulf.master_cache.invalidate_master_data",
+        "after_rename": "uae_erpgulf.uae_erpgulf.master_cache.invalidate_master_data"
+    },
+    "Account": {
+        "on_update": "uae_erpgulf.uae_erpgulf.master_cache.invalidate_master_data",
+        "on_trash": "uae_erpgulf.uae_erpgulf.master_cache.invalidate_master_data",
+        "after_rename": "uae_erpgulf.uae_erpgulf.master_cache.invalidate_master_data"
     }
 }
 fixtures = [
@@ -287,9 +307,15 @@ fixtures = [
 scheduler_events = {
     "cron": {
          "* * * * *": [
-            "uae_erpgulf.uae_erpgulf.webhook.update_webhook_logs"
+            "uae_erpgulf.uae_erpgulf.webhook.update_webhook_logs",
+            "uae_erpgulf.uae_erpgulf.spool.drain_spool",
+            "uae_erpgulf.uae_erpgulf.outbox.dispatch_outbox",
+            "uae_erpgulf.uae_erpgulf.token_cache.prewarm_tokens"
         ]
-    }
+    },
+    "hourly": [
+        "uae_erpgulf.uae_erpgulf.metrics.rollup_metrics"
+    ]
 }
 
 import uae_erpgulf.overrides.return_validation
\ No newline at end of file
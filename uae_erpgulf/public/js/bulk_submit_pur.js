@@ -87,5 +87,83 @@ extend_listview_event("Purchase Invoice", "onload", function (listview) {
         }
     );
 
+    listview.page.add_action_item(
+        __("Validate for UAE E-Invoice"),
+        function () {
+
+            const selected = listview.get_checked_items();
+
+            if (!selected.length) {
+                frappe.msgprint(__('Please select at least one invoice.'));
+                return;
+            }
+
+            frappe.call({
+                method: "uae_erpgulf.uae_erpgulf.rules.validate_invoices",
+                args: {
+                    names: selected.map(d => d.name),
+                    doctype: "Purchase Invoice"
+                },
+                freeze: true,
+                freeze_message: __("Validating Invoices..."),
+
+                callback: function (r) {
+
+                    if (!r.message) {
+                        frappe.msgprint(__('Server did not return a response.'));
+                        return;
+                    }
+
+                    let msg = "<b>" + __("Valid") + ":</b> " + r.message.valid.length +
+                        " / " + r.message.checked + "<br><br>";
+
+                    Object.keys(r.message.invalid).forEach(name => {
+                        msg += "<b>" + name + "</b><br>" +
+                            r.message.invalid[name].join("<br>") + "<br><br>";
+                    });
+
+                    frappe.msgprint(msg, __("UAE E-Invoice Validation"));
+                }
+            });
+
+        }
+    );
+
+    listview.page.add_action_item(
+        __("Refresh UAE E-Invoice Status, XML and PDF"),
+        function () {
+
+            const selected = listview.get_checked_items();
+
+            if (!selected.length) {
+                frappe.msgprint(__('Please select at least one invoice.'));
+                return;
+            }
+
+            frappe.call({
+                method: "uae_erpgulf.uae_erpgulf.flick_bulk.refresh_documents",
+                args: {
+                    names: selected.map(d => d.name),
+                    doctype: "Purchase Invoice"
+                },
+
+                callback: function (r) {
+
+                    if (!r.message) {
+                        frappe.msgprint(__('Server did not return a response.'));
+                        return;
+                    }
+
+                    frappe.show_alert({
+                        message: __("Refresh queued for {0} invoice(s)", [r.message.queued]),
+                        indicator: "blue"
+                    });
+                    listview.check_all(false);
+                }
+            });
+
+        }
+    );
+
     console.log('Custom "Send Invoices to FTA Submission" action added.');
 });
\ No newline at end of file
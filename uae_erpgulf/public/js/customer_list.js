@@ -0,0 +1,52 @@
+// Utility function to extend existing listview events
+function extend_listview_event(doctype, event, callback) {
+
+    if (!frappe.listview_settings[doctype]) {
+        frappe.listview_settings[doctype] = {};
+    }
+
+    const old_event = frappe.listview_settings[doctype][event];
+
+    frappe.listview_settings[doctype][event] = function (listview) {
+
+        if (old_event) {
+            old_event(listview);
+        }
+
+        callback(listview);
+    };
+}
+
+
+// Verify the PEPPOL IDs of the selected customers in the background
+extend_listview_event("Customer", "onload", function (listview) {
+
+    listview.page.add_action_item(
+        __("Verify PEPPOL IDs"),
+        function () {
+
+            const selected = listview.get_checked_items();
+
+            if (!selected.length) {
+                frappe.msgprint(__('Please select at least one Customer.'));
+                return;
+            }
+
+            frappe.call({
+                method: "uae_erpgulf.uae_erpgulf.peppol.verify_peppol_ids",
+                args: {
+                    customers: selected.map(d => d.name),
+                    refresh: 1
+                },
+                callback: function (r) {
+                    if (r.message) {
+                        frappe.show_alert({
+                            message: __("Verification of {0} PEPPOL IDs queued", [r.message.queued]),
+                            indicator: "blue"
+                        });
+                    }
+                }
+            });
+        }
+    );
+});
@@ -147,4 +147,27 @@ function toggle_return_against_field(frm) {
             !show_field
         );
     });
-}
\ No newline at end of file
+}
+
+// Status pushed by the background submission job (uae_erpgulf/submission.py)
+frappe.ui.form.on("Sales Invoice", {
+    onload(frm) {
+        if (frm.uae_einvoice_status_listener) {
+            return;
+        }
+        frm.uae_einvoice_status_listener = true;
+
+        frappe.realtime.on("uae_einvoice_status", (data) => {
+            if (data.doctype !== frm.doctype || data.name !== frm.doc.name) {
+                return;
+            }
+            frappe.show_alert({
+                message: __("UAE E-Invoice {0}: {1}", [data.name, data.status || __("Not Submitted")]),
+                indicator: data.status === "Success" ? "green" : "orange"
+            });
+            if (!frm.is_dirty()) {
+                frm.reload_doc();
+            }
+        });
+    }
+});
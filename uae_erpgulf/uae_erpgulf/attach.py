@@ -1,84 +1,153 @@
 import frappe
-import json
-import requests
+import hashlib
+import os
+import tempfile
+from collections import namedtuple
 from frappe import _
-from uae_erpgulf.uae_erpgulf.verify_token import get_valid_flick_token
-from frappe.utils.file_manager import save_file
+from frappe.utils import cint, get_files_path
+from uae_erpgulf.uae_erpgulf.flick_client import FlickClient
+from uae_erpgulf.uae_erpgulf.serialization import load_stored
+
+
+CHUNK_SIZE = 64 * 1024
+DEFAULT_MAX_ARTIFACT_SIZE = 50 * 1024 * 1024  # bytes; site config uae_flick_max_artifact_size
+# kind: (invoice field holding the File URL, file name pattern)
+ARTIFACTS = {
+    "xml": ("custom_document_xml", "Submitted-XML-file {0}.xml"),
+    "pdf": ("custom_document_pdf", "Submitted-PDF-file {0}.pdf"),
+}
+
+StreamedFile = namedtuple("StreamedFile", ["path", "size", "content_hash"])
+
+
+def get_document_id(doc):
+    """Flick document id from the invoice's stored submit response."""
+    if not doc.custom_submit_response:
+        frappe.throw(_("Submit response not found in Invoice"))
+
+    response_data = load_stored(doc.custom_submit_response)
+    document_id = response_data.get("data", {}).get("id")
+    if not document_id:
+        frappe.throw(_("Document ID not found in submit response"))
+    return document_id
+
+
+class ArtifactTooLarge(frappe.ValidationError):
+    """The XML / PDF is larger than uae_flick_max_artifact_size; nothing was stored."""
+
+
+def get_max_artifact_size():
+    """Largest XML / PDF accepted from Flick, in bytes."""
+    return cint(frappe.conf.get("uae_flick_max_artifact_size")) or DEFAULT_MAX_ARTIFACT_SIZE
+
+
+def get_private_files_dir():
+    return os.path.abspath(get_files_path(is_private=True))
+
+
+def stream_to_file(response, directory, max_size):
+    """
+    Writes a streamed response body in chunks to a temporary file in directory,
+    hashing it on the way, and returns a StreamedFile. Makes no frappe calls,
+    so bulk fetch threads can use it.
+    """
+    try:
+        if cint(response.headers.get("Content-Length")) > max_size:
+            raise ArtifactTooLarge(f"Flick document exceeds the {max_size} byte limit")
+
+        content_hash = hashlib.md5()
+        size = 0
+        fd, path = tempfile.mkstemp(prefix=".uae-flick-", suffix=".part", dir=directory)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > max_size:
+                        raise ArtifactTooLarge(f"Flick document exceeds the {max_size} byte limit")
+                    content_hash.update(chunk)
+                    f.write(chunk)
+        except BaseException:
+            os.remove(path)
+            raise
+    finally:
+        response.close()
+
+    return StreamedFile(path, size, content_hash.hexdigest())
+
+
+def get_unique_file_name(directory, fname, content_hash):
+    """fname, or fname with a content hash suffix when taken, as frappe names duplicate uploads."""
+    if not os.path.exists(os.path.join(directory, fname)):
+        return fname
+    stem, ext = os.path.splitext(fname)
+    return f"{stem}{content_hash[-6:]}{ext}"
+
+
+def attach_streamed_file(doctype, doc, kind, streamed):
+    """Moves a streamed XML / PDF into the private files and replaces the invoice's attachment; the caller commits."""
+    fieldname, fname = ARTIFACTS[kind]
+    try:
+        if doc.get(fieldname):
+            for f in frappe.get_all("File", filters={"file_url": doc.get(fieldname)}, pluck="name"):
+                frappe.delete_doc("File", f, force=1)
+
+        directory = os.path.dirname(streamed.path)
+        file_name = get_unique_file_name(directory, fname.format(doc.name), streamed.content_hash)
+        os.replace(streamed.path, os.path.join(directory, file_name))
+    except BaseException:
+        if os.path.exists(streamed.path):
+            os.remove(streamed.path)
+        raise
+
+    file_url = f"/private/files/{file_name}"
+    file_doc = frappe.get_doc({
+        "doctype": "File",
+        "file_name": file_name,
+        "file_url": file_url,
+        "is_private": 1,
+        "attached_to_doctype": doctype,
+        "attached_to_name": doc.name,
+        "file_size": streamed.size,
+        "content_hash": streamed.content_hash,
+    }).insert(ignore_permissions=True)
+    if file_doc.file_url != file_url:
+        # frappe pointed the record at an identical file already on disk
+        os.remove(os.path.join(directory, file_name))
+
+    doc.db_set(fieldname, file_doc.file_url)
+    return file_doc
+
+
+def save_document_artifact(doctype, doc, kind, response):
+    """Streams a Flick XML / PDF response (requested with stream=True) into the invoice's attachment."""
+    streamed = stream_to_file(response, get_private_files_dir(), get_max_artifact_size())
+    return attach_streamed_file(doctype, doc, kind, streamed)
+
+
+def save_document_xml(doctype, doc, response):
+    """Replaces the invoice's Flick XML attachment; the caller commits."""
+    return save_document_artifact(doctype, doc, "xml", response)
+
+
+def save_document_pdf(doctype, doc, response):
+    """Replaces the invoice's Flick PDF attachment; the caller commits."""
+    return save_document_artifact(doctype, doc, "pdf", response)
+
 
-    
 @frappe.whitelist()
 def get_document_xml(doctype:str,invoice_name:str):
     """Fetch XML from Flick API and save in Sales Invoice
     """
     try:
         doc = frappe.get_doc(doctype, invoice_name)
-        company_doc = frappe.get_doc("Company", doc.company)
-
-        participant_id = company_doc.custom_participant_id
-        auth_key = company_doc.custom_xflickauthkey
-        
-        if not participant_id:
-            frappe.throw(_("Participant ID is missing in Company"))
-
-        if not doc.custom_submit_response:
-            frappe.throw(_("Submit response not found in Invoice"))
-
-        # Extract document_id from submit response
-        response_data = json.loads(doc.custom_submit_response)
-        
-        document_id = response_data.get("data", {}).get("id")
-        base_url = company_doc.custom_base_url
-        if not document_id:
-            frappe.throw(_("Document ID not found in submit response"))
-
-        url = f"{base_url}/v1/{participant_id}/documents/{document_id}/xml"
-        # headers = {
-        #     "X-Flick-Auth-Key": auth_key
-        # }
-        access_token = get_valid_flick_token(company_doc.name)
-        if auth_key:
-            headers = {
-                "X-Flick-Auth-Key": auth_key
-            }
+        client = FlickClient.for_company(doc.company)
+        client.require_participant()
+        document_id = get_document_id(doc)
 
-        # Case 2: Fallback to Access Token
-        elif access_token:
-            headers = {
-                "Authorization": f"Bearer {access_token}"
-            }
+        response = client.get(client.participant_path(f"/documents/{document_id}/xml"), endpoint="document", stream=True)
 
-        # Case 3: Neither available
-        else:
-            frappe.throw(_("Both X-Flick Auth Key and Access Token are missing in Company"))
-        response = requests.get(url, headers=headers)
-        # frappe.throw(_("API Response: {0}").format(response.status_code))
-
-        from frappe.utils.file_manager import save_file
         if response.status_code == 200:
-            xml_data = response.text
- 
-            # Save file and get file doc
-            if doc.custom_document_xml:
-                old_file = frappe.get_all(
-                    "File",
-                    filters={"file_url": doc.custom_document_xml},
-                    fields=["name"]
-                )
-                if old_file:
-                    for f in old_file:
-                        frappe.delete_doc("File", f.name, force=1)
-
-            # ✅ SAVE NEW FILE
-            file_doc = save_file(
-                fname=f"Submitted-XML-file {doc.name}.xml",
-                content=xml_data,
-                dt=doctype,   # dynamic doctype
-                dn=doc.name,
-                is_private=1
-            )
-
-            # ✅ UPDATE FIELD
-            doc.db_set("custom_document_xml", file_doc.file_url)
+            file_doc = save_document_xml(doctype, doc, response)
 
             frappe.db.commit()
 
@@ -103,68 +172,14 @@ def get_document_pdf(doctype:str,invoice_name:str):
     try:
         # sales_invoice_doc = frappe.get_doc("Sales Invoice", invoice_name)
         doc = frappe.get_doc(doctype, invoice_name)
-        company_doc = frappe.get_doc("Company", doc.company)
-
-        participant_id = company_doc.custom_participant_id
-        auth_key = company_doc.custom_xflickauthkey
-
-        if not participant_id:
-            frappe.throw(_("Participant ID is missing in Company"))
-
-
-        if not doc.custom_submit_response:
-            frappe.throw(_("Submit response not found in Invoice"))
-        
-        # Extract document_id
-        response_data = json.loads(doc.custom_submit_response)
-        document_id = response_data.get("data", {}).get("id")
-
-        if not document_id:
-            frappe.throw(_("Document ID not found in submit response"))
-        base_url = company_doc.custom_base_url
-        url = f"{base_url}/v1/{participant_id}/documents/{document_id}/pdf"
-
-        
-        access_token = get_valid_flick_token(company_doc.name)
-        if auth_key:
-            headers = {
-                "X-Flick-Auth-Key": auth_key
-            }
-
-        # Case 2: Fallback to Access Token
-        elif access_token:
-            headers = {
-                "Authorization": f"Bearer {access_token}"
-            }
-
-        # Case 3: Neither available
-        else:
-            frappe.throw(_("Both X-Flick Auth Key and Access Token are missing in Company"))
+        client = FlickClient.for_company(doc.company)
+        client.require_participant()
+        document_id = get_document_id(doc)
 
-        response = requests.get(url, headers=headers)
+        response = client.get(client.participant_path(f"/documents/{document_id}/pdf"), endpoint="document", stream=True)
 
         if response.status_code == 200:
-            pdf_data = response.content
-            if doc.custom_document_pdf:
-                old_file = frappe.get_all(
-                    "File",
-                    filters={"file_url": doc.custom_document_pdf},
-                    fields=["name"]
-                )
-                if old_file:
-                    frappe.delete_doc("File", old_file[0].name, force=1)
-
-            # ✅ SAVE NEW FILE
-            file_doc = save_file(
-                fname=f"Submitted-PDF-file {doc.name}.pdf",
-                content=pdf_data,
-                dt=doctype,   # ✅ use dynamic doctype
-                dn=doc.name,
-                is_private=1
-            )
-
-            # ✅ UPDATE FIELD
-            doc.db_set("custom_document_pdf", file_doc.file_url)
+            file_doc = save_document_pdf(doctype, doc, response)
 
             frappe.db.commit()
 
@@ -0,0 +1,68 @@
+"""
+Peak memory of retrieving one Flick PDF, by document size: the former
+response.content read against attach.stream_to_file, both against the local
+mock server.
+
+    bench --site <site> execute uae_erpgulf.uae_erpgulf.benchmarks.artifact_download.run
+    python -m uae_erpgulf.uae_erpgulf.benchmarks.artifact_download
+"""
+
+import json
+import os
+import tempfile
+import tracemalloc
+
+from uae_erpgulf.uae_erpgulf.attach import stream_to_file
+from uae_erpgulf.uae_erpgulf.benchmarks.mock_flick import start_mock_server
+from uae_erpgulf.uae_erpgulf.flick_client import build_session
+
+
+SIZES_MB = (1, 16, 64)
+PARTICIPANT_ID = "0235:1000000000"
+
+
+def peak_mb(fn):
+    tracemalloc.start()
+    try:
+        fn()
+        return round(tracemalloc.get_traced_memory()[1] / 1024 / 1024, 2)
+    finally:
+        tracemalloc.stop()
+
+
+def run(sizes_mb=SIZES_MB):
+    server = start_mock_server()
+    document_id = server.state.add_document(PARTICIPANT_ID, "ACC-SINV-00001")["id"]
+    url = f"{server.base_url}/v1/{PARTICIPANT_ID}/documents/{document_id}/pdf"
+    session = build_session()
+    rows = []
+
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            for size_mb in sizes_mb:
+                server.state.pdf_size = size_mb * 1024 * 1024
+
+                def in_memory():
+                    assert len(session.get(url, timeout=(5, 60)).content) == server.state.pdf_size
+
+                def streamed():
+                    result = stream_to_file(session.get(url, timeout=(5, 60), stream=True), directory, 1 << 40)
+                    assert result.size == server.state.pdf_size
+                    os.remove(result.path)
+
+                rows.append({
+                    "size_mb": size_mb,
+                    "in_memory_peak_mb": peak_mb(in_memory),
+                    "streamed_peak_mb": peak_mb(streamed),
+                })
+    finally:
+        server.shutdown()
+        server.server_close()
+        session.close()
+
+    print(json.dumps(rows, indent=4))
+    return rows
+
+
+if __name__ == "__main__":
+    run()
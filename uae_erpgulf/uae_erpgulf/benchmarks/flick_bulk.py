@@ -0,0 +1,92 @@
+"""
+Wall time of fetching many Flick documents: the former one-by-one loop against
+the concurrent engine in flick_bulk.py, both against a local mock server that
+answers every request after a fixed latency.
+
+    bench --site <site> execute uae_erpgulf.uae_erpgulf.benchmarks.flick_bulk.run
+    python -m uae_erpgulf.uae_erpgulf.benchmarks.flick_bulk
+"""
+
+import asyncio
+import json
+import time
+
+from uae_erpgulf.uae_erpgulf.benchmarks.mock_flick import start_mock_server
+from uae_erpgulf.uae_erpgulf.flick_bulk import FetchJob, iter_fetch_results
+from uae_erpgulf.uae_erpgulf.flick_client import build_session
+
+
+DOCUMENTS = 200
+LATENCY = 0.05
+CONCURRENCY = (4, 8, 16)
+PARTICIPANT_ID = "0235:1000000000"
+
+
+def make_jobs(base_url, session, documents):
+    return [
+        FetchJob(
+            key=(f"ACC-SINV-{idx:05d}", "status"),
+            participant_id=PARTICIPANT_ID,
+            session=session,
+            url=f"{base_url}/v1/{PARTICIPANT_ID}/documents/{idx}",
+            headers={"X-Flick-Auth-Key": "benchmark"},
+            timeout=(5, 20),
+            limiter=None,
+            breaker=None,
+        )
+        for idx in range(documents)
+    ]
+
+
+def sequential(jobs):
+    """What get_document_status did per invoice: one blocking GET after the other."""
+    return [job.session.get(job.url, headers=job.headers, timeout=job.timeout).status_code for job in jobs]
+
+
+def concurrent(jobs, concurrency):
+    async def consume():
+        return [result.response.status_code async for result in iter_fetch_results(jobs, concurrency)]
+
+    return asyncio.run(consume())
+
+
+def run(documents=DOCUMENTS, latency=LATENCY, concurrency_levels=CONCURRENCY):
+    server = start_mock_server(latency=latency)
+    for idx in range(documents):
+        server.state.add_document(PARTICIPANT_ID, f"ACC-SINV-{idx:05d}", document_id=str(idx))
+    base_url = server.base_url
+    session = build_session()
+    jobs = make_jobs(base_url, session, documents)
+
+    try:
+        started = time.perf_counter()
+        assert sequential(jobs) == [200] * documents
+        sequential_seconds = time.perf_counter() - started
+
+        rows = []
+        for concurrency in concurrency_levels:
+            started = time.perf_counter()
+            assert sorted(concurrent(jobs, concurrency)) == [200] * documents
+            seconds = time.perf_counter() - started
+            rows.append({
+                "concurrency": concurrency,
+                "seconds": round(seconds, 3),
+                "speedup": round(sequential_seconds / seconds, 1),
+            })
+    finally:
+        server.shutdown()
+        server.server_close()
+        session.close()
+
+    result = {
+        "documents": documents,
+        "latency_ms": latency * 1000,
+        "sequential_seconds": round(sequential_seconds, 3),
+        "concurrent": rows,
+    }
+    print(json.dumps(result, indent=4))
+    return result
+
+
+if __name__ == "__main__":
+    run()
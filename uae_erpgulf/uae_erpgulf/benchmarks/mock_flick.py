@@ -0,0 +1,384 @@
+"""
+Local stand-in for the Flick API, for benchmarks and for exercising the
+submission, webhook and incoming paths without the live sandbox.
+
+Covers the endpoints this app calls: /v1/oauth/token, /v1/auth/verify,
+/v1/participants/{id}, /v1/{participant}/documents (+ /{id}, /xml, /pdf),
+/v1/{participant}/simulate/incoming, /v1/webhooks/subscriptions (+ /{uuid},
+/deliveries) and /v1/peppol/lookup/{id}. Latency, 5xx and 429 rates and the
+PDF size are set per server; submitted documents are fired back as webhooks to the endpoint of
+the registered subscription (or webhook_url) when webhooks are enabled.
+
+Point a Company's Base URL at it:
+
+    python -m uae_erpgulf.uae_erpgulf.benchmarks.mock_flick --port 8765 --latency 0.05 --webhooks
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import urllib.request
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+PDF_BODY = b"%PDF-1.4\n1 0 obj << /Type /Catalog >> endobj\ntrailer << /Root 1 0 R >>\n%%EOF\n"
+PAD_CHUNK = b"%" * 65536
+XML_TEMPLATE = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<Invoice xmlns="urn:oasis:names:specification:ubl:schema:xsd:Invoice-2">'
+    "<cbc:ID>{document_identifier}</cbc:ID></Invoice>\n"
+)
+
+ROUTES = [
+    ("POST", r"/v1/oauth/token", "token"),
+    ("GET", r"/v1/auth/verify", "verify"),
+    ("GET", r"/v1/participants/(?P<participant>[^/]+)", "participant"),
+    ("PUT", r"/v1/participants/(?P<participant>[^/]+)", "participant"),
+    ("POST", r"/v1/webhooks/subscriptions", "subscribe"),
+    ("GET", r"/v1/webhooks/subscriptions/(?P<uuid>[^/]+)", "subscription"),
+    ("GET", r"/v1/webhooks/subscriptions/(?P<uuid>[^/]+)/deliveries", "deliveries"),
+    ("GET", r"/v1/peppol/lookup/(?P<peppol_id>[^/]+)", "lookup"),
+    ("POST", r"/v1/(?P<participant>[^/]+)/documents", "submit"),
+    ("POST", r"/v1/(?P<participant>[^/]+)/simulate/incoming", "incoming"),
+    ("GET", r"/v1/(?P<participant>[^/]+)/documents/(?P<document_id>[^/]+)", "status"),
+    ("GET", r"/v1/(?P<participant>[^/]+)/documents/(?P<document_id>[^/]+)/xml", "xml"),
+    ("GET", r"/v1/(?P<participant>[^/]+)/documents/(?P<document_id>[^/]+)/pdf", "pdf"),
+]
+ROUTES = [(method, re.compile(f"^{pattern}$"), name) for method, pattern, name in ROUTES]
+
+
+class MockFlickState:
+    """Behaviour settings plus everything the server was sent, shared by all handler threads."""
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, rate_limit_rate=0.0, retry_after=1,
+                 webhooks=False, webhook_url=None, webhook_delay=0.0, pdf_size=0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.webhooks = webhooks
+        self.webhook_url = webhook_url
+        self.webhook_delay = webhook_delay
+        self.pdf_size = pdf_size
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.documents = {}
+        self.subscriptions = {}
+        self.deliveries = []
+        self.requests = Counter()
+        self.injected = Counter()
+
+    def roll(self, rate):
+        with self.lock:
+            return rate and self.random.random() < rate
+
+    def delay(self):
+        with self.lock:
+            extra = self.random.uniform(0, self.jitter) if self.jitter else 0
+        if self.latency or extra:
+            time.sleep(self.latency + extra)
+
+    def add_document(self, participant, document_identifier, direction="outgoing", document_id=None):
+        """Stores a processed document, as a submission does; benchmarks use it to seed documents."""
+        document_id = document_id or str(uuid.uuid4())
+        data = {
+            "id": document_id,
+            "participant_id": participant,
+            "direction": direction,
+            "document_identifier": document_identifier,
+            "status": "processed",
+            "exchange_status": "delivered",
+            "reporting_status": "REPORTED",
+            "reporting_reference": document_id[:8].upper(),
+        }
+        with self.lock:
+            self.documents[document_id] = data
+        return data
+
+    def stats(self):
+        with self.lock:
+            webhook_ms = sorted(d["elapsed_ms"] for d in self.deliveries)
+            return {
+                "requests": dict(self.requests),
+                "injected": dict(self.injected),
+                "documents": len(self.documents),
+                "webhooks_sent": len(self.deliveries),
+                "webhooks_failed": sum(1 for d in self.deliveries if not d["ok"]),
+                "webhook_ms": webhook_ms,
+            }
+
+
+class MockFlickHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    state = None  # MockFlickState, set on the per-server subclass
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.dispatch("GET")
+
+    def do_POST(self):
+        self.dispatch("POST")
+
+    def do_PUT(self):
+        self.dispatch("PUT")
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        try:
+            return json.loads(body) if body else {}
+        except ValueError:
+            return {}
+
+    def reply(self, status, body, content_type="application/json", headers=None):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode()
+        if self.command == "GET" and status == 200:
+            # GET answers carry an ETag and honour If-None-Match, like Flick's cacheable endpoints
+            etag = f'"{hashlib.md5(body).hexdigest()}"'
+            headers = dict(headers or {}, ETag=etag)
+            if self.headers.get("If-None-Match") == etag:
+                status, body = 304, b""
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def dispatch(self, method):
+        path = self.path.split("?", 1)[0].rstrip("/")
+        for route_method, pattern, name in ROUTES:
+            match = pattern.match(path)
+            if route_method == method and match:
+                break
+        else:
+            self.read_json()
+            self.reply(404, {"status": "error", "message": f"No mock route for {method} {path}"})
+            return
+
+        state = self.state
+        payload = self.read_json() if method in ("POST", "PUT") else {}
+        with state.lock:
+            state.requests[name] += 1
+        state.delay()
+
+        if state.roll(state.rate_limit_rate):
+            with state.lock:
+                state.injected["429"] += 1
+            self.reply(429, {"status": "error", "message": "Too many requests"},
+                       headers={"Retry-After": str(state.retry_after)})
+            return
+        if state.roll(state.error_rate):
+            with state.lock:
+                state.injected["5xx"] += 1
+            self.reply(503, {"status": "error", "message": "Service unavailable"})
+            return
+
+        getattr(self, f"handle_{name}")(payload, **match.groupdict())
+
+    def handle_token(self, payload):
+        self.reply(200, {"access_token": uuid.uuid4().hex, "token_type": "Bearer", "expires_in": 3600})
+
+    def handle_verify(self, payload):
+        self.reply(200, {"status": "success", "message": "Token is valid"})
+
+    def handle_participant(self, payload, participant):
+        self.reply(200, {"status": "success", "data": dict(payload, participant_id=participant)})
+
+    def handle_lookup(self, payload, peppol_id):
+        self.reply(200, {"status": "success", "data": {"peppol_id": peppol_id, "registered": True}})
+
+    def submit(self, payload, participant, direction):
+        document = payload.get("document") or {}
+        data = self.state.add_document(participant, document.get("document_identifier"), direction)
+        if direction == "incoming":
+            data["parsed"] = {
+                "issue_date": document.get("issue_date"),
+                "payable_amount": (document.get("legal_monetary_total") or {}).get("payable_amount"),
+            }
+        self.reply(200, {"status": "success", "message": "Document accepted", "data": data})
+        self.server.fire_webhook(data)
+
+    def handle_submit(self, payload, participant):
+        self.submit(payload, participant, "outgoing")
+
+    def handle_incoming(self, payload, participant):
+        self.submit(payload, participant, "incoming")
+
+    def document(self, document_id):
+        with self.state.lock:
+            data = self.state.documents.get(document_id)
+        if data is None:
+            self.reply(404, {"status": "error", "message": "Document not found"})
+        return data
+
+    def handle_status(self, payload, participant, document_id):
+        data = self.document(document_id)
+        if data is not None:
+            self.reply(200, {"status": "success", "data": data})
+
+    def handle_xml(self, payload, participant, document_id):
+        data = self.document(document_id)
+        if data is not None:
+            body = XML_TEMPLATE.format(document_identifier=data["document_identifier"]).encode()
+            self.reply(200, body, content_type="application/xml")
+
+    def handle_pdf(self, payload, participant, document_id):
+        if self.document(document_id) is None:
+            return
+        size = max(self.state.pdf_size, len(PDF_BODY))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/pdf")
+        self.send_header("Content-Length", str(size))
+        self.end_headers()
+        # Padded to pdf_size in fixed chunks, so large documents cost the mock no memory
+        try:
+            self.wfile.write(PDF_BODY)
+            remaining = size - len(PDF_BODY)
+            while remaining > 0:
+                chunk = PAD_CHUNK[:remaining]
+                self.wfile.write(chunk)
+                remaining -= len(chunk)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up on the download, e.g. over its size limit
+            self.close_connection = True
+
+    def handle_subscribe(self, payload):
+        data = {"uuid": str(uuid.uuid4()), "secret": uuid.uuid4().hex, **payload}
+        with self.state.lock:
+            self.state.subscriptions[data["uuid"]] = data
+        self.reply(200, {"status": "success", "data": data})
+
+    def handle_subscription(self, payload, uuid):
+        with self.state.lock:
+            data = self.state.subscriptions.get(uuid)
+        if data is None:
+            self.reply(404, {"status": "error", "message": "Subscription not found"})
+        else:
+            self.reply(200, {"status": "success", "data": data})
+
+    def handle_deliveries(self, payload, uuid):
+        with self.state.lock:
+            deliveries = [d for d in self.state.deliveries if d["subscription"] == uuid][-100:]
+        self.reply(200, {"status": "success", "data": deliveries})
+
+
+class MockFlickServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, state, host="127.0.0.1", port=0):
+        handler = type("BoundMockFlickHandler", (MockFlickHandler,), {"state": state})
+        super().__init__((host, port), handler)
+        self.state = state
+
+    @property
+    def base_url(self):
+        return f"http://{self.server_address[0]}:{self.server_port}"
+
+    def webhook_targets(self):
+        with self.state.lock:
+            targets = [(s["uuid"], s.get("endpoint")) for s in self.state.subscriptions.values()]
+        if self.state.webhook_url:
+            targets.append((None, self.state.webhook_url))
+        return [(subscription, url) for subscription, url in targets if url]
+
+    def fire_webhook(self, data):
+        if self.state.webhooks:
+            threading.Thread(target=self.deliver_webhook, args=(data,), daemon=True).start()
+
+    def deliver_webhook(self, data):
+        """POSTs a document.completed event to every target, the way flick_webhook_listener receives it."""
+        if self.state.webhook_delay:
+            time.sleep(self.state.webhook_delay)
+        body = json.dumps({
+            "event": "document.completed",
+            "participant_id": data["participant_id"],
+            "data": {
+                "document_id": data["id"],
+                "document_identifier": data["document_identifier"],
+                "status": data["status"],
+                "exchange_status": data["exchange_status"],
+                "reporting_status": data["reporting_status"],
+            },
+        }).encode()
+
+        for subscription, url in self.webhook_targets():
+            started = time.perf_counter()
+            try:
+                request = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"})
+                with urllib.request.urlopen(request, timeout=30) as response:
+                    ok = response.status == 200
+                    status = response.status
+            except Exception as e:
+                ok, status = False, getattr(e, "code", None)
+            with self.state.lock:
+                self.state.deliveries.append({
+                    "subscription": subscription,
+                    "document_id": data["id"],
+                    "endpoint": url,
+                    "status_code": status,
+                    "ok": ok,
+                    "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+                })
+
+
+def start_mock_server(host="127.0.0.1", port=0, **settings):
+    """Starts a mock server on a background thread; settings are MockFlickState arguments."""
+    server = MockFlickServer(MockFlickState(**settings), host, port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Flick API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every answer")
+    parser.add_argument("--jitter", type=float, default=0.0, help="up to this many more seconds, at random")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered 503")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of requests answered 429")
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--webhooks", action="store_true", help="fire webhooks for submitted documents")
+    parser.add_argument("--webhook-url", help="also deliver webhooks here, without a subscription")
+    parser.add_argument("--webhook-delay", type=float, default=0.0)
+    parser.add_argument("--pdf-size", type=int, default=0, help="bytes each PDF is padded to")
+    args = parser.parse_args()
+
+    server = MockFlickServer(
+        MockFlickState(
+            latency=args.latency,
+            jitter=args.jitter,
+            error_rate=args.error_rate,
+            rate_limit_rate=args.rate_limit_rate,
+            retry_after=args.retry_after,
+            webhooks=args.webhooks,
+            webhook_url=args.webhook_url,
+            webhook_delay=args.webhook_delay,
+            pdf_size=args.pdf_size,
+        ),
+        args.host,
+        args.port,
+    )
+    print(f"Mock Flick API on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
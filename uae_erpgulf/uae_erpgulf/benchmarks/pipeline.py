@@ -0,0 +1,174 @@
+"""
+End-to-end throughput of the e-invoice pipeline against the local mock Flick
+server: N submitted invoices go through the real send_einvoice (build, attach,
+submit, XML, PDF, success log) and the run reports invoices/sec plus p50 / p95
+/ p99 latency per stage.
+
+Run it on a test site only: the Company's Base URL points at the mock for the
+duration of the run and the invoices' e-invoice fields are overwritten.
+
+    bench --site <site> execute uae_erpgulf.uae_erpgulf.benchmarks.pipeline.run \
+        --kwargs '{"company": "My Company", "invoices": 200, "latency": 0.05}'
+
+With webhooks=True the mock also posts a document.completed event per invoice
+to this site's flick_webhook_listener, which needs the site's web server up.
+"""
+
+import json
+import math
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from functools import wraps
+
+import frappe
+
+from uae_erpgulf.uae_erpgulf import send_purchase, test
+from uae_erpgulf.uae_erpgulf.benchmarks.mock_flick import start_mock_server
+from uae_erpgulf.uae_erpgulf.credentials import clear_credentials
+
+
+PIPELINES = {"Sales Invoice": test, "Purchase Invoice": send_purchase}
+# module attribute used by send_einvoice -> stage name
+STAGES = {
+    "build_uae_invoice_json": "build",
+    "attach_invoice_json": "attach",
+    "send_invoice_to_flick": "submit",
+    "get_document_xml": "xml",
+    "get_document_pdf": "pdf",
+    "success_log": "log",
+}
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(math.ceil(pct / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def summarize(samples_ms):
+    values = sorted(samples_ms)
+    summary = {"count": len(values)}
+    if values:
+        summary["mean"] = round(sum(values) / len(values), 2)
+        summary.update({f"p{pct}": round(percentile(values, pct), 2) for pct in PERCENTILES})
+    return summary
+
+
+@contextmanager
+def timed_stages(module, samples):
+    """Wraps the stage functions send_einvoice calls so each call's duration lands in samples."""
+    originals = {attr: getattr(module, attr) for attr in STAGES if hasattr(module, attr)}
+
+    def timed(stage, fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                samples[stage].append((time.perf_counter() - started) * 1000)
+        return wrapper
+
+    for attr, fn in originals.items():
+        setattr(module, attr, timed(STAGES[attr], fn))
+    try:
+        yield
+    finally:
+        for attr, fn in originals.items():
+            setattr(module, attr, fn)
+
+
+@contextmanager
+def company_base_url(company, base_url):
+    original = frappe.db.get_value("Company", company, "custom_base_url")
+    frappe.db.set_value("Company", company, "custom_base_url", base_url)
+    frappe.db.commit()  # nosemgrep: frappe-manual-commit
+    clear_credentials(company)
+    try:
+        yield
+    finally:
+        frappe.db.set_value("Company", company, "custom_base_url", original)
+        frappe.db.commit()  # nosemgrep: frappe-manual-commit
+        clear_credentials(company)
+
+
+def run(company, invoices=100, doctype="Sales Invoice", latency=0.05, jitter=0.0, error_rate=0.0,
+        rate_limit_rate=0.0, webhooks=False):
+    module = PIPELINES[doctype]
+    names = frappe.get_all(
+        doctype,
+        filters={"company": company, "docstatus": 1},
+        order_by="creation desc",
+        limit=invoices,
+        pluck="name",
+    )
+    if not names:
+        frappe.throw(f"No submitted {doctype} found for {company}")
+
+    webhook_url = None
+    if webhooks:
+        webhook_url = frappe.utils.get_url("/api/method/uae_erpgulf.uae_erpgulf.webhook.flick_webhook_listener")
+    server = start_mock_server(
+        latency=latency,
+        jitter=jitter,
+        error_rate=error_rate,
+        rate_limit_rate=rate_limit_rate,
+        webhooks=webhooks,
+        webhook_url=webhook_url,
+        seed=0,
+    )
+    samples = defaultdict(list)
+    errors = 0
+
+    try:
+        with company_base_url(company, server.base_url), timed_stages(module, samples):
+            started = time.perf_counter()
+            for name in names:
+                doc = frappe.get_doc(doctype, name)
+                # Never skipped as an unchanged resubmission
+                doc.custom_uae_einvoice_status = None
+
+                invoice_started = time.perf_counter()
+                try:
+                    module.send_einvoice(doc)
+                except Exception:
+                    errors += 1
+                samples["total"].append((time.perf_counter() - invoice_started) * 1000)
+                frappe.local.message_log = []
+            seconds = time.perf_counter() - started
+
+        statuses = Counter(frappe.get_all(
+            doctype, filters={"name": ["in", names]}, pluck="custom_uae_einvoice_status"
+        ))
+        if webhooks:
+            # Deliveries are asynchronous; give the last ones a moment
+            time.sleep(min(5, 1 + latency * 10))
+        mock_stats = server.state.stats()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    result = {
+        "doctype": doctype,
+        "invoices": len(names),
+        "seconds": round(seconds, 3),
+        "invoices_per_sec": round(len(names) / seconds, 2),
+        "latency_ms": latency * 1000,
+        "stages_ms": {stage: summarize(values) for stage, values in samples.items()},
+        "statuses": dict(statuses),
+        "errors": errors,
+        "mock": {
+            "requests": mock_stats["requests"],
+            "injected": mock_stats["injected"],
+            "webhooks_sent": mock_stats["webhooks_sent"],
+            "webhooks_failed": mock_stats["webhooks_failed"],
+        },
+    }
+    if webhooks:
+        result["stages_ms"]["webhook"] = summarize(mock_stats["webhook_ms"])
+    print(json.dumps(result, indent=4, default=str))
+    return result
@@ -0,0 +1,75 @@
+"""
+Per-invoice cost of the reference-data lookups, before and after the tables
+moved to reference_data.py.
+
+    bench --site <site> execute uae_erpgulf.uae_erpgulf.benchmarks.reference_data.run
+    python -m uae_erpgulf.uae_erpgulf.benchmarks.reference_data
+"""
+
+from timeit import timeit
+
+from uae_erpgulf.uae_erpgulf.reference_data import (
+    COUNTRY_DATA,
+    get_country_code,
+    get_emirate_code,
+    get_vat_category_code,
+)
+
+
+SAMPLE = ("United Arab Emirates", "Dubai", "S - Standard Rated")
+LINES_PER_INVOICE = 10
+
+
+def _legacy_lookups(country, emirate, vat_category):
+    """What one invoice paid before: every table rebuilt on every call."""
+    country_data = [{"name": name, "code": code} for name, code in COUNTRY_DATA]
+    countries = {entry["name"].lower(): entry["code"] for entry in country_data}
+    country_code = countries.get(country.lower(), "AE")
+
+    emirates = {
+        "abu dhabi": "AUH", "dubai": "DXB", "sharjah": "SHJ", "ajman": "AJM",
+        "umm al quwain": "UAQ", "ras al khaimah": "RAK", "fujairah": "FUJ",
+    }
+    emirate_code = emirates.get(emirate.strip().lower())
+
+    for _ in range(LINES_PER_INVOICE):
+        vat_categories = {
+            "s - standard rated": "S", "standard rated": "S", "s": "S",
+            "z - zero rated": "Z", "zero rated": "Z", "z": "Z",
+            "e - exempt from tax": "E", "exempt from tax": "E", "e": "E",
+            "ae - vat reverse charge": "AE", "vat reverse charge": "AE", "reverse charge": "AE", "ae": "AE",
+            "o - not subject to vat": "O", "not subject to vat": "O", "o": "O",
+            "n - margin scheme": "N", "margin scheme": "N", "n": "N",
+        }
+        vat_category_code = vat_categories.get(vat_category.strip().lower())
+
+    return country_code, emirate_code, vat_category_code
+
+
+def _registry_lookups(country, emirate, vat_category):
+    country_code = get_country_code(country)
+    emirate_code = get_emirate_code(emirate)
+    for _ in range(LINES_PER_INVOICE):
+        vat_category_code = get_vat_category_code(vat_category)
+    return country_code, emirate_code, vat_category_code
+
+
+def run(iterations=20000):
+    """Prints and returns the per-invoice lookup time in microseconds for both approaches."""
+    iterations = int(iterations)
+    assert _legacy_lookups(*SAMPLE) == _registry_lookups(*SAMPLE)
+
+    legacy = timeit(lambda: _legacy_lookups(*SAMPLE), number=iterations) / iterations * 1e6
+    registry = timeit(lambda: _registry_lookups(*SAMPLE), number=iterations) / iterations * 1e6
+    result = {
+        "iterations": iterations,
+        "legacy_us_per_invoice": round(legacy, 2),
+        "registry_us_per_invoice": round(registry, 2),
+        "speedup": round(legacy / registry, 1),
+    }
+    print(result)
+    return result
+
+
+if __name__ == "__main__":
+    run()
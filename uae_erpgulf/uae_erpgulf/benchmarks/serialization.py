@@ -0,0 +1,103 @@
+"""
+Size and encode / decode time of large synthetic invoice payloads: the former
+indent=4 json.dumps against compact json, the orjson backend and the
+compressed storage form.
+
+    bench --site <site> execute uae_erpgulf.uae_erpgulf.benchmarks.serialization.run
+    python -m uae_erpgulf.uae_erpgulf.benchmarks.serialization
+"""
+
+import json
+from timeit import timeit
+
+from uae_erpgulf.uae_erpgulf import serialization
+
+
+LINE_COUNTS = (10, 500, 5000)
+
+
+def make_payload(lines):
+    """An invoice payload shaped like build_invoice_payload output, with the given number of lines."""
+    return {
+        "invoice_number": "ACC-SINV-2026-00001",
+        "issue_date": "2026-01-15",
+        "issue_time": "10:30:00",
+        "invoice_type_code": "380",
+        "document_currency_code": "AED",
+        "supplier": {
+            "name": "Test Trading LLC",
+            "tax_id": "100000000000003",
+            "address": {"street": "Sheikh Zayed Road", "city": "Dubai", "country_subdivision": "DXB", "country": "AE"},
+        },
+        "customer": {
+            "name": "Customer Général FZE",
+            "tax_id": "100000000000004",
+            "address": {"street": "Corniche Road", "city": "Abu Dhabi", "country_subdivision": "AUH", "country": "AE"},
+        },
+        "payment_means": [[{"payment_means_code": "30", "payment_id": "ACC-SINV-2026-00001"}]],
+        "invoice_lines": [
+            {
+                "id": str(idx),
+                "invoiced_quantity": {"value": "2.00", "unit_code": "Nos"},
+                "line_extension_amount": {"value": "200.00", "currency_id": "AED"},
+                "item": {
+                    "name": f"Item {idx}",
+                    "description": f"Synthetic item number {idx} – شحنة",
+                    "classified_tax_category": {"id": "S", "percent": 5, "tax_scheme": "VAT"},
+                    "commodity_classification": {"item_classification_code": "84713000", "list_id": "HS"},
+                },
+                "price": {"price_amount": {"value": "100.00", "currency_id": "AED"}},
+            }
+            for idx in range(1, lines + 1)
+        ],
+        "legal_monetary_total": {
+            "line_extension_amount": f"{200 * lines:.2f}",
+            "tax_exclusive_amount": f"{200 * lines:.2f}",
+            "tax_inclusive_amount": f"{210 * lines:.2f}",
+            "payable_amount": 210.0 * lines,
+            "currency_id": "AED",
+        },
+    }
+
+
+def _time(fn, number):
+    return timeit(fn, number=number) / number * 1e6
+
+
+def run(line_counts=LINE_COUNTS):
+    rows = []
+    for lines in line_counts:
+        payload = make_payload(lines)
+        number = max(3, 20000 // lines)
+
+        legacy = json.dumps(payload, indent=4, ensure_ascii=False)
+        compact_json = json.dumps(payload, separators=(",", ":"), ensure_ascii=False)
+        compact = serialization.dumps(payload)
+        packed = serialization.pack(compact, compress=True)
+
+        assert serialization.load_stored(packed) == payload
+        assert serialization.load_stored(legacy) == payload
+
+        rows.append({
+            "lines": lines,
+            "bytes_indent4": len(legacy.encode("utf-8")),
+            "bytes_compact": len(compact.encode("utf-8")),
+            "bytes_compressed": len(packed),
+            "encode_us_indent4": _time(lambda: json.dumps(payload, indent=4, ensure_ascii=False), number),
+            "encode_us_compact_json": _time(
+                lambda: json.dumps(payload, separators=(",", ":"), ensure_ascii=False), number
+            ),
+            "encode_us_backend": _time(lambda: serialization.dumps(payload), number),
+            "encode_us_compressed": _time(lambda: serialization.pack(payload, compress=True), number),
+            "decode_us_indent4": _time(lambda: json.loads(legacy), number),
+            "decode_us_backend": _time(lambda: serialization.loads(compact_json), number),
+            "decode_us_compressed": _time(lambda: serialization.load_stored(packed), number),
+        })
+
+    result = {"backend": serialization.BACKEND, "results": rows}
+    print(json.dumps(result, indent=4))
+    return result
+
+
+if __name__ == "__main__":
+    run()
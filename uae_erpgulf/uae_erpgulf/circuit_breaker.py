@@ -0,0 +1,178 @@
+"""
+Circuit breaker per Flick base URL, shared by every worker through Redis.
+
+After uae_flick_breaker_threshold consecutive failures (connection errors,
+timeouts or 5xx answers) the breaker opens and calls fail at once with
+CircuitOpen instead of waiting on the network. Once uae_flick_breaker_cooldown
+seconds have passed a single probe request is let through (half-open): its
+success closes the breaker, its failure opens it for another cooldown. A
+probe that ends any other way (a 4xx answer is a success; a rate limit or
+any other error is neither) frees the slot for the next caller.
+"""
+
+import frappe
+import requests
+from frappe.utils import cint
+from redis.exceptions import RedisError
+
+
+DEFAULT_THRESHOLD = 5
+DEFAULT_COOLDOWN = 60  # seconds
+FAILURE_WINDOW = 600  # seconds after which isolated failures are forgotten
+PROBE_TIMEOUT = 180  # seconds before a lost probe lets another one through
+ALLOWED = 1
+PROBE = 2
+
+# KEYS: state, probe; ARGV: probe ttl ms. Returns 1 when the request may go out,
+# 2 when it goes out as the half-open probe, 0 when it may not.
+ALLOW_SCRIPT = """
+local state = redis.call('HGET', KEYS[1], 'state')
+if not state or state == 'closed' then
+    return 1
+end
+local now = redis.call('TIME')
+local now_ms = tonumber(now[1]) * 1000 + math.floor(tonumber(now[2]) / 1000)
+local opened_until = tonumber(redis.call('HGET', KEYS[1], 'opened_until') or 0)
+if state == 'open' and now_ms < opened_until then
+    return 0
+end
+if redis.call('SET', KEYS[2], 1, 'NX', 'PX', ARGV[1]) then
+    redis.call('HSET', KEYS[1], 'state', 'half_open')
+    return 2
+end
+return 0
+"""
+
+# KEYS: state, probe; ARGV: threshold, cooldown ms, key ttl ms. Returns 1 when this failure opened the breaker.
+FAILURE_SCRIPT = """
+local failures = redis.call('HINCRBY', KEYS[1], 'failures', 1)
+local state = redis.call('HGET', KEYS[1], 'state')
+local opened = 0
+if state == 'half_open' or (state ~= 'open' and failures >= tonumber(ARGV[1])) then
+    local now = redis.call('TIME')
+    local now_ms = tonumber(now[1]) * 1000 + math.floor(tonumber(now[2]) / 1000)
+    redis.call('HSET', KEYS[1], 'state', 'open', 'opened_until', now_ms + tonumber(ARGV[2]))
+    redis.call('HINCRBY', KEYS[1], 'trips', 1)
+    redis.call('DEL', KEYS[2])
+    opened = 1
+end
+redis.call('PEXPIRE', KEYS[1], ARGV[3])
+return opened
+"""
+
+
+class CircuitOpen(requests.exceptions.RequestException):
+    """Flick is considered down for this base URL; the request was not sent."""
+
+
+def _keys(base_url):
+    return (
+        frappe.cache.make_key(f"uae_flick_breaker|{base_url}"),
+        frappe.cache.make_key(f"uae_flick_breaker_probe|{base_url}"),
+    )
+
+
+def is_failure(response=None, exception=None):
+    """Transport failures and 5xx count against the breaker; 4xx answers prove Flick is up."""
+    if exception is not None:
+        return isinstance(exception, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+    return response is not None and response.status_code >= 500
+
+
+class CircuitBreaker:
+    """Breaker of one base URL. Keys and settings are resolved here, so worker threads can use it."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.redis = frappe.cache
+        self.state_key, self.probe_key = _keys(base_url)
+        self.threshold = cint(frappe.conf.get("uae_flick_breaker_threshold")) or DEFAULT_THRESHOLD
+        self.cooldown_ms = (cint(frappe.conf.get("uae_flick_breaker_cooldown")) or DEFAULT_COOLDOWN) * 1000
+        self._allow = self.redis.register_script(ALLOW_SCRIPT)
+        self._failure = self.redis.register_script(FAILURE_SCRIPT)
+
+    def allow_request(self):
+        """ALLOWED when closed, PROBE when this caller is the single half-open probe, else 0. Fails open without Redis."""
+        try:
+            return int(self._allow(keys=[self.state_key, self.probe_key], args=[PROBE_TIMEOUT * 1000]))
+        except RedisError:
+            return ALLOWED
+
+    def before_request(self):
+        """Raises CircuitOpen when the request may not go out; returns True when it is the probe."""
+        allowed = self.allow_request()
+        if not allowed:
+            raise CircuitOpen(f"Flick at {self.base_url} is unavailable; circuit breaker open")
+        return allowed == PROBE
+
+    def release_probe(self):
+        try:
+            self.redis.execute_command("DEL", self.probe_key)
+        except RedisError:
+            pass
+
+    def record_success(self):
+        try:
+            self.redis.execute_command("DEL", self.state_key, self.probe_key)
+        except RedisError:
+            pass
+
+    def record_failure(self):
+        try:
+            return bool(self._failure(
+                keys=[self.state_key, self.probe_key],
+                args=[self.threshold, self.cooldown_ms, self.cooldown_ms + FAILURE_WINDOW * 1000],
+            ))
+        except RedisError:
+            return False
+
+    def state(self):
+        """closed / open / half_open, as seen by all workers."""
+        state = self.redis.execute_command("HGET", self.state_key, "state")
+        if isinstance(state, bytes):
+            state = state.decode()
+        return state or "closed"
+
+    def is_open(self):
+        """True while open and cooling down, i.e. requests would fail without being sent."""
+        state, opened_until = self.redis.execute_command("HMGET", self.state_key, "state", "opened_until")
+        if state not in (b"open", "open"):
+            return False
+        seconds, microseconds = self.redis.execute_command("TIME")
+        return int(opened_until or 0) > int(seconds) * 1000 + int(microseconds) // 1000
+
+    def call(self, send):
+        """Runs send() through the breaker and records its outcome."""
+        probe = self.before_request()
+        recorded = False
+        try:
+            try:
+                response = send()
+            except requests.exceptions.RequestException as e:
+                if is_failure(exception=e):
+                    self.record_failure()
+                    recorded = True
+                raise
+
+            if is_failure(response=response):
+                self.record_failure()
+            else:
+                self.record_success()
+            recorded = True
+            return response
+        finally:
+            # Neither success nor failure: let the next caller probe instead of waiting out PROBE_TIMEOUT
+            if probe and not recorded:
+                self.release_probe()
+
+
+@frappe.whitelist()
+def get_breaker_states():
+    """Breaker state of every Company base URL."""
+    frappe.only_for("System Manager")
+
+    base_urls = frappe.get_all("Company", filters={"custom_base_url": ["is", "set"]}, pluck="custom_base_url")
+    return {
+        base_url: CircuitBreaker(base_url.rstrip("/")).state()
+        for base_url in set(base_urls)
+    }
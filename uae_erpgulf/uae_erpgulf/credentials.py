@@ -0,0 +1,132 @@
+"""
+Flick connection settings and credential provider per Company, resolved once
+and kept in process.
+
+A Company authenticates either with a static X-Flick-Auth-Key or with OAuth
+client credentials, whose tokens come from token_cache.py. get_credentials
+reads the few Company fields a FlickClient needs in one query and picks the
+first provider in PROVIDERS that applies. The result stays in process memory;
+a stamp in Redis, bumped by the Company doc_events, makes every worker read a
+changed Company again on its next call. Code that writes these fields with
+frappe.db.set_value skips the doc_events and must call clear_credentials.
+"""
+
+import frappe
+from frappe import _
+from frappe.utils import now
+
+
+COMPANY_FIELDS = [
+    "name", "custom_base_url", "custom_participant_id", "custom_xflickauthkey",
+    "custom_client_id", "custom_uae_einvoice_enabled",
+]
+
+_local_credentials = {}
+
+
+class CredentialProvider:
+    """Builds the authentication headers of one Company."""
+
+    kind = None
+
+    @classmethod
+    def from_settings(cls, settings):
+        """An instance when the Company is set up for this kind of authentication, else None."""
+        raise NotImplementedError
+
+    def headers(self, refresh_token=True):
+        raise NotImplementedError
+
+
+class AuthKeyProvider(CredentialProvider):
+    """Static X-Flick-Auth-Key; never touches the token endpoint."""
+
+    kind = "auth_key"
+
+    def __init__(self, auth_key):
+        self.auth_key = auth_key
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(settings.custom_xflickauthkey) if settings.get("custom_xflickauthkey") else None
+
+    def headers(self, refresh_token=True):
+        return {"X-Flick-Auth-Key": self.auth_key}
+
+
+class OAuthProvider(CredentialProvider):
+    """Bearer token from the shared token cache, renewed before expiry unless refresh_token is False."""
+
+    kind = "oauth"
+
+    def __init__(self, company):
+        self.company = company
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(settings.name) if settings.get("custom_client_id") else None
+
+    def headers(self, refresh_token=True):
+        from uae_erpgulf.uae_erpgulf.token_cache import get_access_token, get_cached_token, load_stored_token
+
+        if refresh_token:
+            access_token = get_access_token(self.company)
+        else:
+            entry = get_cached_token(self.company) or load_stored_token(self.company)
+            access_token = entry["access_token"] if entry else None
+        if not access_token:
+            frappe.throw(_("Access Token is missing in Company"))
+        return {"Authorization": f"Bearer {access_token}"}
+
+
+class MissingCredentialsProvider(CredentialProvider):
+    kind = None
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls()
+
+    def headers(self, refresh_token=True):
+        frappe.throw(_("Both X-Flick Auth Key and Access Token are missing in Company"))
+
+
+# Tried in order; the first provider that applies to the Company is used
+PROVIDERS = [AuthKeyProvider, OAuthProvider, MissingCredentialsProvider]
+
+
+def resolve_provider(settings):
+    for provider in PROVIDERS:
+        instance = provider.from_settings(settings)
+        if instance is not None:
+            return instance
+
+
+def _stamp_key(company):
+    return f"uae_flick_credentials_modified|{company}"
+
+
+def get_credentials(company):
+    """frappe._dict of the Company's Flick settings with its provider, cached in process."""
+    stamp = frappe.cache.get_value(_stamp_key(company), generator=now)
+    key = (frappe.local.site, company)
+    entry = _local_credentials.get(key)
+    if entry and entry[0] == stamp:
+        return entry[1]
+
+    settings = frappe.db.get_value("Company", company, COMPANY_FIELDS, as_dict=True)
+    if not settings:
+        frappe.throw(_("Company {0} not found").format(company))
+    settings.provider = resolve_provider(settings)
+    _local_credentials[key] = (stamp, settings)
+    return settings
+
+
+def clear_credentials(company):
+    """Every worker re-reads the Company on its next Flick call."""
+    frappe.cache.set_value(_stamp_key(company), now())
+    _local_credentials.pop((frappe.local.site, company), None)
+
+
+def invalidate_credentials(doc, method=None):
+    """Company doc_events handler."""
+    clear_credentials(doc.name)
@@ -1,22 +1,18 @@
 import frappe
-import http.client
-import json
-import requests
-from frappe import _
+from uae_erpgulf.uae_erpgulf.flick_client import FlickClient
+from uae_erpgulf.uae_erpgulf.peppol import store_lookup
+from uae_erpgulf.uae_erpgulf.response_cache import cached_get
 
 @frappe.whitelist()
 def custom_lookup_peppol_id_of_participant(company:str,peppol_id:str):
     """Lookup PEPPOL ID using Flick API and return details"""
     try:
-        url = f"https://sb-ae-api.flick.network/v1/peppol/lookup/{peppol_id}"
-        company_doc = frappe.get_doc("Company", company)
-
-        auth_key = company_doc.custom_xflickauthkey
-        headers = {
-            "X-Flick-Auth-Key": "YOUR_SECRET_TOKEN"
-        }
-
-        response = requests.get(url, headers=headers)
+        client = FlickClient.for_company(company)
+        response = cached_get(client, f"/v1/peppol/lookup/{peppol_id}", endpoint="lookup")
+        if not response.from_cache:
+            store_lookup(company, client.base_url, peppol_id.strip(), response.status_code, response.text)
+            # Keep the result even when the error below rolls the request back
+            frappe.db.commit()  # nosemgrep: frappe-manual-commit
 
         if response.status_code == 200:
             return response.json()
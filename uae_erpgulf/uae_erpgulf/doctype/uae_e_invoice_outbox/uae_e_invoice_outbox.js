@@ -0,0 +1,18 @@
+// Copyright (c) 2026, erpgulf.com and contributors
+// For license information, please see license.txt
+
+frappe.ui.form.on("UAE E-Invoice Outbox", {
+	refresh(frm) {
+		if (frm.doc.status === "Dead") {
+			frm.add_custom_button(__("Retry"), () => {
+				frappe.call({
+					method: "uae_erpgulf.uae_erpgulf.outbox.retry_dead",
+					args: { names: [frm.doc.name] },
+					callback() {
+						frm.reload_doc();
+					},
+				});
+			});
+		}
+	},
+});
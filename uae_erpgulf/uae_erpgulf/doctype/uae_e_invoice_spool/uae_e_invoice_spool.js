@@ -0,0 +1,8 @@
+// Copyright (c) 2026, erpgulf.com and contributors
+// For license information, please see license.txt
+
+// frappe.ui.form.on("UAE E-Invoice Spool", {
+// 	refresh(frm) {
+
+// 	},
+// });
@@ -0,0 +1,13 @@
+# Copyright (c) 2026, erpgulf.com and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+
+class UAEPEPPOLLookup(Document):
+	pass
+
+
+def on_doctype_update():
+	frappe.db.add_index("UAE PEPPOL Lookup", ["peppol_id", "base_url"])
@@ -0,0 +1,242 @@
+"""
+Concurrent retrieval of Flick document status, XML and PDF for many invoices.
+
+Requests run on a thread pool over the pooled FlickClient sessions and are
+driven by asyncio, with at most `concurrency` requests in flight per
+participant. XML and PDF bodies are streamed to temporary files by the pool
+threads. Results are handed back to the calling thread as they complete and
+persisted there, so all database work stays on the job's own connection.
+"""
+
+import asyncio
+import os
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from urllib.parse import urlsplit
+
+import frappe
+import requests
+from frappe import _
+from frappe.utils import cint
+from uae_erpgulf.uae_erpgulf.attach import (
+    ArtifactTooLarge,
+    attach_streamed_file,
+    get_document_id,
+    get_max_artifact_size,
+    get_private_files_dir,
+    stream_to_file,
+)
+from uae_erpgulf.uae_erpgulf.flick_client import FlickClient, dispatch, get_session, get_timeout
+from uae_erpgulf.uae_erpgulf.rate_limiter import RateLimiter
+from uae_erpgulf.uae_erpgulf.rules import ALL_DOCTYPES
+from uae_erpgulf.uae_erpgulf.serialization import loads
+from uae_erpgulf.uae_erpgulf.verify_token import save_document_status
+
+
+# kind: (path suffix after /documents/{id}, FlickClient endpoint)
+KINDS = {
+    "status": ("", "status"),
+    "xml": ("/xml", "document"),
+    "pdf": ("/pdf", "document"),
+}
+
+DEFAULT_CONCURRENCY = 8
+# A background refresh may wait longer for a request slot than an interactive call
+MAX_RATE_LIMIT_WAIT = 300
+COMMIT_EVERY = 50
+
+# download: (directory, max size) to stream the body into a temporary file, or None to read it into memory
+FetchJob = namedtuple(
+    "FetchJob",
+    ["key", "participant_id", "session", "url", "headers", "timeout", "limiter", "breaker", "download", "metrics"],
+    defaults=(None, None),
+)
+# streamed: the attach.StreamedFile of a downloaded body
+FetchResult = namedtuple("FetchResult", ["job", "response", "error", "streamed"], defaults=(None,))
+
+
+def get_concurrency():
+    return cint(frappe.conf.get("uae_flick_bulk_concurrency")) or DEFAULT_CONCURRENCY
+
+
+def fetch_one(job):
+    """Runs on a pool thread: the GET and, for downloads, writing the body to disk. Returns (response, streamed)."""
+    send = partial(job.session.get, job.url, headers=job.headers, timeout=job.timeout, stream=bool(job.download))
+    if job.metrics:
+        send = job.metrics.instrument(send, "GET", urlsplit(job.url).path, stream=bool(job.download))
+    response = dispatch(job.limiter, job.breaker, send)
+    if job.download and response.status_code == 200:
+        return response, stream_to_file(response, *job.download)
+    return response, None
+
+
+async def iter_fetch_results(jobs, concurrency=DEFAULT_CONCURRENCY):
+    """Yields a FetchResult for every job as soon as its GET completes, in completion order."""
+    if not jobs:
+        return
+
+    loop = asyncio.get_running_loop()
+    participants = {job.participant_id for job in jobs}
+    semaphores = {participant: asyncio.Semaphore(concurrency) for participant in participants}
+    executor = ThreadPoolExecutor(max_workers=min(len(jobs), concurrency * len(participants)))
+
+    async def fetch(job):
+        async with semaphores[job.participant_id]:
+            try:
+                response, streamed = await loop.run_in_executor(executor, fetch_one, job)
+            except (requests.RequestException, ArtifactTooLarge, OSError) as e:
+                return FetchResult(job, None, e)
+            return FetchResult(job, response, None, streamed)
+
+    try:
+        for next_result in asyncio.as_completed([fetch(job) for job in jobs]):
+            yield await next_result
+    finally:
+        executor.shutdown(wait=False)
+
+
+def run_fetch(jobs, on_result, concurrency=DEFAULT_CONCURRENCY):
+    """Runs all jobs concurrently and calls on_result(result) on this thread for each one."""
+
+    async def consume():
+        async for result in iter_fetch_results(jobs, concurrency):
+            on_result(result)
+
+    asyncio.run(consume())
+
+
+def build_jobs(doctype, invoice_names, kinds):
+    """FetchJobs for every (invoice, kind), with auth resolved once per Company. Returns (jobs, errors)."""
+    jobs = []
+    errors = {}
+    clients = {}
+    download = (get_private_files_dir(), get_max_artifact_size())
+
+    invoices = frappe.get_all(
+        doctype,
+        filters={"name": ["in", invoice_names]},
+        fields=["name", "company", "custom_submit_response"],
+    )
+    for invoice in invoices:
+        try:
+            if invoice.company not in clients:
+                client = FlickClient.for_company(invoice.company)
+                clients[invoice.company] = (
+                    client,
+                    client.auth_headers(),
+                    get_session(client.base_url),
+                    RateLimiter(client.participant_id, max_wait=MAX_RATE_LIMIT_WAIT),
+                )
+            client, headers, session, limiter = clients[invoice.company]
+            document_path = client.participant_path(f"/documents/{get_document_id(invoice)}")
+        except frappe.ValidationError as e:
+            errors[invoice.name] = [str(e)]
+            continue
+
+        for kind in kinds:
+            suffix, endpoint = KINDS[kind]
+            jobs.append(FetchJob(
+                key=(invoice.name, kind),
+                participant_id=client.participant_id,
+                session=session,
+                url=f"{client.base_url}{document_path}{suffix}",
+                headers=headers,
+                timeout=get_timeout(endpoint),
+                limiter=limiter,
+                breaker=client.breaker,
+                download=download if kind != "status" else None,
+                metrics=client.metrics,
+            ))
+
+    found = {invoice.name for invoice in invoices}
+    for name in invoice_names:
+        if name not in found:
+            errors[name] = [_("{0} {1} not found").format(doctype, name)]
+
+    return jobs, errors
+
+
+def persist_result(doctype, doc, kind, result):
+    """Stores one successful Flick response on the invoice."""
+    if kind == "status":
+        save_document_status(doc, loads(result.response.content))
+    else:
+        attach_streamed_file(doctype, doc, kind, result.streamed)
+
+
+def run_refresh(doctype, names, kinds=tuple(KINDS), concurrency=None):
+    """Background job: fetches and stores status / XML / PDF for all given invoices."""
+    kinds = [kind for kind in kinds if kind in KINDS]
+    jobs, errors = build_jobs(doctype, names, kinds)
+    docs = {}
+    stored = 0
+
+    def on_result(result):
+        nonlocal stored
+        name, kind = result.job.key
+        if result.error is not None:
+            errors.setdefault(name, []).append(f"{kind}: {result.error}")
+            return
+        if result.response.status_code != 200:
+            errors.setdefault(name, []).append(
+                _("{0}: API Error: {1}").format(kind, result.response.text[:500])
+            )
+            return
+
+        try:
+            if name not in docs:
+                docs[name] = frappe.get_doc(doctype, name)
+            persist_result(doctype, docs[name], kind, result)
+        except Exception:
+            if result.streamed and os.path.exists(result.streamed.path):
+                os.remove(result.streamed.path)
+            frappe.log_error(frappe.get_traceback(), "Flick Bulk Refresh Error")
+            errors.setdefault(name, []).append(_("{0}: could not be saved").format(kind))
+            return
+
+        stored += 1
+        if stored % COMMIT_EVERY == 0:
+            frappe.db.commit()  # nosemgrep: frappe-manual-commit
+
+    run_fetch(jobs, on_result, concurrency or get_concurrency())
+    frappe.db.commit()  # nosemgrep: frappe-manual-commit
+
+    summary = {
+        "event": "uae_einvoice_bulk_refresh",
+        "doctype": doctype,
+        "invoices": len(names),
+        "requests": len(jobs),
+        "stored": stored,
+        "failed": len(errors),
+    }
+    frappe.logger("uae_erpgulf").info(summary)
+    if errors:
+        frappe.log_error(
+            title="Flick Bulk Refresh Failures",
+            message="\n".join(f"{name}: {'; '.join(messages)}" for name, messages in errors.items()),
+        )
+    return summary
+
+
+@frappe.whitelist()
+def refresh_documents(names: list | str, doctype: str = "Sales Invoice", kinds: list | str | None = None):
+    """Queues a concurrent refresh of Flick status, XML and PDF for the selected invoices."""
+    if isinstance(names, str):
+        names = frappe.parse_json(names)
+    if isinstance(kinds, str):
+        kinds = frappe.parse_json(kinds)
+    if doctype not in ALL_DOCTYPES:
+        frappe.throw(_("UAE E-Invoicing is not supported for {0}").format(doctype))
+    frappe.has_permission(doctype, "write", throw=True)
+
+    names = list(dict.fromkeys(name for name in names if name))
+    frappe.enqueue(
+        "uae_erpgulf.uae_erpgulf.flick_bulk.run_refresh",
+        queue="long",
+        timeout=3600,
+        doctype=doctype,
+        names=names,
+        kinds=tuple(kinds or KINDS),
+    )
+    return {"queued": len(names)}
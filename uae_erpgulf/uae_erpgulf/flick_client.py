@@ -0,0 +1,191 @@
+"""
+Single entry point for every Flick API call.
+
+One pooled requests.Session is kept per base URL and process, so TCP and TLS
+connections are reused across calls. Every request carries a (connect, read)
+timeout chosen by endpoint, and failures are retried with backoff only when
+that is safe: connection errors (nothing was sent) for any method, read errors
+and 5xx answers for idempotent methods. Submissions (POST) are never retried
+after Flick accepted them for processing.
+
+Every request first takes a token from the participant's shared rate limiter;
+a 429 pauses all workers for Retry-After and the request is sent again, which
+is safe for any method since Flick did not process it. A circuit breaker per
+base URL fails requests at once while Flick is known to be down. Every HTTP
+attempt is recorded by metrics.MetricsRecorder.
+"""
+
+import threading
+from functools import partial
+
+import frappe
+import requests
+from frappe import _
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from uae_erpgulf.uae_erpgulf.circuit_breaker import CircuitBreaker
+from uae_erpgulf.uae_erpgulf.credentials import get_credentials, resolve_provider
+from uae_erpgulf.uae_erpgulf.metrics import MetricsRecorder
+from uae_erpgulf.uae_erpgulf.rate_limiter import RateLimiter
+from uae_erpgulf.uae_erpgulf.serialization import dumps_bytes
+
+
+# (connect, read) timeouts in seconds, by endpoint; overridable per key with
+# the site config dict uae_flick_timeouts, e.g. {"submit": [5, 180]}
+TIMEOUTS = {
+    "default": (5, 30),
+    "auth": (5, 15),
+    "submit": (5, 120),
+    "status": (5, 20),
+    "document": (5, 60),
+    "webhook": (5, 20),
+    "participant": (5, 30),
+    "lookup": (5, 15),
+}
+
+RETRY_TOTAL = 3
+RETRY_BACKOFF = 0.5
+RETRY_STATUSES = (500, 502, 503, 504)
+# Resends after a 429, each after waiting for the shared pause to expire
+RATE_LIMIT_RETRIES = 3
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+POOL_CONNECTIONS = 4
+POOL_MAXSIZE = 16
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def build_session():
+    retry = Retry(
+        total=RETRY_TOTAL,
+        connect=RETRY_TOTAL,
+        read=RETRY_TOTAL,
+        status=RETRY_TOTAL,
+        backoff_factor=RETRY_BACKOFF,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=IDEMPOTENT_METHODS,
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(max_retries=retry, pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_session(base_url):
+    """The keep-alive session shared by all calls to one Flick base URL in this process."""
+    session = _sessions.get(base_url)
+    if session is None:
+        with _sessions_lock:
+            session = _sessions.get(base_url)
+            if session is None:
+                session = _sessions[base_url] = build_session()
+    return session
+
+
+def send_rate_limited(limiter, send, acquired=False):
+    """
+    Calls send() under the limiter, sending again after a 429 up to
+    RATE_LIMIT_RETRIES times. acquired means the caller already took the
+    token of the first attempt.
+    """
+    if limiter is None:
+        return send()
+
+    for attempt in range(RATE_LIMIT_RETRIES + 1):
+        if attempt or not acquired:
+            limiter.acquire()
+        response = send()
+        if not limiter.observe(response) or attempt == RATE_LIMIT_RETRIES:
+            return response
+
+
+def dispatch(limiter, breaker, send):
+    """Sends through the circuit breaker and the rate limiter; either may be None."""
+    if breaker is None:
+        return send_rate_limited(limiter, send)
+    # Wait for the rate limiter before the breaker may hand this call its half-open probe slot
+    if limiter is not None:
+        limiter.acquire()
+    return breaker.call(partial(send_rate_limited, limiter, send, acquired=True))
+
+
+def get_timeout(endpoint):
+    overrides = frappe.conf.get("uae_flick_timeouts") or {}
+    timeout = overrides.get(endpoint) or TIMEOUTS.get(endpoint) or TIMEOUTS["default"]
+    return tuple(timeout)
+
+
+class FlickClient:
+    """Flick API client bound to one Company's base URL, participant and credentials."""
+
+    def __init__(self, settings):
+        """settings: the Company, or its get_credentials() entry, which carries the resolved provider."""
+        self.company = settings.name
+        self.base_url = (settings.custom_base_url or "").rstrip("/")
+        self.participant_id = settings.custom_participant_id
+        self.provider = settings.get("provider") or resolve_provider(settings)
+
+        if not self.base_url:
+            frappe.throw(_("Base URL is missing in Company"))
+
+        self.limiter = RateLimiter(self.participant_id or self.base_url)
+        self.breaker = CircuitBreaker(self.base_url)
+        self.metrics = MetricsRecorder(self.company)
+
+    @classmethod
+    def for_company(cls, company):
+        return cls(get_credentials(company))
+
+    def require_participant(self):
+        if not self.participant_id:
+            frappe.throw(_("Participant ID is missing in Company"))
+        return self.participant_id
+
+    def auth_headers(self, refresh_token=True):
+        """
+        Headers of the Company's credential provider: X-Flick-Auth-Key, or a
+        Bearer access token (renewed when due unless refresh_token is False).
+        """
+        return self.provider.headers(refresh_token)
+
+    def request(self, method, path, endpoint="default", json=None, headers=None, auth=True,
+                refresh_token=True, **kwargs):
+        """Sends one request on the pooled session; json bodies are encoded compactly."""
+        request_headers = self.auth_headers(refresh_token) if auth else {}
+        if json is not None:
+            request_headers["Content-Type"] = "application/json"
+            kwargs["data"] = dumps_bytes(json)
+        if headers:
+            request_headers.update(headers)
+
+        send = partial(
+            get_session(self.base_url).request,
+            method,
+            f"{self.base_url}{path}",
+            headers=request_headers,
+            timeout=kwargs.pop("timeout", None) or get_timeout(endpoint),
+            **kwargs,
+        )
+        send = self.metrics.instrument(
+            send, method, path, request_bytes=len(kwargs.get("data") or b""), stream=kwargs.get("stream", False)
+        )
+        return dispatch(self.limiter, self.breaker, send)
+
+    def get(self, path, endpoint="default", **kwargs):
+        return self.request("GET", path, endpoint, **kwargs)
+
+    def post(self, path, endpoint="default", **kwargs):
+        return self.request("POST", path, endpoint, **kwargs)
+
+    def put(self, path, endpoint="default", **kwargs):
+        return self.request("PUT", path, endpoint, **kwargs)
+
+    def participant_path(self, suffix=""):
+        """/v1/{participant_id}{suffix}"""
+        return f"/v1/{self.require_participant()}{suffix}"
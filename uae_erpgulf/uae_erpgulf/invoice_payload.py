@@ -0,0 +1,621 @@
+"""
+UAE / PEPPOL invoice payload engine shared by Sales and Purchase Invoices.
+
+The engine works on the prefetched invoice context (prefetch.py) and asks a
+thin adapter for the few things that differ between the two doctypes:
+document type codes, the party name field, payment means and line defaults.
+"""
+
+import hashlib
+import json
+import re
+from datetime import timedelta
+from decimal import Decimal, ROUND_HALF_UP
+
+import frappe
+from frappe import _
+from frappe.utils import cint
+from uae_erpgulf.uae_erpgulf.payload_minimizer import is_enabled as minimizer_enabled, log_reduction, minimize_payload
+from uae_erpgulf.uae_erpgulf.prefetch import iter_invoice_contexts, load_invoice_context, log_query_count
+from uae_erpgulf.uae_erpgulf.reference_data import (
+    get_country_code,
+    get_emirate_code,
+    get_vat_category_code as lookup_vat_category_code,
+)
+from uae_erpgulf.uae_erpgulf.rules import DEEMED_SUPPLY, OUT_OF_SCOPE, collect_violations, validate_invoice
+from uae_erpgulf.uae_erpgulf.serialization import dumps
+from uae_erpgulf.uae_erpgulf.totals import TotalsAccumulator, to_decimal
+
+
+# custom_item_type_codes -> (commodity code, HS code field, SAC code field)
+ITEM_CLASSIFICATIONS = {
+    "G - Goods": ("G", "custom_hs_code_", None),
+    "S - Services": ("S", None, "custom_sac_code"),
+    "B - Both": ("B", "custom_hs_code_", "custom_sac_code"),
+}
+
+
+class InvoiceAdapter:
+    """Maps one invoice doctype and its party onto the common payload model."""
+
+    doctype = None
+    charge_field = None
+
+    def get_document_type(self, invoice):
+        raise NotImplementedError
+
+    def get_party_name(self, context):
+        return context.party.get(context.spec.party_name_field)
+
+    def get_line_description(self, item):
+        return item.description
+
+    def get_payment_means(self, context):
+        raise NotImplementedError
+
+
+class SalesInvoiceAdapter(InvoiceAdapter):
+    doctype = "Sales Invoice"
+    charge_field = "base_change_amount"
+
+    def get_document_type(self, invoice):
+        """381 credit note, 480 out of scope, 380 tax invoice."""
+        if invoice.is_return == 1:
+            return "381"
+        if invoice.custom_vat_category == OUT_OF_SCOPE:
+            return "480"
+        return "380"
+
+    def get_line_description(self, item):
+        return item.description or item.item_name
+
+    def get_payment_means(self, context):
+        """Build UAE E-invoicing payment_means array from Sales Invoice payments."""
+        invoice = context.invoice
+        payment_means_list = []
+
+        for pay_row in invoice.payments:
+            mop = context.modes_of_payment[pay_row.mode_of_payment]
+
+            # Payment means code stored on the Mode of Payment, e.g. "30 - Credit transfer"
+            pm_code = mop.get("custom_payment_means_codes") or ""
+            payment_code = ""
+            payment_option = ""
+            if pm_code and " - " in pm_code:
+                payment_option = pm_code.split(" - ")[1]
+                payment_code = pm_code.split(" - ")[0]
+
+            # First account under Mode of Payment → Accounts child table
+            if not mop.accounts:
+                continue
+
+            acc = context.accounts[mop.accounts[0].default_account]
+
+            payment_means_entry = {
+                "payment_means_code": payment_code,
+                "payment_means_code_name": payment_option,
+                "payee_financial_account": {
+                    "id": acc.account_number,
+                    "id_scheme_id": "IBAN" if acc.account_type == "Bank" else "OTH",
+                    "name": acc.account_name,
+                    "financial_institution_branch": {
+                        "id": acc.company or ""
+                    }
+                }
+            }
+
+            # If card payments → include card details (optional)
+            if pm_code in ["48", "55", "57"]:  # Debit/Credit card
+                payment_means_entry["card_account"] = {
+                    "primary_account_number_id": "XXXXXXXXXXXX1234",
+                    "network_id": "VISA",
+                    "holder_name": invoice.customer
+                }
+
+            payment_means_list.append(payment_means_entry)
+
+        return payment_means_list
+
+
+class PurchaseInvoiceAdapter(InvoiceAdapter):
+    doctype = "Purchase Invoice"
+    charge_field = "change_amount"
+
+    def get_document_type(self, invoice):
+        """361 credit note, 389 self-billed invoice."""
+        if invoice.is_return == 1:
+            return "361"
+        return "389"
+
+    def get_payment_means(self, context):
+        """Build UAE E-invoicing payment_means for Purchase Invoice from its payment means code."""
+        invoice = context.invoice
+        pm_code = invoice.get("custom_payment_means_codes") or "30"
+
+        payment_means_entry = {
+            "payment_means_code": pm_code,
+            "payment_means_code_name": "Credit" if pm_code == "30" else "Other"
+        }
+
+        if pm_code in ["48", "55", "57"]:
+            payment_means_entry["card_account"] = {
+                "primary_account_number_id": "XXXXXXXXXXXX1234",
+                "network_id": "VISA",
+                "holder_name": invoice.supplier or ""
+            }
+
+        return [payment_means_entry]
+
+
+ADAPTERS = {
+    adapter.doctype: adapter
+    for adapter in (SalesInvoiceAdapter(), PurchaseInvoiceAdapter())
+}
+
+
+def get_adapter(doctype):
+    adapter = ADAPTERS.get(doctype)
+    if not adapter:
+        frappe.throw(_("UAE E-Invoicing is not supported for {0}").format(doctype))
+    return adapter
+
+
+def get_icv_code(invoice_number):
+    """
+    Extracts the numeric part from the invoice number to generate the ICV code.
+    """
+    try:
+        return re.sub(r"\D", "", invoice_number)
+    except TypeError as e:
+        frappe.throw(_("Type error in getting ICV number: " + str(e)))
+    except re.error as e:
+        frappe.throw(_("Regex error in getting ICV number: " + str(e)))
+
+
+def get_due_date(invoice):
+    """
+    IBT-009 / ibr-127-ae compliant due date resolver (validated by rules.py)
+    """
+    if invoice.is_return == 1:
+        return None
+    if invoice.custom_invoice_transaction_type_code == DEEMED_SUPPLY:
+        return None
+    if invoice.outstanding_amount > 0:
+        return invoice.due_date.strftime("%Y-%m-%d")
+    return None
+
+
+def get_invoice_period(invoice):
+    """
+    IBG-14 / UAE compliant InvoicePeriod resolver (validated by rules.py)
+    """
+    start_date = invoice.posting_date
+    end_date = invoice.due_date
+    if not start_date and not end_date:
+        return None
+
+    return {
+        "start_date": start_date.strftime("%Y-%m-%d") if start_date else None,
+        "end_date": end_date.strftime("%Y-%m-%d") if end_date else None,
+        "description_code": invoice.custom_frequency_billing_code_list
+    }
+
+
+def get_issue_time(invoice):
+    """IBT-010 / ibr-128-ae compliant Issue Time resolver"""
+    issue_time = invoice.posting_time
+    if not issue_time:
+        return None
+    if isinstance(issue_time, timedelta):
+        total_seconds = int(issue_time.total_seconds())
+        hours = total_seconds // 3600
+        minutes = (total_seconds % 3600) // 60
+        seconds = total_seconds % 60
+        return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+    return issue_time.strftime("%H:%M:%S")
+
+
+def get_tax_point_date(invoice):
+    """
+    Returns tax_point_date as the day before the issue date,
+    but NOT for credit notes or invoices without a due date.
+    """
+    if invoice.is_return == 1:
+        return None
+    if not invoice.due_date:
+        return None
+    return (invoice.posting_date - timedelta(days=1)).strftime("%Y-%m-%d")
+
+
+def get_currency_exchange_rate(invoice):
+    """
+    Returns currency exchange rate (cbc:ExchangeRate) for AED conversion
+    """
+    if invoice.currency == "AED":
+        return None
+    exchange_rate = Decimal(invoice.conversion_rate).quantize(Decimal("0.000001"), rounding=ROUND_HALF_UP)
+    return float(exchange_rate)
+
+
+def get_transaction_type_code(invoice):
+    """
+    Extracts the 7-char transaction type pattern
+    """
+    raw = invoice.custom_invoice_transaction_type_code
+    if not raw:
+        return None
+    return raw.split(":")[0].strip()
+
+
+def get_invoice_transaction_metadata(invoice):
+    """Extracts the invoice transaction metadata bits from the custom field and returns a dict of flags for each type."""
+    code = (invoice.custom_invoice_transaction_type_code or "").strip()
+
+    # Pad to the 8 flag positions
+    bit_code = code.split(":")[0].strip().ljust(8, "X") if code else "X" * 8
+
+    return {
+        "is_ftz": bit_code[0] == "1",
+        "is_deemed": bit_code[1] == "1",
+        "is_margin": bit_code[2] == "1",
+        "is_summary": bit_code[3] == "1",
+        "is_continuous": bit_code[4] == "1",
+        "is_dab": bit_code[5] == "1",
+        "is_ecommerce": bit_code[6] == "1",
+        "is_export": bit_code[7] == "1",
+    }
+
+
+def get_uae_emirate_code(emirate_name):
+    """
+    Convert full UAE emirate name to PEPPOL subdivision code.
+    Required values:
+    AUH, DXB, SHJ, AJM, UAQ, RAK, FUJ
+    """
+    return get_emirate_code(emirate_name)
+
+
+def get_vat_category_code(vat_category_label):
+    """
+    Convert VAT category label to PEPPOL VAT category code.
+    Allowed codes:
+    S, Z, E, AE, O, N
+    """
+    if not vat_category_label:
+        return None
+
+    code = lookup_vat_category_code(vat_category_label)
+
+    if not code:
+        frappe.throw(_(
+            f"Invalid VAT Category: {vat_category_label}. "
+            "Must be one of S, Z, E, AE, O, N."
+        ))
+
+    return code
+
+
+def get_receiving_party(context, adapter, transaction_code):
+    """IBG-07 receiving party, from the Customer or Supplier and its address."""
+    party = context.party
+    address = context.address
+    party_name = adapter.get_party_name(context)
+
+    receiving_party = {
+        "trade_name": party_name,
+        "peppol_id": party.custom_peppol_id,
+        "street_address": address.address_line1,
+        "city_address": address.city,
+        "additional_street_address": address.address_line2,
+        "postal_zone": address.pincode,
+        "emirates_code": get_uae_emirate_code(address.emirate),
+        "additional_address_lines": address.address_line2,
+        "country_code": get_country_code(address.country),
+        "vat_number": party.tax_id,
+        "legal_name": party_name,
+        "contact_name": party_name,
+        "contact_telephone": address.phone,
+        "contact_email": address.email_id,
+    }
+    if party.get("custom_legal_registration_identifier_type") == "Commercial/Trade license":
+        receiving_party["identifiers"] = [{
+            "type": "TL",
+            "value": party.custom_trade_license_number,
+        }]
+    if transaction_code and transaction_code.startswith("1"):
+        receiving_party["fz_beneficiary_id"] = party.custom_fz_beneficiary_id
+
+    return receiving_party
+
+
+def get_document_references(context):
+    """IBG-03 preceding invoice reference for credit notes."""
+    invoice = context.invoice
+    if not invoice.is_return:
+        return []
+
+    if invoice.return_against:
+        return [{
+            "id": context.return_against.name,
+            "issue_date": str(context.return_against.posting_date),
+        }]
+    if invoice.get("custom_return_against_for_uae_einvoice"):
+        return [{
+            "id": invoice.custom_return_against_for_uae_einvoice,
+            "issue_date": "",
+        }]
+    return []
+
+
+def get_item_data(context, adapter, vat_rate):
+    """Builds the invoice lines with tax and classification details; the lines are validated up front by rules.py."""
+    invoice_doc = context.invoice
+    totals = TotalsAccumulator()
+    invoice_lines = []
+
+    def r2(val):
+        return float(Decimal(val).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP))
+
+    for idx, item in enumerate(invoice_doc.lines, 1):
+        commodity_code, hs_field, sac_field = ITEM_CLASSIFICATIONS.get(
+            item.custom_item_type_codes, (None, None, None)
+        )
+
+        # VAT category, rate, exemption and reverse-charge codes come from the
+        # Item Tax Template when the line has one, otherwise from the invoice
+        if item.item_tax_template:
+            item_tax_template = context.item_tax_templates[item.item_tax_template]
+            vat_category = item_tax_template.custom_vat_category or invoice_doc.custom_vat_category
+            tax_rate = item_tax_template.taxes[0].tax_rate if item_tax_template.taxes else vat_rate
+            exemption_reason = item_tax_template.custom_vat_exemption_reason_code
+            rcm_nature_code = item_tax_template.custom_rcm_nature_code
+        else:
+            vat_category = invoice_doc.custom_vat_category
+            tax_rate = vat_rate
+            exemption_reason = invoice_doc.custom_vat_exemption_reason_code
+            rcm_nature_code = invoice_doc.custom_rcm_nature_code
+
+        # Amounts (summed for the invoice totals in the same pass)
+        line_extension_amount = totals.add_line(item, tax_rate)
+        vat_category_code = get_vat_category_code(vat_category)
+
+        invoice_line = {
+            "id": str(idx),
+            "note": "Please check the invoice",
+            "invoiced_quantity": str(item.qty),
+            "uom": item.uom,
+            "line_extension_amount": line_extension_amount,
+            "accounting_cost": item.cost_center,
+            "name": item.item_name,
+            "description": adapter.get_line_description(item),
+            "commodity_code": commodity_code,
+            "hs_code": item.get(hs_field) if hs_field else None,
+            "sac_code": item.get(sac_field) if sac_field else None,
+            "vat_category": vat_category_code,
+            "vat_percentage": r2(tax_rate),
+            "unit_price": r2(item.rate),
+            "base_quantity": "1"
+        }
+
+        if vat_category_code == "E" and exemption_reason:
+            invoice_line["vat_exemption_reason_code"] = exemption_reason.split(" - ")[0]
+        elif vat_category_code == "AE" and rcm_nature_code:
+            invoice_line["rcm_nature_code"] = rcm_nature_code.split(" - ")[0]
+        invoice_lines.append(invoice_line)
+
+    return invoice_lines, totals.finish(invoice_doc, charge_field=adapter.charge_field)
+
+
+def add_credit_note_details(invoice_doc, invoice_json):
+    """Adds credit note reason code and reason to the invoice JSON if the document is a credit note with reason specified."""
+    if not invoice_doc.is_return:
+        return invoice_json
+
+    raw_value = invoice_doc.custom_credit_note_reason_code
+
+    # Split code and reason from "DL8.61.1.A-Cancellation" format
+    if "-" in raw_value:
+        code, reason = (part.strip() for part in raw_value.split("-", 1))
+    else:
+        code = reason = raw_value.strip()
+
+    invoice_json.update({
+        "credit_note_reason_code": code,
+        "credit_note_reason": reason
+    })
+
+    return invoice_json
+
+
+def build_invoice_payload(context, adapter=None):
+    """Builds the UAE / PEPPOL compliant JSON invoice payload from a validated invoice context."""
+    adapter = adapter or get_adapter(context.doctype)
+    invoice_doc = context.invoice
+    transaction_code = get_transaction_type_code(invoice_doc)
+
+    invoice = {
+        "document_identifier": invoice_doc.name,
+        "issue_date": str(invoice_doc.posting_date),
+        "issue_time": get_issue_time(invoice_doc),
+        "due_date": get_due_date(invoice_doc),
+        "document_type": adapter.get_document_type(invoice_doc),
+        "note": invoice_doc.custom_invoice_note,
+        "tax_point_date": get_tax_point_date(invoice_doc),
+        "document_currency": invoice_doc.currency.upper(),
+        "buyer_reference": get_icv_code(invoice_doc.name),
+        "invoice_period": get_invoice_period(invoice_doc),
+        "document_references": get_document_references(context),
+        "receiving_party": get_receiving_party(context, adapter, transaction_code),
+        "invoice_lines": [],
+        "legal_monetary_total": {},
+        "payment_means": [
+            adapter.get_payment_means(context)
+        ],
+        "invoice_totals": {},
+        "metadata": get_invoice_transaction_metadata(invoice_doc)
+    }
+    invoice = add_credit_note_details(invoice_doc, invoice)
+
+    exchange_rate = get_currency_exchange_rate(invoice_doc)
+    if exchange_rate is not None:
+        invoice["currency_exchange_rate"] = exchange_rate
+
+    # Optional accounting_cost at invoice level
+    if invoice_doc.get("cost_center"):
+        invoice["accounting_cost"] = invoice_doc.cost_center
+
+    vat_rate = to_decimal(invoice_doc.taxes[0].rate if invoice_doc.taxes else 0)
+    invoice["invoice_lines"], totals = get_item_data(context, adapter, vat_rate)
+    invoice["legal_monetary_total"] = totals.legal_monetary_total()
+    invoice["invoice_totals"] = totals.invoice_totals()
+
+    if minimizer_enabled():
+        invoice, report = minimize_payload(invoice)
+        log_reduction(context.doctype, invoice_doc.name, report)
+
+    return invoice
+
+
+def build_invoice_json(doctype, invoice_number):
+    """Loads, validates and builds the payload of one Sales or Purchase Invoice."""
+    adapter = get_adapter(doctype)
+    context = load_invoice_context(doctype, invoice_number)
+    validate_invoice(context)
+    invoice = build_invoice_payload(context, adapter)
+    log_query_count(context)
+    return invoice
+
+
+def build_invoice_json_many(doctype, invoice_numbers):
+    """
+    Yields frappe._dict(name, payload, error) for each invoice, one at a time.
+    Invoices are loaded in company / party ordered batches so Company, party,
+    address and master lookups are shared (see prefetch.iter_invoice_contexts).
+    """
+    adapter = get_adapter(doctype)
+
+    for name, context, error in iter_invoice_contexts(doctype, invoice_numbers):
+        payload = None
+        if not error:
+            violations = collect_violations(context)
+            if violations:
+                error = "<br>".join(violations)
+        if not error:
+            try:
+                payload = build_invoice_payload(context, adapter)
+            except frappe.ValidationError as e:
+                error = str(e)
+
+        yield frappe._dict(name=name, payload=payload, error=error)
+
+
+def get_payload_hash(invoice_json):
+    """SHA-256 of the canonical JSON (sorted keys, compact separators), so equal payloads always hash equal."""
+    canonical = json.dumps(
+        invoice_json, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _is_stale_attachment(file_name, keep_xml):
+    file_name = file_name.lower()
+    if keep_xml:
+        return file_name.endswith("_uae_invoice.json")
+    return file_name.endswith((".xml", ".json"))
+
+
+def delete_stale_xml(doctype, invoice_number, payload_hash):
+    """Deletes the XML of an earlier submission unless the payload is unchanged."""
+    if frappe.db.get_value(doctype, invoice_number, "custom_uae_payload_hash") == payload_hash:
+        return
+    for name in frappe.get_all(
+        "File",
+        filters={
+            "attached_to_doctype": doctype,
+            "attached_to_name": invoice_number,
+            "file_name": ["like", "%.xml"],
+        },
+        pluck="name",
+    ):
+        frappe.delete_doc("File", name, force=1)
+
+
+def save_and_attach_invoice_json(doctype, invoice_number, invoice_json=None, keep_xml=False):
+    """
+    Builds UAE invoice JSON (unless a prebuilt one is passed), deletes ALL
+    earlier XML/JSON attachments, and attaches ONLY the latest file.
+    When the payload hash matches the one stored on the invoice, the existing
+    attachment is reused as is. With keep_xml, only earlier JSON payloads are
+    deleted, so an XML Flick returned in the meantime stays attached.
+    """
+    if invoice_json is None:
+        invoice_json = build_invoice_json(doctype, invoice_number)
+    payload_hash = get_payload_hash(invoice_json)
+    file_name = f"{invoice_number}_uae_invoice.json"
+
+    old_files = frappe.get_all(
+        "File",
+        filters={
+            "attached_to_doctype": doctype,
+            "attached_to_name": invoice_number,
+        },
+        fields=["name", "file_name", "file_url"],
+    )
+
+    if frappe.db.get_value(doctype, invoice_number, "custom_uae_payload_hash") == payload_hash:
+        for f in old_files:
+            if f.file_name == file_name:
+                return {
+                    "file_name": f.file_name,
+                    "file_url": f.file_url,
+                    "payload_hash": payload_hash,
+                    "reused": True,
+                }
+
+    # Delete XML & JSON files only
+    for f in old_files:
+        if _is_stale_attachment(f.file_name, keep_xml):
+            frappe.delete_doc("File", f.name, force=1)
+    file_doc = frappe.get_doc({
+        "doctype": "File",
+        "file_name": file_name,
+        "is_private": 1,
+        "content": dumps(invoice_json),
+        "attached_to_doctype": doctype,
+        "attached_to_name": invoice_number,
+    })
+    file_doc.insert(ignore_permissions=True)
+    frappe.db.set_value(doctype, invoice_number, "custom_uae_payload_hash", payload_hash, update_modified=False)
+
+    frappe.db.commit()  # nosemgrep: frappe-manual-commit
+
+    return {
+        "file_name": file_doc.file_name,
+        "file_url": file_doc.file_url,
+        "payload_hash": payload_hash,
+        "reused": False,
+    }
+
+
+def attach_invoice_json(doctype, invoice_number, invoice_json):
+    """
+    Persists an already submitted payload as the invoice's JSON attachment.
+    Runs in a background job after commit unless the site config sets
+    uae_einvoice_defer_json_attachment to 0. The earlier XML is deleted here,
+    before the submission, because the job only runs after Flick's new XML
+    has been stored.
+    """
+    if cint(frappe.conf.get("uae_einvoice_defer_json_attachment", 1)):
+        delete_stale_xml(doctype, invoice_number, get_payload_hash(invoice_json))
+        frappe.enqueue(
+            "uae_erpgulf.uae_erpgulf.invoice_payload.save_and_attach_invoice_json",
+            queue="short",
+            enqueue_after_commit=True,
+            doctype=doctype,
+            invoice_number=invoice_number,
+            invoice_json=invoice_json,
+            keep_xml=True,
+        )
+        return None
+
+    return save_and_attach_invoice_json(doctype, invoice_number, invoice_json)
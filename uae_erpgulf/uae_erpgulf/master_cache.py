@@ -0,0 +1,157 @@
+"""
+Two-level (in-process LRU + Redis) cache for Item Tax Template, Mode of Payment
+and Account records. Each doctype carries a modified stamp in Redis that
+doc_events bump, so every worker drops its local copies on the next lookup.
+The Redis level is one hash per doctype, read with a single HMGET per lookup;
+it expires when unused and is dropped once it grows past MAX_REDIS_ENTRIES.
+"""
+
+import pickle
+from collections import OrderedDict
+
+import frappe
+from frappe.utils import now
+
+
+MASTER_DOCTYPES = ("Item Tax Template", "Mode of Payment", "Account")
+MAX_LOCAL_ENTRIES = 2048
+MAX_REDIS_ENTRIES = 10000  # per doctype
+REDIS_TTL = 24 * 3600  # seconds, renewed whenever records are added
+
+_local_entries = OrderedDict()
+_local_stats = {"local_hits": 0, "redis_hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+
+def _records_key(doctype):
+    return f"uae_einvoice_master|{doctype}"
+
+
+def _read_records(doctype, names):
+    """Cached (stamp, record) entries of the names, None for the ones not cached, in one round trip."""
+    values = frappe.cache.execute_command("HMGET", frappe.cache.make_key(_records_key(doctype)), *names)
+    return [pickle.loads(value) if value else None for value in values]
+
+
+def _write_records(doctype, entries):
+    key = frappe.cache.make_key(_records_key(doctype))
+    pipeline = frappe.cache.pipeline()
+    pipeline.hset(key, mapping={name: pickle.dumps(entry) for name, entry in entries.items()})
+    pipeline.expire(key, REDIS_TTL)
+    pipeline.hlen(key)
+    if pipeline.execute()[-1] > MAX_REDIS_ENTRIES:
+        frappe.cache.delete_key(_records_key(doctype))
+
+
+def _stamp_key(doctype):
+    return f"uae_einvoice_master_modified|{doctype}"
+
+
+def _stats_key(counter):
+    return frappe.cache.make_key(f"uae_einvoice_master_stats|{counter}")
+
+
+def _get_stamp(doctype):
+    return frappe.cache.get_value(_stamp_key(doctype), generator=now)
+
+
+def _remember_locally(doctype, name, stamp, value):
+    key = (frappe.local.site, doctype, name)
+    _local_entries[key] = (stamp, value)
+    _local_entries.move_to_end(key)
+    while len(_local_entries) > MAX_LOCAL_ENTRIES:
+        _local_entries.popitem(last=False)
+        _local_stats["evictions"] += 1
+
+
+def _count(counters):
+    for counter, value in counters.items():
+        if value:
+            _local_stats[counter] += value
+            frappe.cache.incrby(_stats_key(counter), value)
+
+
+def get_masters(doctype, names, loader):
+    """
+    Returns {name: record} for the given names, loading only the misses
+    through loader(names) and storing them in both cache levels.
+    """
+    names = sorted({name for name in names if name})
+    if not names:
+        return {}
+
+    stamp = _get_stamp(doctype)
+    counters = {"local_hits": 0, "redis_hits": 0, "misses": 0}
+    records = {}
+    missing = []
+
+    not_local = []
+    for name in names:
+        key = (frappe.local.site, doctype, name)
+        entry = _local_entries.get(key)
+        if entry and entry[0] == stamp:
+            _local_entries.move_to_end(key)
+            records[name] = entry[1]
+            counters["local_hits"] += 1
+        else:
+            not_local.append(name)
+
+    if not_local:
+        for name, entry in zip(not_local, _read_records(doctype, not_local)):
+            if entry and entry[0] == stamp:
+                _remember_locally(doctype, name, stamp, entry[1])
+                records[name] = entry[1]
+                counters["redis_hits"] += 1
+            else:
+                missing.append(name)
+
+    if missing:
+        counters["misses"] += len(missing)
+        loaded = loader(missing)
+        if loaded:
+            _write_records(doctype, {name: (stamp, value) for name, value in loaded.items()})
+        for name, value in loaded.items():
+            _remember_locally(doctype, name, stamp, value)
+            records[name] = value
+
+    _count(counters)
+    return records
+
+
+def invalidate_master_data(doc, method=None):
+    """doc_events handler: drops the cached records of the changed doctype in every worker."""
+    if doc.doctype not in MASTER_DOCTYPES:
+        return
+
+    frappe.cache.delete_key(_records_key(doc.doctype))
+    frappe.cache.set_value(_stamp_key(doc.doctype), now())
+    _count({"invalidations": 1})
+
+
+@frappe.whitelist()
+def get_master_cache_stats():
+    """Hit / miss counters of the master-data cache for this worker and across all workers."""
+    frappe.only_for("System Manager")
+
+    return {
+        "worker": dict(_local_stats, entries=len(_local_entries), max_entries=MAX_LOCAL_ENTRIES),
+        "site": {
+            counter: int(frappe.cache.get(_stats_key(counter)) or 0)
+            for counter in _local_stats
+        },
+    }
+
+
+@frappe.whitelist()
+def clear_master_cache():
+    """Drops every cached master record and resets the counters."""
+    frappe.only_for("System Manager")
+
+    for doctype in MASTER_DOCTYPES:
+        frappe.cache.delete_key(_records_key(doctype))
+        frappe.cache.set_value(_stamp_key(doctype), now())
+    for counter in _local_stats:
+        frappe.cache.delete(_stats_key(counter))
+        _local_stats[counter] = 0
+    _local_entries.clear()
+
+    return get_master_cache_stats()
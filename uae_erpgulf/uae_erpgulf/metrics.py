@@ -0,0 +1,282 @@
+"""
+Latency, status and payload size of every outbound Flick call.
+
+Each HTTP attempt is recorded under (company, endpoint template, method) into
+two Redis hashes: a cumulative one exposed in Prometheus text format by
+get_prometheus_metrics, and one per UTC hour kept for HOUR_RETENTION hours,
+which rollup_metrics condenses into UAE Flick HTTP Metric records.
+
+A MetricsRecorder resolves its Redis key prefix when it is created, so it can
+be used afterwards from worker threads that have no frappe.local.
+"""
+
+import json
+import re
+import time
+from datetime import datetime, timedelta, timezone
+
+import frappe
+import requests
+from frappe.utils import cint
+from redis.exceptions import RedisError
+from werkzeug.wrappers import Response
+
+
+METRIC_DOCTYPE = "UAE Flick HTTP Metric"
+# Histogram upper bounds in milliseconds; slower calls land in +Inf
+BUCKETS_MS = (25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+HOUR_RETENTION = 48  # hours a per-hour hash is kept for the rollup and get_http_metrics
+PERCENTILES = (50, 95, 99)
+
+# Flick paths with their variable parts replaced, so calls group per endpoint
+PATH_TEMPLATES = [
+    (re.compile(pattern), template)
+    for pattern, template in (
+        (r"^/v1/participants/[^/]+$", "/v1/participants/{participant}"),
+        (r"^/v1/webhooks/subscriptions/[^/]+/deliveries$", "/v1/webhooks/subscriptions/{uuid}/deliveries"),
+        (r"^/v1/webhooks/subscriptions/[^/]+$", "/v1/webhooks/subscriptions/{uuid}"),
+        (r"^/v1/peppol/lookup/[^/]+$", "/v1/peppol/lookup/{peppol_id}"),
+        (r"^/v1/[^/]+/documents/[^/]+/xml$", "/v1/{participant}/documents/{id}/xml"),
+        (r"^/v1/[^/]+/documents/[^/]+/pdf$", "/v1/{participant}/documents/{id}/pdf"),
+        (r"^/v1/(?!webhooks/)[^/]+/documents/[^/]+$", "/v1/{participant}/documents/{id}"),
+        (r"^/v1/(?!webhooks/)[^/]+/documents$", "/v1/{participant}/documents"),
+        (r"^/v1/[^/]+/simulate/incoming$", "/v1/{participant}/simulate/incoming"),
+    )
+]
+
+
+def path_template(path):
+    path = path.split("?", 1)[0].rstrip("/") or "/"
+    for pattern, template in PATH_TEMPLATES:
+        if pattern.match(path):
+            return template
+    return path
+
+
+def _bucket(duration_ms):
+    for le in BUCKETS_MS:
+        if duration_ms <= le:
+            return str(le)
+    return "+Inf"
+
+
+def _hour_suffix(timestamp):
+    return time.strftime("%Y%m%d%H", time.gmtime(timestamp))
+
+
+def _metrics_prefix():
+    return frappe.cache.make_key("uae_flick_metrics")
+
+
+class MetricsRecorder:
+    """Records the HTTP calls of one Company."""
+
+    def __init__(self, company):
+        self.company = company
+        self.redis = frappe.cache
+        self.prefix = _metrics_prefix()
+
+    def record(self, method, template, status, duration_ms, request_bytes=0, response_bytes=0):
+        series = f"{self.company}|{template}|{method}"
+        hour_key = f"{self.prefix}|{_hour_suffix(time.time())}"
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for key in (f"{self.prefix}|total", hour_key):
+                pipe.hincrby(key, f"{series}|count", 1)
+                pipe.hincrbyfloat(key, f"{series}|sum_ms", round(duration_ms, 3))
+                pipe.hincrby(key, f"{series}|le|{_bucket(duration_ms)}", 1)
+                pipe.hincrby(key, f"{series}|status|{status}", 1)
+                pipe.hincrby(key, f"{series}|request_bytes", request_bytes)
+                pipe.hincrby(key, f"{series}|response_bytes", response_bytes)
+            pipe.expire(hour_key, HOUR_RETENTION * 3600)
+            pipe.execute()
+        except RedisError:
+            pass
+
+    def instrument(self, send, method, path, request_bytes=0, stream=False):
+        """Wraps send() so every call is recorded; streamed bodies are counted by Content-Length."""
+        template = path_template(path)
+
+        def timed_send():
+            started = time.perf_counter()
+            try:
+                response = send()
+            except requests.exceptions.RequestException:
+                self.record(method, template, "error", (time.perf_counter() - started) * 1000, request_bytes)
+                raise
+
+            duration_ms = (time.perf_counter() - started) * 1000
+            if stream:
+                response_bytes = cint(response.headers.get("Content-Length"))
+            else:
+                response_bytes = len(response.content)
+            self.record(method, template, response.status_code, duration_ms, request_bytes, response_bytes)
+            return response
+
+        return timed_send
+
+
+def _parse(raw):
+    """{(company, endpoint, method): {"count", "sum_ms", "le": {}, "status": {}, ...}} from a metrics hash."""
+    series = {}
+    for field, value in (raw or {}).items():
+        if isinstance(field, bytes):
+            field = field.decode()
+        parts = field.split("|")
+        if len(parts) >= 5 and parts[-2] in ("le", "status"):
+            label, metric, parts = parts[-1], parts[-2], parts[:-2]
+        else:
+            label, metric, parts = None, parts[-1], parts[:-1]
+        if len(parts) < 3:
+            continue
+
+        key = ("|".join(parts[:-2]), parts[-2], parts[-1])
+        entry = series.setdefault(key, {"count": 0, "sum_ms": 0.0, "request_bytes": 0, "response_bytes": 0,
+                                        "le": {}, "status": {}})
+        if label is not None:
+            entry[metric][label] = entry[metric].get(label, 0) + int(value)
+        elif metric == "sum_ms":
+            entry["sum_ms"] += float(value)
+        else:
+            entry[metric] = entry.get(metric, 0) + int(value)
+    return series
+
+
+def _merge(target, entry):
+    for metric in ("count", "sum_ms", "request_bytes", "response_bytes"):
+        target[metric] += entry[metric]
+    for metric in ("le", "status"):
+        for label, value in entry[metric].items():
+            target[metric][label] = target[metric].get(label, 0) + value
+
+
+def estimate_percentile(le_counts, pct):
+    """Percentile in ms from histogram bucket counts, interpolating linearly inside the bucket."""
+    total = sum(le_counts.values())
+    if not total:
+        return None
+    rank = pct / 100 * total
+    seen = 0
+    lower = 0
+    for le in BUCKETS_MS:
+        count = le_counts.get(str(le), 0)
+        if count and seen + count >= rank:
+            return round(lower + (le - lower) * (rank - seen) / count, 2)
+        seen += count
+        lower = le
+    return float(BUCKETS_MS[-1])
+
+
+def summarize(entry):
+    count = entry["count"]
+    errors = sum(n for status, n in entry["status"].items() if status == "error" or cint(status) >= 400)
+    summary = {
+        "request_count": count,
+        "error_count": errors,
+        "avg_ms": round(entry["sum_ms"] / count, 2) if count else 0,
+        "request_bytes": entry["request_bytes"],
+        "response_bytes": entry["response_bytes"],
+        "status_codes": entry["status"],
+    }
+    for pct in PERCENTILES:
+        summary[f"p{pct}_ms"] = estimate_percentile(entry["le"], pct)
+    return summary
+
+
+def read_hour(hour):
+    """Parsed metrics of one UTC hour, given as a naive UTC datetime."""
+    return _parse(frappe.cache.execute_command("HGETALL", f"{_metrics_prefix()}|{hour.strftime('%Y%m%d%H')}"))
+
+
+def rollup_metrics():
+    """Hourly: stores the last two complete UTC hours as UAE Flick HTTP Metric records (upserted)."""
+    current_hour = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0, tzinfo=None)
+    for hours_ago in (2, 1):
+        hour = current_hour - timedelta(hours=hours_ago)
+        for (company, endpoint, method), entry in read_hour(hour).items():
+            values = summarize(entry)
+            values["status_codes"] = json.dumps(values["status_codes"], sort_keys=True)
+            filters = {"hour": hour, "company": company, "endpoint": endpoint, "method": method}
+
+            name = frappe.db.get_value(METRIC_DOCTYPE, filters)
+            if name:
+                frappe.db.set_value(METRIC_DOCTYPE, name, values, update_modified=False)
+            else:
+                frappe.get_doc(dict(filters, doctype=METRIC_DOCTYPE, **values)).insert(ignore_permissions=True)
+    frappe.db.commit()  # nosemgrep: frappe-manual-commit
+
+
+@frappe.whitelist()
+def get_http_metrics(hours: int = 1):
+    """Per-endpoint call counts, errors and p50 / p95 / p99 over the last `hours` UTC hours, current one included."""
+    frappe.only_for("System Manager")
+
+    hours = min(max(cint(hours), 1), HOUR_RETENTION)
+    current_hour = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0, tzinfo=None)
+    merged = {}
+    for hours_ago in range(hours):
+        for key, entry in read_hour(current_hour - timedelta(hours=hours_ago)).items():
+            if key not in merged:
+                merged[key] = {"count": 0, "sum_ms": 0.0, "request_bytes": 0, "response_bytes": 0,
+                               "le": {}, "status": {}}
+            _merge(merged[key], entry)
+
+    return [
+        dict(company=company, endpoint=endpoint, method=method, **summarize(entry))
+        for (company, endpoint, method), entry in sorted(merged.items())
+    ]
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def prometheus_text(series):
+    """Prometheus text exposition of the cumulative metrics."""
+    lines = [
+        "# HELP uae_flick_http_request_duration_seconds Duration of Flick API calls.",
+        "# TYPE uae_flick_http_request_duration_seconds histogram",
+    ]
+    for (company, endpoint, method), entry in sorted(series.items()):
+        labels = f'company="{_label(company)}",endpoint="{_label(endpoint)}",method="{method}"'
+        cumulative = 0
+        for le in BUCKETS_MS:
+            cumulative += entry["le"].get(str(le), 0)
+            lines.append(f'uae_flick_http_request_duration_seconds_bucket{{{labels},le="{le / 1000}"}} {cumulative}')
+        lines.append(f'uae_flick_http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {entry["count"]}')
+        lines.append(f"uae_flick_http_request_duration_seconds_sum{{{labels}}} {entry['sum_ms'] / 1000}")
+        lines.append(f"uae_flick_http_request_duration_seconds_count{{{labels}}} {entry['count']}")
+
+    for metric, help_text in (
+        ("requests_total", "Flick API calls by status code (error: no response)."),
+        ("request_bytes_total", "Bytes sent to the Flick API."),
+        ("response_bytes_total", "Bytes received from the Flick API."),
+    ):
+        lines.append(f"# HELP uae_flick_http_{metric} {help_text}")
+        lines.append(f"# TYPE uae_flick_http_{metric} counter")
+        for (company, endpoint, method), entry in sorted(series.items()):
+            labels = f'company="{_label(company)}",endpoint="{_label(endpoint)}",method="{method}"'
+            if metric == "requests_total":
+                for status, count in sorted(entry["status"].items()):
+                    lines.append(f'uae_flick_http_requests_total{{{labels},status="{status}"}} {count}')
+            else:
+                lines.append(f"uae_flick_http_{metric}{{{labels}}} {entry[metric.rsplit('_', 1)[0]]}")
+
+    return "\n".join(lines) + "\n"
+
+
+@frappe.whitelist()
+def get_prometheus_metrics():
+    """Scrape target for Prometheus (authenticate with a System Manager's API key)."""
+    frappe.only_for("System Manager")
+
+    series = _parse(frappe.cache.execute_command("HGETALL", f"{_metrics_prefix()}|total"))
+    return Response(prometheus_text(series), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@frappe.whitelist()
+def reset_http_metrics():
+    """Clears the cumulative counters; hourly hashes and rolled up records are kept."""
+    frappe.only_for("System Manager")
+
+    frappe.cache.execute_command("DEL", f"{_metrics_prefix()}|total")
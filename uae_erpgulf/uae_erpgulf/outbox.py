@@ -0,0 +1,278 @@
+"""
+Transactional outbox for invoice submissions to Flick.
+
+The on_submit hook writes a Pending UAE E-Invoice Outbox row with the built
+payload in the same transaction as the invoice, so a submitted invoice always
+has a record of what still has to reach Flick. A job enqueued after commit
+delivers it right away; dispatch_outbox runs every minute and claims due rows
+(Pending, or Retrying past next_attempt_at) in batches with
+SELECT ... FOR UPDATE SKIP LOCKED, so concurrent dispatchers never send a row
+twice.
+
+A row succeeds as soon as Flick's 200 answer or document id is stored on the
+invoice; the XML / PDF downloads that follow cannot fail it. A failed delivery
+is retried with exponential backoff plus jitter. After
+uae_einvoice_outbox_max_attempts attempts the row is parked as Dead with its
+last error, until retry_dead puts it back. A submission that timed out waiting
+for the answer is parked at once: Flick may have the invoice, so it is not
+sent again without someone checking.
+
+    Pending -> In Flight -> Succeeded
+                         -> Retrying -> In Flight ...
+                         -> Dead -> (retry_dead) -> Pending
+"""
+
+import math
+import random
+
+import frappe
+import requests
+from frappe import _
+from frappe.utils import add_to_date, cint, now_datetime
+from uae_erpgulf.uae_erpgulf.circuit_breaker import CircuitBreaker
+from uae_erpgulf.uae_erpgulf.credentials import get_credentials
+from uae_erpgulf.uae_erpgulf.serialization import load_stored, pack
+from uae_erpgulf.uae_erpgulf.spool import SENDERS, SPOOLABLE_ERRORS
+from uae_erpgulf.uae_erpgulf.submission import JOB_TIMEOUT, get_submit_queue, publish_status
+
+
+OUTBOX_DOCTYPE = "UAE E-Invoice Outbox"
+PENDING = "Pending"
+IN_FLIGHT = "In Flight"
+SUCCEEDED = "Succeeded"
+RETRYING = "Retrying"
+DEAD = "Dead"
+OPEN_STATES = (PENDING, IN_FLIGHT, RETRYING)
+
+DEFAULT_MAX_ATTEMPTS = 8
+BASE_DELAY = 60  # seconds before the first retry, doubled per attempt
+MAX_DELAY = 6 * 3600
+JITTER = 0.25  # up to this fraction of the delay is added at random
+BATCH_SIZE = 100
+DEFAULT_CONCURRENCY = 4
+STALE_IN_FLIGHT_MINUTES = 15
+
+
+def get_max_attempts():
+    return cint(frappe.conf.get("uae_einvoice_outbox_max_attempts")) or DEFAULT_MAX_ATTEMPTS
+
+
+def get_retry_delay(attempts):
+    """Seconds until the next attempt after `attempts` failed ones."""
+    delay = min(BASE_DELAY * 2 ** max(attempts - 1, 0), MAX_DELAY)
+    return math.ceil(delay * (1 + random.uniform(0, JITTER)))
+
+
+def add_to_outbox(doc, invoice_json):
+    """Records the payload for delivery in the caller's transaction. Returns the outbox row name."""
+    values = {
+        "status": PENDING,
+        "attempts": 0,
+        "payload": pack(invoice_json),
+        "base_url": (get_credentials(doc.company).custom_base_url or "").rstrip("/"),
+        "next_attempt_at": now_datetime(),
+        "last_error": None,
+    }
+    existing = frappe.db.get_value(
+        OUTBOX_DOCTYPE,
+        {"reference_doctype": doc.doctype, "reference_name": doc.name, "status": ["in", [PENDING, RETRYING, DEAD]]},
+    )
+    if existing:
+        frappe.db.set_value(OUTBOX_DOCTYPE, existing, values, update_modified=False)
+        return existing
+
+    return frappe.get_doc(
+        dict(
+            values,
+            doctype=OUTBOX_DOCTYPE,
+            reference_doctype=doc.doctype,
+            reference_name=doc.name,
+            company=doc.company,
+        )
+    ).insert(ignore_permissions=True).name
+
+
+def claim(names=None, limit=BATCH_SIZE):
+    """
+    Moves due rows (or the given ones, when due) to In Flight and commits.
+    Rows of a base URL whose circuit breaker is open are left for later.
+    """
+    conditions = "status in %(states)s and next_attempt_at <= %(now)s"
+    if names:
+        conditions += " and name in %(names)s"
+    rows = frappe.db.sql(
+        f"""
+        select name, base_url from `tabUAE E-Invoice Outbox`
+        where {conditions}
+        order by next_attempt_at
+        limit %(limit)s
+        for update skip locked
+        """,
+        {"states": (PENDING, RETRYING), "now": now_datetime(), "names": tuple(names or ()), "limit": limit},
+        as_dict=True,
+    )
+
+    breakers = {}
+    claimed = []
+    for row in rows:
+        if row.base_url not in breakers:
+            breakers[row.base_url] = CircuitBreaker(row.base_url).is_open()
+        if breakers[row.base_url]:
+            continue
+        frappe.db.set_value(
+            OUTBOX_DOCTYPE, row.name, {"status": IN_FLIGHT, "claimed_at": now_datetime()}, update_modified=False
+        )
+        claimed.append(row.name)
+    frappe.db.commit()  # nosemgrep: frappe-manual-commit
+    return claimed
+
+
+def _finish(entry, status, error=None):
+    values = {"status": status, "last_error": str(error)[:1000] if error else None}
+    if status == SUCCEEDED:
+        values["completed_on"] = now_datetime()
+    entry.db_set(values, update_modified=False)
+
+
+def _park(entry, attempts, error):
+    """Marks the row Dead and logs it; retry_dead puts it back."""
+    entry.db_set({"attempts": attempts, "status": DEAD, "last_error": str(error)[:1000]}, update_modified=False)
+    frappe.log_error(
+        title=f"UAE E-Invoice Dead Letter: {entry.reference_name}",
+        message=_("{0} {1} was parked after {2} attempts: {3}").format(
+            entry.reference_doctype, entry.reference_name, attempts, error
+        ),
+    )
+
+
+def _fail(entry, error):
+    """Schedules the next attempt, or parks the row as Dead once the attempts are used up."""
+    attempts = cint(entry.attempts) + 1
+    if attempts >= get_max_attempts():
+        _park(entry, attempts, error)
+        return
+
+    entry.db_set(
+        {
+            "attempts": attempts,
+            "status": RETRYING,
+            "last_error": str(error)[:1000],
+            "next_attempt_at": add_to_date(now_datetime(), seconds=get_retry_delay(attempts)),
+        },
+        update_modified=False,
+    )
+
+
+def process(name):
+    """Sends one claimed (In Flight) row and records the outcome."""
+    entry = frappe.get_doc(OUTBOX_DOCTYPE, name)
+    if entry.status != IN_FLIGHT:
+        return
+
+    invoice = frappe.get_doc(entry.reference_doctype, entry.reference_name)
+    if invoice.docstatus != 1:
+        _finish(entry, DEAD, _("Invoice is not submitted"))
+        frappe.db.commit()  # nosemgrep: frappe-manual-commit
+        return
+
+    status_code = error = None
+    try:
+        status_code = frappe.get_attr(SENDERS[entry.reference_doctype])(
+            invoice, load_stored(entry.payload), spool=False
+        )
+    except requests.exceptions.ReadTimeout as e:
+        _park(
+            entry,
+            cint(entry.attempts) + 1,
+            _("No answer from Flick in time; check whether it has the invoice before retrying ({0})").format(e),
+        )
+        frappe.db.commit()  # nosemgrep: frappe-manual-commit
+        publish_status(entry.reference_doctype, entry.reference_name)
+        return
+    except SPOOLABLE_ERRORS as e:
+        error = e
+    except Exception as e:
+        frappe.log_error(frappe.get_traceback(), "UAE E-Invoice Outbox Error")
+        error = e
+
+    if error is None:
+        stored = frappe.db.get_value(
+            entry.reference_doctype,
+            entry.reference_name,
+            ["custom_uae_einvoice_status", "custom_document_id"],
+            as_dict=True,
+        )
+        # Flick has the invoice: sending it again would only create a duplicate
+        if status_code == 200 or stored.custom_uae_einvoice_status == "Success" or stored.custom_document_id:
+            _finish(entry, SUCCEEDED)
+        else:
+            error = _("Flick did not accept the invoice (status {0})").format(stored.custom_uae_einvoice_status)
+    if error is not None:
+        _fail(entry, error)
+
+    frappe.db.commit()  # nosemgrep: frappe-manual-commit
+    publish_status(entry.reference_doctype, entry.reference_name)
+
+
+def deliver(name):
+    """Background job enqueued after the invoice submit: sends its row at once unless a dispatcher has it."""
+    for claimed in claim([name], limit=1):
+        process(claimed)
+
+
+def deliver_batch(names):
+    """Background job: sends rows the dispatcher already claimed."""
+    for name in names:
+        process(name)
+
+
+def release_stale_entries():
+    """Rows left In Flight by a job that died are due again."""
+    stale = frappe.get_all(
+        OUTBOX_DOCTYPE,
+        filters={
+            "status": IN_FLIGHT,
+            "claimed_at": ["<", add_to_date(now_datetime(), minutes=-STALE_IN_FLIGHT_MINUTES)],
+        },
+        pluck="name",
+    )
+    for name in stale:
+        frappe.db.set_value(
+            OUTBOX_DOCTYPE, name, {"status": RETRYING, "next_attempt_at": now_datetime()}, update_modified=False
+        )
+    frappe.db.commit()  # nosemgrep: frappe-manual-commit
+
+
+def dispatch_outbox():
+    """Scheduler entry point: claims one batch of due rows and fans it out to uae_einvoice_outbox_concurrency jobs."""
+    release_stale_entries()
+    names = claim()
+    if not names:
+        return
+
+    concurrency = cint(frappe.conf.get("uae_einvoice_outbox_concurrency")) or DEFAULT_CONCURRENCY
+    chunk_size = math.ceil(len(names) / concurrency)
+    for start in range(0, len(names), chunk_size):
+        frappe.enqueue(
+            "uae_erpgulf.uae_erpgulf.outbox.deliver_batch",
+            queue=get_submit_queue(),
+            timeout=JOB_TIMEOUT * chunk_size,
+            names=names[start:start + chunk_size],
+        )
+
+
+@frappe.whitelist()
+def retry_dead(names: list | str):
+    """Puts Dead rows back to Pending with a fresh attempt count."""
+    frappe.only_for("System Manager")
+    if isinstance(names, str):
+        names = frappe.parse_json(names)
+
+    for name in names:
+        if frappe.db.get_value(OUTBOX_DOCTYPE, name, "status") == DEAD:
+            frappe.db.set_value(
+                OUTBOX_DOCTYPE,
+                name,
+                {"status": PENDING, "attempts": 0, "next_attempt_at": now_datetime()},
+                update_modified=False,
+            )
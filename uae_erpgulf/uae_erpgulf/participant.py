@@ -1,19 +1,12 @@
 import requests
 import frappe
+from uae_erpgulf.uae_erpgulf.flick_client import FlickClient
+from uae_erpgulf.uae_erpgulf.response_cache import clear_cached
 
 def update_flick_participant(company, participant_id):
     """Updates participant details in Flick based on the Company document."""
     doc = frappe.get_doc("Company", company)
-
-    base_url = doc.custom_base_url
-    token = doc.custom_xflickauthkey  # or call your get_flick_token()
-
-    url = f"{base_url}/v1/participants/{participant_id}"
-
-    headers = {
-        "Content-Type": "application/json",
-        "X-Flick-Auth-Key": token
-    }
+    client = FlickClient.for_company(company)
 
     payload = {
         "trade_name": doc.company_name,
@@ -39,8 +32,9 @@ def update_flick_participant(company, participant_id):
     }
 
     try:
-        response = requests.put(url, headers=headers, json=payload)
+        response = client.put(f"/v1/participants/{participant_id}", endpoint="participant", json=payload)
         response.raise_for_status()
+        clear_cached(company, f"/v1/participants/{participant_id}")
 
         return response.json()
 
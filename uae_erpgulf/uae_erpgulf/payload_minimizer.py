@@ -0,0 +1,134 @@
+"""
+Pruning and normalization of built invoice payloads before they are hashed,
+stored and sent.
+
+Optional fields that carry nothing (None, "", empty lists and objects) are
+dropped, duplicated or default values are removed, and payment_means is
+flattened to a single list. Fields listed in REQUIRED_FIELDS are always kept,
+even when empty, so Flick reports a missing value instead of a missing key.
+Disable with uae_einvoice_minimize_payload = 0 in the site config.
+"""
+
+from collections import Counter
+
+import frappe
+from frappe.utils import cint
+from uae_erpgulf.uae_erpgulf.serialization import dumps_bytes
+
+
+# Keys never pruned, per object path ("[]" stands for any list item)
+REQUIRED_FIELDS = {
+    (): {
+        "document_identifier", "issue_date", "issue_time", "document_type",
+        "document_currency", "receiving_party", "invoice_lines",
+        "legal_monetary_total", "payment_means", "invoice_totals", "metadata",
+    },
+    ("receiving_party",): {"trade_name", "legal_name", "peppol_id", "country_code"},
+    ("document_references", "[]"): {"id", "issue_date"},
+    ("payment_means", "[]"): {"payment_means_code"},
+    ("invoice_lines", "[]"): {
+        "id", "invoiced_quantity", "uom", "line_extension_amount", "name",
+        "vat_category", "vat_percentage", "unit_price",
+    },
+}
+
+# Objects passed through untouched: amounts and flags where zero / false are meaningful
+PRESERVED_PATHS = {("legal_monetary_total",), ("invoice_totals",), ("metadata",)}
+
+# Line values equal to what the receiver assumes anyway (UBL BaseQuantity defaults to 1)
+DEFAULT_LINE_VALUES = {
+    "base_quantity": "1",
+    "note": "Please check the invoice",
+}
+
+
+def is_enabled():
+    return bool(cint(frappe.conf.get("uae_einvoice_minimize_payload", 1)))
+
+
+def _is_empty(value):
+    return value is None or value == "" or value == [] or value == {}
+
+
+def _prune(value, path, removed):
+    if path in PRESERVED_PATHS:
+        return value
+    if isinstance(value, dict):
+        required = REQUIRED_FIELDS.get(path, ())
+        pruned = {}
+        for key, item in value.items():
+            item = _prune(item, path + (key,), removed)
+            if key not in required and _is_empty(item):
+                removed[_format_path(path + (key,))] += 1
+                continue
+            pruned[key] = item
+        return pruned
+    if isinstance(value, list):
+        return [_prune(item, path + ("[]",), removed) for item in value]
+    return value
+
+
+def _format_path(path):
+    return ".".join(path).replace(".[]", "[]")
+
+
+def _drop(obj, key, path, removed):
+    if key not in REQUIRED_FIELDS.get(path, ()):
+        del obj[key]
+        removed[_format_path(path + (key,))] += 1
+
+
+def normalize(payload, removed):
+    """Removes duplicated and default values and unwraps the nested payment_means list, in place."""
+    payment_means = payload.get("payment_means")
+    if isinstance(payment_means, list) and any(isinstance(entry, list) for entry in payment_means):
+        payload["payment_means"] = [
+            item
+            for entry in payment_means
+            for item in (entry if isinstance(entry, list) else [entry])
+        ]
+
+    party = payload.get("receiving_party")
+    if party and "additional_address_lines" in party and (
+        party["additional_address_lines"] == party.get("additional_street_address")
+    ):
+        _drop(party, "additional_address_lines", ("receiving_party",), removed)
+
+    for line in payload.get("invoice_lines") or ():
+        for key, default in DEFAULT_LINE_VALUES.items():
+            if key in line and line[key] == default:
+                _drop(line, key, ("invoice_lines", "[]"), removed)
+
+
+def minimize_payload(payload):
+    """
+    Minimizes a freshly built payload, which is modified on the way, and returns
+    (minimized payload, report). The report holds the compact JSON size
+    before and after and how many times each field path was removed.
+    """
+    bytes_before = len(dumps_bytes(payload))
+    removed = Counter()
+    normalize(payload, removed)
+    minimized = _prune(payload, (), removed)
+
+    bytes_after = len(dumps_bytes(minimized))
+    return minimized, frappe._dict(
+        bytes_before=bytes_before,
+        bytes_after=bytes_after,
+        removed=dict(removed),
+    )
+
+
+def log_reduction(doctype, invoice_number, report):
+    """Reports the byte reduction of one invoice payload."""
+    frappe.logger("uae_erpgulf").info(
+        {
+            "event": "uae_einvoice_payload_minimized",
+            "doctype": doctype,
+            "invoice": invoice_number,
+            "bytes_before": report.bytes_before,
+            "bytes_after": report.bytes_after,
+            "saved_pct": round(100 * (1 - report.bytes_after / report.bytes_before), 1) if report.bytes_before else 0,
+            "removed_fields": sum(report.removed.values()),
+        }
+    )
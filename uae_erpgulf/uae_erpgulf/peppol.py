@@ -0,0 +1,183 @@
+"""
+PEPPOL ID verification for the customer master, cached in UAE PEPPOL Lookup.
+
+run_bulk_lookup checks many PEPPOL IDs against the Company's Flick base URL
+with the concurrent engine of flick_bulk and keeps one row per (PEPPOL ID,
+base URL) with an expiry. Invoice validation only reads those rows, so the
+submit path never waits on a live lookup.
+"""
+
+from collections import Counter
+from urllib.parse import quote
+
+import frappe
+from frappe import _
+from frappe.utils import add_to_date, cint, now_datetime
+from uae_erpgulf.uae_erpgulf.flick_bulk import COMMIT_EVERY, MAX_RATE_LIMIT_WAIT, FetchJob, run_fetch
+from uae_erpgulf.uae_erpgulf.flick_client import FlickClient, get_session, get_timeout
+from uae_erpgulf.uae_erpgulf.rate_limiter import RateLimiter
+
+
+LOOKUP_DOCTYPE = "UAE PEPPOL Lookup"
+DEFAULT_TTL_DAYS = 7
+NOT_REGISTERED_TTL_DAYS = 1
+DEFAULT_CONCURRENCY = 4
+QUERY_CHUNK = 1000
+
+
+def lookup_status(status_code):
+    if status_code == 200:
+        return "Registered"
+    if status_code == 404:
+        return "Not Registered"
+    return "Error"
+
+
+def get_expiry(status):
+    if status == "Registered":
+        days = cint(frappe.conf.get("uae_peppol_lookup_ttl_days")) or DEFAULT_TTL_DAYS
+    elif status == "Not Registered":
+        days = NOT_REGISTERED_TTL_DAYS
+    else:
+        # An error never counts as a verified result
+        days = 0
+    return add_to_date(now_datetime(), days=days)
+
+
+def get_existing_lookups(base_url, peppol_ids):
+    """{peppol_id: row} of the stored lookups against base_url."""
+    existing = {}
+    for start in range(0, len(peppol_ids), QUERY_CHUNK):
+        for row in frappe.get_all(
+            LOOKUP_DOCTYPE,
+            filters={"base_url": base_url, "peppol_id": ["in", peppol_ids[start:start + QUERY_CHUNK]]},
+            fields=["name", "peppol_id", "expires_on"],
+        ):
+            existing[row.peppol_id] = row
+    return existing
+
+
+def store_lookup(company, base_url, peppol_id, status_code, response_text, existing_name=None):
+    """Upserts the lookup row of (peppol_id, base_url); the caller commits. Returns the status."""
+    status = lookup_status(status_code)
+    values = {
+        "company": company,
+        "status": status,
+        "checked_on": now_datetime(),
+        "expires_on": get_expiry(status),
+        "response": (response_text or "")[:10000],
+    }
+    existing_name = existing_name or frappe.db.get_value(
+        LOOKUP_DOCTYPE, {"peppol_id": peppol_id, "base_url": base_url}
+    )
+    if existing_name:
+        frappe.db.set_value(LOOKUP_DOCTYPE, existing_name, values)
+    else:
+        frappe.get_doc(
+            dict(values, doctype=LOOKUP_DOCTYPE, peppol_id=peppol_id, base_url=base_url)
+        ).insert(ignore_permissions=True)
+    return status
+
+
+def get_customer_peppol_ids(customers=None):
+    filters = {"custom_peppol_id": ["is", "set"]}
+    if customers:
+        filters["name"] = ["in", customers]
+    return frappe.get_all("Customer", filters=filters, pluck="custom_peppol_id", distinct=True)
+
+
+def run_bulk_lookup(company, peppol_ids=None, refresh=False, concurrency=None):
+    """Background job: verifies PEPPOL IDs (all customers' by default) and stores the results."""
+    client = FlickClient.for_company(company)
+    if peppol_ids is None:
+        peppol_ids = get_customer_peppol_ids()
+    peppol_ids = list(dict.fromkeys(peppol_id.strip() for peppol_id in peppol_ids if peppol_id and peppol_id.strip()))
+
+    existing = get_existing_lookups(client.base_url, peppol_ids)
+    if not refresh:
+        now = now_datetime()
+        peppol_ids = [
+            peppol_id for peppol_id in peppol_ids
+            if peppol_id not in existing or existing[peppol_id].expires_on <= now
+        ]
+
+    headers = client.auth_headers()
+    session = get_session(client.base_url)
+    limiter = RateLimiter(client.participant_id or client.base_url, max_wait=MAX_RATE_LIMIT_WAIT)
+    jobs = [
+        FetchJob(
+            key=peppol_id,
+            participant_id=client.participant_id or client.base_url,
+            session=session,
+            url=f"{client.base_url}/v1/peppol/lookup/{quote(peppol_id, safe=':')}",
+            headers=headers,
+            timeout=get_timeout("lookup"),
+            limiter=limiter,
+            breaker=client.breaker,
+            metrics=client.metrics,
+        )
+        for peppol_id in peppol_ids
+    ]
+    counts = Counter()
+    failures = {}
+
+    def on_result(result):
+        peppol_id = result.job.key
+        if result.error is not None:
+            # Transport failures leave any earlier result in place
+            counts["Error"] += 1
+            failures[peppol_id] = str(result.error)
+            return
+
+        existing_row = existing.get(peppol_id)
+        status = store_lookup(
+            company,
+            client.base_url,
+            peppol_id,
+            result.response.status_code,
+            result.response.text,
+            existing_row.name if existing_row else None,
+        )
+        counts[status] += 1
+        if status == "Error":
+            failures[peppol_id] = result.response.text[:500]
+        if sum(counts.values()) % COMMIT_EVERY == 0:
+            frappe.db.commit()  # nosemgrep: frappe-manual-commit
+
+    concurrency = concurrency or cint(frappe.conf.get("uae_peppol_lookup_concurrency")) or DEFAULT_CONCURRENCY
+    run_fetch(jobs, on_result, concurrency)
+    frappe.db.commit()  # nosemgrep: frappe-manual-commit
+
+    summary = dict({"event": "uae_peppol_bulk_lookup", "company": company, "checked": len(jobs)}, **counts)
+    frappe.logger("uae_erpgulf").info(summary)
+    if failures:
+        frappe.log_error(
+            title="PEPPOL Bulk Lookup Failures",
+            message="\n".join(f"{peppol_id}: {message}" for peppol_id, message in failures.items()),
+        )
+    return summary
+
+
+@frappe.whitelist()
+def verify_peppol_ids(customers: list | str | None = None, company: str | None = None, refresh: int = 0):
+    """Queues verification of the selected customers' PEPPOL IDs (all customers when none are given)."""
+    if isinstance(customers, str):
+        customers = frappe.parse_json(customers)
+    frappe.has_permission("Customer", "read", throw=True)
+
+    company = company or frappe.defaults.get_user_default("Company")
+    if not company:
+        frappe.throw(_("Please set a default Company"))
+
+    peppol_ids = get_customer_peppol_ids(customers) if customers else None
+    frappe.enqueue(
+        "uae_erpgulf.uae_erpgulf.peppol.run_bulk_lookup",
+        queue="long",
+        timeout=3600,
+        job_id=None if customers else f"uae_peppol_bulk_lookup|{company}",
+        deduplicate=not customers,
+        company=company,
+        peppol_ids=peppol_ids,
+        refresh=cint(refresh),
+    )
+    return {"queued": len(peppol_ids) if peppol_ids is not None else None}
@@ -0,0 +1,368 @@
+import frappe
+from frappe import _
+from frappe.utils import now_datetime
+from uae_erpgulf.uae_erpgulf.master_cache import get_masters
+
+
+INVOICE_SPECS = {
+    "Sales Invoice": frappe._dict(
+        party_doctype="Customer",
+        party_field="customer",
+        party_name_field="customer_name",
+        address_field="customer_address",
+        primary_address_field="customer_primary_address",
+        items_doctype="Sales Invoice Item",
+        taxes_doctype="Sales Taxes and Charges",
+        payments_doctype="Sales Invoice Payment",
+    ),
+    "Purchase Invoice": frappe._dict(
+        party_doctype="Supplier",
+        party_field="supplier",
+        party_name_field="supplier_name",
+        address_field="supplier_address",
+        primary_address_field="supplier_primary_address",
+        items_doctype="Purchase Invoice Item",
+        taxes_doctype="Purchase Taxes and Charges",
+        payments_doctype=None,
+    ),
+}
+
+INVOICE_FIELDS = [
+    "name", "company", "customer", "customer_name", "customer_address",
+    "supplier", "supplier_name", "supplier_address", "is_return",
+    "return_against", "custom_return_against_for_uae_einvoice", "docstatus",
+    "posting_date", "posting_time", "due_date", "currency", "conversion_rate",
+    "cost_center", "total", "base_net_total", "discount_amount",
+    "outstanding_amount", "base_change_amount", "change_amount",
+    "custom_vat_category", "custom_vat_exemption_reason_code",
+    "custom_rcm_nature_code", "custom_invoice_transaction_type_code",
+    "custom_frequency_billing_code_list", "custom_invoice_note",
+    "custom_credit_note_reason_code", "custom_payment_means_codes",
+    "custom_submit_to_fta", "custom_uae_einvoice_status",
+]
+
+ITEM_FIELDS = [
+    "parent", "idx", "item_code", "item_name", "description", "qty", "uom",
+    "rate", "amount", "cost_center", "item_tax_template",
+    "custom_item_type_codes", "custom_hs_code_", "custom_sac_code",
+]
+
+TAX_FIELDS = ["parent", "idx", "rate", "included_in_print_rate"]
+
+PAYMENT_FIELDS = ["parent", "idx", "mode_of_payment"]
+
+COMPANY_FIELDS = [
+    "name", "custom_uae_einvoice_enabled", "custom_participant_id",
+    "custom_base_url",
+]
+
+PARTY_FIELDS = [
+    "name", "customer_name", "supplier_name", "tax_id", "custom_peppol_id",
+    "custom_trade_license_number", "custom_fz_beneficiary_id",
+    "custom_legal_registration_identifier_type", "customer_primary_address",
+    "supplier_primary_address",
+]
+
+ADDRESS_FIELDS = [
+    "name", "address_line1", "address_line2", "city", "emirate", "pincode",
+    "country", "email_id", "phone",
+]
+
+ITEM_TAX_TEMPLATE_FIELDS = [
+    "name", "custom_vat_category", "custom_vat_exemption_reason_code",
+    "custom_rcm_nature_code",
+]
+
+MODE_OF_PAYMENT_FIELDS = ["name", "custom_payment_means_codes"]
+
+ACCOUNT_FIELDS = ["name", "account_number", "account_type", "account_name", "company"]
+
+PEPPOL_LOOKUP_FIELDS = ["peppol_id", "base_url", "status"]
+
+# Invoices loaded together by iter_invoice_contexts
+BATCH_SIZE = 200
+
+
+def existing_fields(doctype, fields):
+    """Keeps only the fields present on the doctype so one projection list can serve Sales and Purchase."""
+    meta = frappe.get_meta(doctype)
+    return [
+        field for field in fields
+        if field in ("name", "parent", "idx") or meta.has_field(field)
+    ]
+
+
+def _get_all(context, doctype, filters, fields, order_by=None):
+    if context is not None:
+        context.query_count += 1
+    return frappe.get_all(
+        doctype,
+        filters=filters,
+        fields=existing_fields(doctype, fields),
+        order_by=order_by,
+    )
+
+
+def _get_children(context, child_doctype, parent_doctype, parents, fields):
+    """Loads the rows of one child table for all given parents, grouped by parent."""
+    grouped = {parent: [] for parent in parents}
+    if not parents or not child_doctype:
+        return grouped
+
+    rows = _get_all(
+        context,
+        child_doctype,
+        {"parenttype": parent_doctype, "parent": ["in", list(parents)]},
+        fields,
+        order_by="parent asc, idx asc",
+    )
+    for row in rows:
+        grouped[row.parent].append(row)
+    return grouped
+
+
+def load_item_tax_templates(names, context=None):
+    """Item Tax Templates with their tax rows, keyed by template name."""
+
+    def loader(missing):
+        templates = {
+            row.name: row
+            for row in _get_all(
+                context, "Item Tax Template", {"name": ["in", missing]}, ITEM_TAX_TEMPLATE_FIELDS
+            )
+        }
+        taxes = _get_children(
+            context, "Item Tax Template Detail", "Item Tax Template", list(templates), ["parent", "idx", "tax_rate"]
+        )
+        for name, template in templates.items():
+            template.taxes = taxes[name]
+        return templates
+
+    return get_masters("Item Tax Template", names, loader)
+
+
+def load_modes_of_payment(names, context=None):
+    """Modes of Payment with their account rows, keyed by Mode of Payment name."""
+
+    def loader(missing):
+        modes = {
+            row.name: row
+            for row in _get_all(
+                context, "Mode of Payment", {"name": ["in", missing]}, MODE_OF_PAYMENT_FIELDS
+            )
+        }
+        accounts = _get_children(
+            context,
+            "Mode of Payment Account",
+            "Mode of Payment",
+            list(modes),
+            ["parent", "idx", "company", "default_account"],
+        )
+        for name, mode in modes.items():
+            mode.accounts = accounts[name]
+        return modes
+
+    return get_masters("Mode of Payment", names, loader)
+
+
+def load_accounts(names, context=None):
+    """Accounts keyed by name."""
+
+    def loader(missing):
+        return {
+            row.name: row
+            for row in _get_all(context, "Account", {"name": ["in", missing]}, ACCOUNT_FIELDS)
+        }
+
+    return get_masters("Account", names, loader)
+
+
+def get_invoice_spec(doctype):
+    spec = INVOICE_SPECS.get(doctype)
+    if not spec:
+        frappe.throw(_("UAE E-Invoicing is not supported for {0}").format(doctype))
+    return spec
+
+
+def _get_many(counter, doctype, names, fields):
+    """{name: row} for all given names in one query."""
+    names = list({name for name in names if name})
+    if not names:
+        return {}
+    return {row.name: row for row in _get_all(counter, doctype, {"name": ["in", names]}, fields)}
+
+
+def _peppol_lookup_key(party, company):
+    return ((party.get("custom_peppol_id") or "").strip(), ((company or {}).get("custom_base_url") or "").rstrip("/"))
+
+
+def load_peppol_lookups(counter, keys):
+    """Unexpired UAE PEPPOL Lookup statuses keyed by (peppol_id, base_url), in one query."""
+    keys = {key for key in keys if all(key)}
+    if not keys:
+        return {}
+    rows = _get_all(
+        counter,
+        "UAE PEPPOL Lookup",
+        {
+            "peppol_id": ["in", list({peppol_id for peppol_id, _base_url in keys})],
+            "base_url": ["in", list({base_url for _peppol_id, base_url in keys})],
+            "expires_on": [">", now_datetime()],
+        },
+        PEPPOL_LOOKUP_FIELDS,
+    )
+    return {(row.peppol_id, row.base_url): row.status for row in rows}
+
+
+def load_invoice_contexts(doctype, invoice_numbers, counter=None):
+    """
+    Resolves every record the given invoices need with one column-projected
+    query per table, shared by all of them. Returns ({name: context}, {name: error}).
+    """
+    spec = get_invoice_spec(doctype)
+    counter = counter if counter is not None else frappe._dict(query_count=0)
+    contexts = {}
+    errors = {}
+
+    invoices = _get_many(counter, doctype, invoice_numbers, INVOICE_FIELDS)
+    for name in invoice_numbers:
+        if name not in invoices:
+            errors[name] = _("{0} {1} not found").format(doctype, name)
+    if not invoices:
+        return contexts, errors
+
+    names = list(invoices)
+    lines = _get_children(counter, spec.items_doctype, doctype, names, ITEM_FIELDS)
+    taxes = _get_children(counter, spec.taxes_doctype, doctype, names, TAX_FIELDS)
+    payments = _get_children(counter, spec.payments_doctype, doctype, names, PAYMENT_FIELDS)
+
+    companies = _get_many(counter, "Company", [inv.company for inv in invoices.values()], COMPANY_FIELDS)
+    parties = _get_many(
+        counter, spec.party_doctype, [inv.get(spec.party_field) for inv in invoices.values()], PARTY_FIELDS
+    )
+
+    # Cached verification results only: submitting never waits on a live lookup
+    peppol_lookups = load_peppol_lookups(
+        counter,
+        [
+            _peppol_lookup_key(parties[inv.get(spec.party_field)], companies.get(inv.company))
+            for inv in invoices.values()
+            if inv.get(spec.party_field) in parties
+        ],
+    )
+
+    address_names = {}
+    for invoice in invoices.values():
+        party = parties.get(invoice.get(spec.party_field))
+        address_names[invoice.name] = invoice.get(spec.address_field) or (
+            party.get(spec.primary_address_field) if party else None
+        )
+    addresses = _get_many(counter, "Address", address_names.values(), ADDRESS_FIELDS)
+
+    originals = _get_many(
+        counter,
+        doctype,
+        [inv.return_against for inv in invoices.values() if inv.is_return],
+        ["name", "posting_date"],
+    )
+
+    item_tax_templates = load_item_tax_templates(
+        [item.item_tax_template for rows in lines.values() for item in rows], counter
+    )
+    modes_of_payment = load_modes_of_payment(
+        [row.mode_of_payment for rows in payments.values() for row in rows], counter
+    )
+    accounts = load_accounts(
+        [mode.accounts[0].default_account for mode in modes_of_payment.values() if mode.accounts],
+        counter,
+    )
+
+    for name, invoice in invoices.items():
+        party_name = invoice.get(spec.party_field)
+        if party_name not in parties:
+            errors[name] = _("{0} {1} not found").format(spec.party_doctype, party_name)
+            continue
+        if invoice.is_return and invoice.return_against and invoice.return_against not in originals:
+            errors[name] = _("{0} {1} not found").format(doctype, invoice.return_against)
+            continue
+
+        invoice.doctype = doctype
+        # Item rows live under "lines": on a frappe._dict, .items is the dict method
+        invoice.lines = lines[name]
+        invoice.taxes = taxes[name]
+        invoice.payments = payments[name]
+
+        contexts[name] = frappe._dict(
+            doctype=doctype,
+            spec=spec,
+            query_count=counter.query_count,
+            invoice=invoice,
+            company=companies.get(invoice.company),
+            party=parties[party_name],
+            peppol_lookup=peppol_lookups.get(_peppol_lookup_key(parties[party_name], companies.get(invoice.company))),
+            address=addresses.get(address_names[name]),
+            return_against=originals.get(invoice.return_against) if invoice.is_return else None,
+            item_tax_templates=item_tax_templates,
+            modes_of_payment=modes_of_payment,
+            accounts=accounts,
+        )
+
+    return contexts, errors
+
+
+def load_invoice_context(doctype, invoice_number):
+    """
+    Resolves every record one invoice payload needs in a handful of
+    column-projected queries and returns them as plain in-memory dicts.
+    """
+    contexts, errors = load_invoice_contexts(doctype, [invoice_number])
+    if invoice_number in errors:
+        frappe.throw(errors[invoice_number])
+    return contexts[invoice_number]
+
+
+def iter_invoice_contexts(doctype, invoice_numbers, batch_size=BATCH_SIZE):
+    """
+    Yields (name, context, error) for many invoices. The invoices are ordered by
+    company and party and loaded batch_size at a time, so shared masters are
+    resolved once per group and only one batch is held in memory.
+    """
+    spec = get_invoice_spec(doctype)
+    invoice_numbers = list(dict.fromkeys(name for name in invoice_numbers if name))
+
+    group_keys = {}
+    for start in range(0, len(invoice_numbers), batch_size):
+        for row in frappe.get_all(
+            doctype,
+            filters={"name": ["in", invoice_numbers[start:start + batch_size]]},
+            fields=["name", "company", spec.party_field],
+        ):
+            group_keys[row.name] = (row.company or "", row.get(spec.party_field) or "")
+    invoice_numbers.sort(key=lambda name: group_keys.get(name, ("", "")))
+
+    for start in range(0, len(invoice_numbers), batch_size):
+        batch = invoice_numbers[start:start + batch_size]
+        counter = frappe._dict(query_count=0)
+        contexts, errors = load_invoice_contexts(doctype, batch, counter)
+        frappe.logger("uae_erpgulf").info(
+            {
+                "event": "uae_einvoice_prefetch_batch",
+                "doctype": doctype,
+                "invoices": len(batch),
+                "queries": counter.query_count,
+            }
+        )
+        for name in batch:
+            yield name, contexts.get(name), errors.get(name)
+
+
+def log_query_count(context):
+    """Reports how many queries one payload build issued."""
+    frappe.logger("uae_erpgulf").info(
+        {
+            "event": "uae_einvoice_prefetch",
+            "doctype": context.doctype,
+            "invoice": context.invoice.name,
+            "queries": context.query_count,
+        }
+    )
@@ -0,0 +1,195 @@
+"""
+Redis token bucket shared by every worker, one bucket per Flick participant.
+
+Each outbound Flick request takes a token first. A 429 (or a 503 carrying
+Retry-After) pauses the participant for the advertised time in Redis, so every
+worker backs off together. Counters per participant are kept in Redis for
+sizing batch jobs against the quota.
+
+A RateLimiter resolves its Redis keys and settings when it is created, so it
+can be used afterwards from worker threads that have no frappe.local.
+"""
+
+import time
+from email.utils import parsedate_to_datetime
+
+import frappe
+import requests
+from frappe.utils import cint, flt
+from redis.exceptions import RedisError
+
+
+DEFAULT_RATE = 10  # requests per second and participant
+DEFAULT_BURST = 20
+DEFAULT_MAX_WAIT = 30  # seconds one call may wait for a token
+DEFAULT_PAUSE = 5  # seconds to pause after a 429 without Retry-After
+MAX_PAUSE = 300
+STAT_FIELDS = ("granted", "throttled", "wait_ms", "rate_limited", "rejected")
+
+# KEYS: bucket, pause, stats; ARGV: rate, burst. Returns 0 when a token was taken, else ms to wait.
+ACQUIRE_SCRIPT = """
+local pause = redis.call('PTTL', KEYS[2])
+if pause > 0 then
+    return pause
+end
+local now = redis.call('TIME')
+local now_ms = tonumber(now[1]) * 1000 + math.floor(tonumber(now[2]) / 1000)
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now_ms
+tokens = math.min(burst, tokens + math.max(0, now_ms - ts) * rate / 1000)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    redis.call('HINCRBY', KEYS[3], 'granted', 1)
+else
+    wait = math.ceil((1 - tokens) * 1000 / rate)
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now_ms)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst * 1000 / rate) + 1000)
+return wait
+"""
+
+# KEYS: pause, stats; ARGV: pause ms. Never shortens a longer pause already set by another worker.
+PAUSE_SCRIPT = """
+if tonumber(ARGV[1]) > redis.call('PTTL', KEYS[1]) then
+    redis.call('SET', KEYS[1], 1, 'PX', ARGV[1])
+end
+redis.call('HINCRBY', KEYS[2], 'rate_limited', 1)
+return 1
+"""
+
+
+class RateLimitExceeded(requests.exceptions.RequestException):
+    """No token became available within max_wait; callers treat it like any other transport failure."""
+
+
+def _keys(key):
+    return (
+        frappe.cache.make_key(f"uae_flick_bucket|{key}"),
+        frappe.cache.make_key(f"uae_flick_pause|{key}"),
+        frappe.cache.make_key(f"uae_flick_throttle_stats|{key}"),
+    )
+
+
+def get_limits():
+    """(rate, burst) from the site config."""
+    rate = flt(frappe.conf.get("uae_flick_rate_limit")) or DEFAULT_RATE
+    burst = cint(frappe.conf.get("uae_flick_rate_burst")) or DEFAULT_BURST
+    return rate, max(burst, 1)
+
+
+def parse_retry_after(value, default=DEFAULT_PAUSE):
+    """Seconds to wait from a Retry-After header given as delta-seconds or an HTTP date."""
+    if not value:
+        return default
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return default
+    return min(max(seconds, 0), MAX_PAUSE)
+
+
+class RateLimiter:
+    """Token bucket of one participant (or base URL for calls made before a participant exists)."""
+
+    def __init__(self, key, max_wait=None):
+        self.key = key
+        self.redis = frappe.cache
+        self.bucket_key, self.pause_key, self.stats_key = _keys(key)
+        self.rate, self.burst = get_limits()
+        if max_wait is None:
+            max_wait = flt(frappe.conf.get("uae_flick_rate_limit_max_wait")) or DEFAULT_MAX_WAIT
+        self.max_wait_ms = int(max_wait * 1000)
+        self._acquire = self.redis.register_script(ACQUIRE_SCRIPT)
+        self._pause = self.redis.register_script(PAUSE_SCRIPT)
+
+    def _count(self, **counters):
+        for field, value in counters.items():
+            self.redis.execute_command("HINCRBY", self.stats_key, field, value)
+
+    def acquire(self):
+        """Blocks until a token is taken. Fails open when Redis is unreachable."""
+        waited = 0
+        try:
+            while True:
+                wait_ms = int(self._acquire(
+                    keys=[self.bucket_key, self.pause_key, self.stats_key], args=[self.rate, self.burst]
+                ))
+                if wait_ms <= 0:
+                    break
+                if waited + wait_ms > self.max_wait_ms:
+                    self._count(rejected=1, wait_ms=waited)
+                    raise RateLimitExceeded(
+                        f"Flick rate limit for {self.key}: no request slot within {self.max_wait_ms // 1000}s"
+                    )
+                time.sleep(wait_ms / 1000)
+                waited += wait_ms
+            if waited:
+                self._count(throttled=1, wait_ms=waited)
+        except RedisError:
+            pass
+        return waited
+
+    def observe(self, response):
+        """Pauses every worker for this participant when Flick answered 429; returns the pause in seconds."""
+        retry_after = response.headers.get("Retry-After")
+        if response.status_code != 429 and not (response.status_code == 503 and retry_after):
+            return 0
+
+        pause = parse_retry_after(retry_after)
+        try:
+            self._pause(keys=[self.pause_key, self.stats_key], args=[max(int(pause * 1000), 1)])
+        except RedisError:
+            pass
+        return pause
+
+
+def get_participant_stats(key):
+    bucket_key, pause_key, stats_key = _keys(key)
+    stats = frappe.cache.execute_command("HGETALL", stats_key) or {}
+    stats = {field.decode() if isinstance(field, bytes) else field: int(value) for field, value in stats.items()}
+    tokens = frappe.cache.execute_command("HGET", bucket_key, "tokens")
+
+    return dict(
+        {field: stats.get(field, 0) for field in STAT_FIELDS},
+        paused_ms=max(int(frappe.cache.execute_command("PTTL", pause_key)), 0),
+        tokens=flt(tokens) if tokens is not None else None,
+    )
+
+
+def _participants():
+    return frappe.get_all(
+        "Company",
+        filters={"custom_participant_id": ["is", "set"]},
+        pluck="custom_participant_id",
+    )
+
+
+@frappe.whitelist()
+def get_rate_limit_stats():
+    """Throttling counters and current bucket state of every participant, across all workers."""
+    frappe.only_for("System Manager")
+
+    rate, burst = get_limits()
+    return {
+        "rate": rate,
+        "burst": burst,
+        "participants": {participant: get_participant_stats(participant) for participant in _participants()},
+    }
+
+
+@frappe.whitelist()
+def reset_rate_limit_stats():
+    """Clears the throttling counters; buckets and pauses are left as they are."""
+    frappe.only_for("System Manager")
+
+    for participant in _participants():
+        frappe.cache.execute_command("DEL", _keys(participant)[2])
+
+    return get_rate_limit_stats()
@@ -0,0 +1,356 @@
+"""
+Code lists and lookup tables used by the UAE payload builders. Every table is
+built once at import time and exposed read-only, so a worker pays for them
+once instead of on every invoice.
+"""
+
+import re
+from functools import lru_cache
+from types import MappingProxyType
+
+
+_WHITESPACE = re.compile(r"\s+")
+_NAME_SEPARATORS = re.compile(r"[\s\-_.]+")
+
+
+@lru_cache(maxsize=1024)
+def normalize_label(value):
+    """Case-folds and collapses whitespace: '  S - Standard  Rated ' -> 's - standard rated'."""
+    if not value:
+        return ""
+    return _WHITESPACE.sub(" ", str(value)).strip().casefold()
+
+
+@lru_cache(maxsize=1024)
+def normalize_name(value):
+    """Like normalize_label, but also treats '-', '_' and '.' as spaces: 'Umm Al-Quwain' -> 'umm al quwain'."""
+    if not value:
+        return ""
+    return _NAME_SEPARATORS.sub(" ", str(value)).strip().casefold()
+
+
+def _lookup(entries, aliases, normalizer):
+    table = {normalizer(key): code for key, code in entries}
+    table.update((normalizer(alias), code) for alias, code in aliases)
+    return MappingProxyType(table)
+
+
+# ISO 3166-1 alpha-2
+COUNTRY_DATA = (
+    ("Afghanistan", "AF"),
+    ("Albania", "AL"),
+    ("Algeria", "DZ"),
+    ("Andorra", "AD"),
+    ("Angola", "AO"),
+    ("Antigua and Barbuda", "AG"),
+    ("Argentina", "AR"),
+    ("Armenia", "AM"),
+    ("Australia", "AU"),
+    ("Austria", "AT"),
+    ("Azerbaijan", "AZ"),
+    ("Bahamas", "BS"),
+    ("Bahrain", "BH"),
+    ("Bangladesh", "BD"),
+    ("Barbados", "BB"),
+    ("Belarus", "BY"),
+    ("Belgium", "BE"),
+    ("Belize", "BZ"),
+    ("Benin", "BJ"),
+    ("Bhutan", "BT"),
+    ("Bolivia", "BO"),
+    ("Bosnia and Herzegovina", "BA"),
+    ("Botswana", "BW"),
+    ("Brazil", "BR"),
+    ("Brunei", "BN"),
+    ("Bulgaria", "BG"),
+    ("Burkina Faso", "BF"),
+    ("Burundi", "BI"),
+    ("Cambodia", "KH"),
+    ("Cameroon", "CM"),
+    ("Canada", "CA"),
+    ("Cape Verde", "CV"),
+    ("Central African Republic", "CF"),
+    ("Chad", "TD"),
+    ("Chile", "CL"),
+    ("China", "CN"),
+    ("Colombia", "CO"),
+    ("Comoros", "KM"),
+    ("Congo (Congo-Brazzaville)", "CG"),
+    ("Congo (DRC)", "CD"),
+    ("Costa Rica", "CR"),
+    ("Croatia", "HR"),
+    ("Cuba", "CU"),
+    ("Cyprus", "CY"),
+    ("Czechia", "CZ"),
+    ("Côte d'Ivoire", "CI"),
+    ("Denmark", "DK"),
+    ("Djibouti", "DJ"),
+    ("Dominica", "DM"),
+    ("Dominican Republic", "DO"),
+    ("Ecuador", "EC"),
+    ("Egypt", "EG"),
+    ("El Salvador", "SV"),
+    ("Equatorial Guinea", "GQ"),
+    ("Eritrea", "ER"),
+    ("Estonia", "EE"),
+    ("Eswatini", "SZ"),
+    ("Ethiopia", "ET"),
+    ("Fiji", "FJ"),
+    ("Finland", "FI"),
+    ("France", "FR"),
+    ("Ghana", "GH"),
+    ("Greece", "GR"),
+    ("Grenada", "GD"),
+    ("Guatemala", "GT"),
+    ("Guinea", "GN"),
+    ("Guinea-Bissau", "GW"),
+    ("Guyana", "GY"),
+    ("Haiti", "HT"),
+    ("Honduras", "HN"),
+    ("Hungary", "HU"),
+    ("Iceland", "IS"),
+    ("India", "IN"),
+    ("Indonesia", "ID"),
+    ("Iran", "IR"),
+    ("Iraq", "IQ"),
+    ("Ireland", "IE"),
+    ("Israel", "IL"),
+    ("Italy", "IT"),
+    ("Jamaica", "JM"),
+    ("Japan", "JP"),
+    ("Jordan", "JO"),
+    ("Kazakhstan", "KZ"),
+    ("Kenya", "KE"),
+    ("Kiribati", "KI"),
+    ("Kuwait", "KW"),
+    ("Kyrgyzstan", "KG"),
+    ("Laos", "LA"),
+    ("Latvia", "LV"),
+    ("Lebanon", "LB"),
+    ("Lesotho", "LS"),
+    ("Liberia", "LR"),
+    ("Libya", "LY"),
+    ("Liechtenstein", "LI"),
+    ("Lithuania", "LT"),
+    ("Luxembourg", "LU"),
+    ("Madagascar", "MG"),
+    ("Malawi", "MW"),
+    ("Malaysia", "MY"),
+    ("Maldives", "MV"),
+    ("Mali", "ML"),
+    ("Malta", "MT"),
+    ("Marshall Islands", "MH"),
+    ("Mauritania", "MR"),
+    ("Mauritius", "MU"),
+    ("Mexico", "MX"),
+    ("Micronesia", "FM"),
+    ("Moldova", "MD"),
+    ("Monaco", "MC"),
+    ("Mongolia", "MN"),
+    ("Montenegro", "ME"),
+    ("Morocco", "MA"),
+    ("Mozambique", "MZ"),
+    ("Myanmar", "MM"),
+    ("Namibia", "NA"),
+    ("Nauru", "NR"),
+    ("Nepal", "NP"),
+    ("Netherlands", "NL"),
+    ("New Zealand", "NZ"),
+    ("Nicaragua", "NI"),
+    ("Niger", "NE"),
+    ("Nigeria", "NG"),
+    ("North Korea", "KP"),
+    ("North Macedonia", "MK"),
+    ("Norway", "NO"),
+    ("Oman", "OM"),
+    ("Pakistan", "PK"),
+    ("Palau", "PW"),
+    ("Palestine", "PS"),
+    ("Panama", "PA"),
+    ("Papua New Guinea", "PG"),
+    ("Paraguay", "PY"),
+    ("Peru", "PE"),
+    ("Philippines", "PH"),
+    ("Poland", "PL"),
+    ("Portugal", "PT"),
+    ("Qatar", "QA"),
+    ("Romania", "RO"),
+    ("Russia", "RU"),
+    ("Rwanda", "RW"),
+    ("Saint Kitts and Nevis", "KN"),
+    ("Saint Lucia", "LC"),
+    ("Saint Vincent and the Grenadines", "VC"),
+    ("Samoa", "WS"),
+    ("San Marino", "SM"),
+    ("Sao Tome and Principe", "ST"),
+    ("Saudi Arabia", "SA"),
+    ("Senegal", "SN"),
+    ("Serbia", "RS"),
+    ("Seychelles", "SC"),
+    ("Sierra Leone", "SL"),
+    ("Singapore", "SG"),
+    ("Slovakia", "SK"),
+    ("Slovenia", "SI"),
+    ("Solomon Islands", "SB"),
+    ("Somalia", "SO"),
+    ("South Africa", "ZA"),
+    ("South Korea", "KR"),
+    ("South Sudan", "SS"),
+    ("Spain", "ES"),
+    ("Sri Lanka", "LK"),
+    ("Sudan", "SD"),
+    ("Suriname", "SR"),
+    ("Sweden", "SE"),
+    ("Switzerland", "CH"),
+    ("Syria", "SY"),
+    ("Taiwan", "TW"),
+    ("Tajikistan", "TJ"),
+    ("Tanzania", "TZ"),
+    ("Thailand", "TH"),
+    ("Timor-Leste", "TL"),
+    ("Togo", "TG"),
+    ("Tonga", "TO"),
+    ("Trinidad and Tobago", "TT"),
+    ("Tunisia", "TN"),
+    ("Turkey", "TR"),
+    ("Turkmenistan", "TM"),
+    ("Tuvalu", "TV"),
+    ("Uganda", "UG"),
+    ("Ukraine", "UA"),
+    ("United Arab Emirates", "AE"),
+    ("United Kingdom", "GB"),
+    ("United States", "US"),
+    ("Uruguay", "UY"),
+    ("Uzbekistan", "UZ"),
+    ("Vanuatu", "VU"),
+    ("Vatican City", "VA"),
+    ("Venezuela", "VE"),
+    ("Vietnam", "VN"),
+    ("Yemen", "YE"),
+    ("Zambia", "ZM"),
+    ("Zimbabwe", "ZW"),
+)
+
+COUNTRY_ALIASES = (
+    ("UAE", "AE"),
+    ("U.A.E", "AE"),
+    ("USA", "US"),
+    ("United States of America", "US"),
+    ("UK", "GB"),
+    ("Great Britain", "GB"),
+    ("KSA", "SA"),
+    ("Czech Republic", "CZ"),
+    ("Russian Federation", "RU"),
+    ("Korea, Republic of", "KR"),
+    ("Korea, Democratic Peoples Republic of", "KP"),
+    ("Viet Nam", "VN"),
+    ("Ivory Coast", "CI"),
+    ("Cote d'Ivoire", "CI"),
+    ("Swaziland", "SZ"),
+    ("Burma", "MM"),
+    ("Macedonia", "MK"),
+    ("East Timor", "TL"),
+    ("Syrian Arab Republic", "SY"),
+    ("Iran, Islamic Republic of", "IR"),
+    ("Tanzania, United Republic of", "TZ"),
+    ("Lao Peoples Democratic Republic", "LA"),
+    ("Moldova, Republic of", "MD"),
+    ("Palestinian Territory, Occupied", "PS"),
+    ("Congo, The Democratic Republic of the", "CD"),
+    ("Congo", "CG"),
+)
+
+# Keyed by the lower-cased country name, as country_code_mapping() always was
+COUNTRY_CODES = MappingProxyType({name.lower(): code for name, code in COUNTRY_DATA})
+_COUNTRY_LOOKUP = _lookup(COUNTRY_DATA, COUNTRY_ALIASES, normalize_name)
+
+# PEPPOL PINT-AE country subdivision codes
+EMIRATE_CODES = _lookup(
+    (
+        ("Abu Dhabi", "AUH"),
+        ("Dubai", "DXB"),
+        ("Sharjah", "SHJ"),
+        ("Ajman", "AJM"),
+        ("Umm Al Quwain", "UAQ"),
+        ("Ras Al Khaimah", "RAK"),
+        ("Fujairah", "FUJ"),
+    ),
+    (
+        ("Abudhabi", "AUH"),
+        ("Umm Al Qaiwain", "UAQ"),
+        ("Ras Al Khaima", "RAK"),
+        ("Al Fujairah", "FUJ"),
+        ("AUH", "AUH"),
+        ("DXB", "DXB"),
+        ("SHJ", "SHJ"),
+        ("AJM", "AJM"),
+        ("UAQ", "UAQ"),
+        ("RAK", "RAK"),
+        ("FUJ", "FUJ"),
+    ),
+    normalize_name,
+)
+
+VAT_CATEGORY_CODES = _lookup(
+    (
+        ("S - Standard Rated", "S"),
+        ("Z - Zero Rated", "Z"),
+        ("E - Exempt from Tax", "E"),
+        ("AE - VAT Reverse Charge", "AE"),
+        ("O - Not subject to VAT", "O"),
+        ("N - Margin Scheme", "N"),
+    ),
+    (
+        ("Standard Rated", "S"),
+        ("S", "S"),
+        ("Zero Rated", "Z"),
+        ("Z", "Z"),
+        ("Exempt from Tax", "E"),
+        ("E", "E"),
+        ("VAT Reverse Charge", "AE"),
+        ("Reverse Charge", "AE"),
+        ("AE", "AE"),
+        ("Not subject to VAT", "O"),
+        ("O", "O"),
+        ("Margin Scheme", "N"),
+        ("N", "N"),
+    ),
+    normalize_label,
+)
+
+# UN/ECE 4461 subset approved for PINT-AE
+APPROVED_PAYMENT_MEANS = MappingProxyType(
+    {
+        "1": "Instrument not defined",
+        "10": "Cash",
+        "20": "Cheque",
+        "30": "Credit transfer",
+        "31": "Debit transfer",
+        "42": "Payment to bank account",
+        "48": "Bank card",
+        "49": "Direct debit",
+        "55": "Debit card",
+        "58": "SEPA credit transfer",
+    }
+)
+
+# IBG-14 invoice period description codes (frequency of billing)
+ALLOWED_DESCRIPTION_CODES = frozenset(
+    {"DLY", "WKY", "Q15", "MTH", "Q45", "Q60", "QTR", "YRL", "HYR", "OTH"}
+)
+
+
+def get_country_code(country, default="AE"):
+    """ISO alpha-2 code for a country name or common alias."""
+    return _COUNTRY_LOOKUP.get(normalize_name(country), default)
+
+
+def get_emirate_code(emirate):
+    """PEPPOL subdivision code (AUH, DXB, ...) for an emirate name, or None."""
+    return EMIRATE_CODES.get(normalize_name(emirate))
+
+
+def get_vat_category_code(label):
+    """PEPPOL VAT category code (S, Z, E, AE, O, N) for a label, or None when unknown."""
+    return VAT_CATEGORY_CODES.get(normalize_label(label))
+
@@ -0,0 +1,99 @@
+"""
+Cache for Flick GET responses that change rarely (participant, subscription,
+token verification, PEPPOL lookups), keyed by company and path.
+
+A response is served from Redis for its endpoint's TTL. After that, one with
+an ETag is revalidated with If-None-Match, and a 304 makes the cached copy
+fresh again without a body. 404 answers are cached for NEGATIVE_TTL, so
+repeated lookups of unknown PEPPOL IDs stay off the network.
+"""
+
+import math
+import time
+
+import frappe
+from uae_erpgulf.uae_erpgulf.serialization import loads
+
+
+# Seconds a response is used without asking Flick; site config uae_flick_cache_ttls overrides per key
+CACHE_TTLS = {
+    "default": 300,
+    "auth": 60,
+    "participant": 300,
+    "webhook": 300,
+    "lookup": 86400,
+}
+NEGATIVE_TTL = 3600  # seconds a 404 is remembered
+REVALIDATE_WINDOW = 86400  # seconds an expired response with an ETag is kept for revalidation
+CACHEABLE_STATUSES = (200, 404)
+
+
+class CachedResponse:
+    """The parts of a requests.Response the callers use, as stored in the cache."""
+
+    def __init__(self, status_code, content, etag=None, from_cache=False):
+        self.status_code = status_code
+        self.content = content
+        self.etag = etag
+        self.from_cache = from_cache
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8", "replace")
+
+    def json(self):
+        return loads(self.content)
+
+
+def get_ttl(endpoint):
+    overrides = frappe.conf.get("uae_flick_cache_ttls") or {}
+    return overrides.get(endpoint) or CACHE_TTLS.get(endpoint) or CACHE_TTLS["default"]
+
+
+def _key(company, path):
+    return f"uae_flick_response|{company}|{path}"
+
+
+def cached_get(client, path, endpoint="default", refresh=False, **kwargs):
+    """GET through the cache; refresh=True skips a fresh copy but still revalidates with its ETag."""
+    key = _key(client.company, path)
+    # expires=True: read Redis, not a per-request copy that set_value(expires_in_sec=...) never updates
+    entry = frappe.cache.get_value(key, expires=True)
+    now = time.time()
+
+    if entry and not refresh and now < entry["fresh_until"]:
+        return CachedResponse(entry["status_code"], entry["content"], entry["etag"], from_cache=True)
+
+    headers = dict(kwargs.pop("headers", None) or {})
+    if entry and entry["etag"]:
+        headers["If-None-Match"] = entry["etag"]
+    response = client.get(path, endpoint=endpoint, headers=headers, **kwargs)
+
+    if response.status_code == 304 and entry:
+        status_code, content, etag = entry["status_code"], entry["content"], entry["etag"]
+        from_cache = True
+    elif response.status_code in CACHEABLE_STATUSES:
+        status_code, content, etag = response.status_code, response.content, response.headers.get("ETag")
+        from_cache = False
+    else:
+        return CachedResponse(response.status_code, response.content)
+
+    ttl = get_ttl(endpoint) if status_code == 200 else NEGATIVE_TTL
+    frappe.cache.set_value(
+        key,
+        {"status_code": status_code, "content": content, "etag": etag, "fresh_until": now + ttl},
+        expires_in_sec=math.ceil(ttl + (REVALIDATE_WINDOW if etag else 0)),
+    )
+    return CachedResponse(status_code, content, etag, from_cache=from_cache)
+
+
+def clear_cached(company, path):
+    frappe.cache.delete_value(_key(company, path))
+
+
+def set_if_changed(doc, fieldname, value):
+    """Writes one field of doc only when its value differs, without running save() and its hooks."""
+    if (doc.get(fieldname) or "") == (value or ""):
+        return False
+    doc.db_set(fieldname, value)
+    return True
@@ -0,0 +1,266 @@
+from collections import namedtuple
+
+import frappe
+from frappe import _
+from uae_erpgulf.uae_erpgulf.prefetch import iter_invoice_contexts
+from uae_erpgulf.uae_erpgulf.reference_data import ALLOWED_DESCRIPTION_CODES, get_vat_category_code
+
+
+Rule = namedtuple("Rule", ["code", "scope", "check", "message", "when", "doctypes"])
+
+ALL_DOCTYPES = ("Sales Invoice", "Purchase Invoice")
+DEEMED_SUPPLY = "X1XXXXX : Deemed supply transaction"
+OUT_OF_SCOPE = "O - Not subject to VAT"
+ITEM_TYPE_CODES = {"G - Goods": ("custom_hs_code_",), "S - Services": ("custom_sac_code",),
+                   "B - Both": ("custom_hs_code_", "custom_sac_code")}
+
+
+def rule(code, scope, check, message, when=None, doctypes=ALL_DOCTYPES):
+    """Declares one IBR / BR-AE rule. check(context, facts[, item]) returns True when the invoice complies."""
+    return Rule(code, scope, check, message, when, doctypes)
+
+
+def _has_address(context, facts):
+    return bool(context.address)
+
+
+def _due_date_applies(context, facts):
+    return not facts.is_credit_note and not facts.is_deemed and (context.invoice.outstanding_amount or 0) > 0
+
+
+def _item_vat_category(context, item):
+    template = context.item_tax_templates.get(item.item_tax_template) if item.item_tax_template else None
+    return (template and template.custom_vat_category) or context.invoice.custom_vat_category
+
+
+def _vat_category_known(context, facts, item):
+    vat_category = _item_vat_category(context, item)
+    return not vat_category or get_vat_category_code(vat_category) is not None
+
+
+def _classification_present(context, facts, item):
+    return all(item.get(field) for field in ITEM_TYPE_CODES.get(item.custom_item_type_codes, ()))
+
+
+RULES = (
+    # Document level
+    rule("UAE-ENABLED", "invoice",
+         lambda c, f: c.company and c.company.custom_uae_einvoice_enabled == 1,
+         "UAE E-invoicing not Enabled....pls enable to submit PEPPOL"),
+    rule("UAE-SUBMIT-TO-FTA", "invoice",
+         lambda c, f: c.invoice.custom_submit_to_fta == 1,
+         "Submit to FTA not Enabled....pls enable to submit PEPPOL",
+         doctypes=("Purchase Invoice",)),
+    rule("IBT-005", "invoice",
+         lambda c, f: bool(f.currency),
+         "Invoice currency code (IBT-005) is mandatory"),
+    rule("IBT-005-ISO", "invoice",
+         lambda c, f: len(f.currency) == 3 and f.currency.isalpha(),
+         "Invoice currency code must be a valid ISO 4217 alpha-3 code",
+         when=lambda c, f: bool(f.currency)),
+    rule("IBT-007", "invoice",
+         lambda c, f: bool(c.invoice.conversion_rate),
+         "Currency exchange rate is mandatory when invoice currency is not AED",
+         when=lambda c, f: f.currency != "AED"),
+    rule("IBT-009", "invoice",
+         lambda c, f: bool(c.invoice.due_date),
+         "Payment Due Date (IBT-009) is mandatory when Outstanding Amount > 0",
+         when=_due_date_applies),
+    rule("IBR-127-ae", "invoice",
+         lambda c, f: c.invoice.due_date >= c.invoice.posting_date,
+         "Payment Due Date must be equal to or after the Issue Date",
+         when=lambda c, f: _due_date_applies(c, f) and c.invoice.due_date and c.invoice.posting_date),
+    rule("IBG-14-CODE", "invoice",
+         lambda c, f: bool(f.description_code),
+         "Please select a Frequency of Billing (Invoice Period Description Code)",
+         when=lambda c, f: c.invoice.posting_date and c.invoice.due_date),
+    rule("IBG-14-CODE-LIST", "invoice",
+         lambda c, f: f.description_code in ALLOWED_DESCRIPTION_CODES,
+         "Invalid Invoice Period Description Code: {description_code}",
+         when=lambda c, f: bool(f.description_code)),
+    rule("IBG-14-START", "invoice",
+         lambda c, f: bool(c.invoice.posting_date),
+         "Invoice Period Start Date is mandatory when End Date is provided",
+         when=lambda c, f: bool(c.invoice.due_date)),
+    rule("IBG-14-SUMMARY", "invoice",
+         lambda c, f: c.invoice.posting_date and c.invoice.due_date and f.description_code,
+         "Invoice Period (Start Date, End Date and Frequency) is mandatory for Summary Invoices",
+         when=lambda c, f: f.is_deemed),
+    rule("IBR-160-ae", "invoice",
+         lambda c, f: bool(c.invoice.custom_invoice_note),
+         "Invoice Note (IBT-022) is mandatory when Frequency of Billing is 'OTH'",
+         when=lambda c, f: f.description_code == "OTH"),
+    # Receiving party
+    rule("IBG-08", "invoice",
+         _has_address,
+         "{party_label} address not found"),
+    rule("IBR-007", "invoice",
+         lambda c, f: bool(f.party_name),
+         "IBR-007: Legal name (IBT-044) MUST be provided"),
+    rule("IBR-144-ae-LINE1", "invoice",
+         lambda c, f: bool(c.address.address_line1),
+         "IBR-144-ae: Address line 1 (IBT-050) MUST be provided",
+         when=_has_address),
+    rule("IBR-144-ae-CITY", "invoice",
+         lambda c, f: bool(c.address.city),
+         "IBR-144-ae: City (IBT-052) MUST be provided",
+         when=_has_address),
+    rule("IBR-144-ae-EMIRATE", "invoice",
+         lambda c, f: bool(c.address.emirate),
+         "IBR-144-ae: Country subdivision / Emirate (IBT-054) MUST be provided",
+         when=_has_address),
+    rule("IBT-053", "invoice",
+         lambda c, f: bool(c.address.pincode),
+         "postal zone MUST be provided",
+         when=_has_address),
+    rule("IBR-008", "invoice",
+         lambda c, f: bool(c.address.country),
+         "IBR-008: Country code (IBT-055) MUST be provided",
+         when=_has_address),
+    rule("IBR-011", "invoice",
+         lambda c, f: bool(c.address.email_id),
+         "IBR-011: Electronic email id (IBT-049) MUST be provided",
+         when=_has_address),
+    rule("IBR-136-ae", "invoice",
+         lambda c, f: bool(c.party.custom_trade_license_number),
+         "IBR-136-ae: Legal registration identifier (IBT-047) MUST be present for Credit Note or Out of Scope invoice",
+         when=lambda c, f: f.is_credit_note or f.is_out_of_scope,
+         doctypes=("Sales Invoice",)),
+    rule("IBR-136-ae", "invoice",
+         lambda c, f: bool(c.party.custom_trade_license_number),
+         "IBR-136-ae: Legal registration identifier (IBT-047) MUST be present for Credit Note or Out of Scope invoice",
+         when=lambda c, f: f.is_credit_note,
+         doctypes=("Purchase Invoice",)),
+    rule("IBR-135-ae", "invoice",
+         lambda c, f: c.party.tax_id or c.party.custom_trade_license_number,
+         "IBR-135-ae: Either VAT identifier (IBT-048) or legal identifier (IBT-046) MUST be present",
+         when=lambda c, f: not f.is_export),
+    rule("IBT-047", "invoice",
+         lambda c, f: bool(c.party.custom_trade_license_number),
+         "custom_trade_license_number is mandatory when legal registartion is  Commercial/Trade license",
+         when=lambda c, f: c.party.custom_legal_registration_identifier_type == "Commercial/Trade license"),
+    rule("PEPPOL-ID", "invoice",
+         lambda c, f: c.peppol_lookup != "Not Registered",
+         "PEPPOL ID {peppol_id} of the {party_label} is not registered on the PEPPOL network",
+         when=lambda c, f: bool(f.peppol_id)),
+    rule("IBR-007-ae", "invoice",
+         lambda c, f: bool(c.party.custom_fz_beneficiary_id),
+         "IBR-007-ae: FZ Beneficiary ID (BTAE-01) MUST be provided for Free Trade Zone transaction",
+         when=lambda c, f: f.is_ftz),
+    # Invoice lines
+    rule("IBR-129-ae", "item",
+         lambda c, f, item: item.qty > 0,
+         "Invoiced quantity must be greater than zero for item {item_name}",
+         when=lambda c, f: not f.is_credit_note),
+    rule("IBT-158-TYPE", "item",
+         lambda c, f, item: bool(item.custom_item_type_codes),
+         "Item type (Goods / Services / Both) missing for item {item_name}"),
+    rule("IBT-158", "item",
+         _classification_present,
+         "HS/SAC code missing for item {item_name} ({item_type})"),
+    rule("IBT-151-TEMPLATE", "item",
+         lambda c, f, item: bool(item.item_tax_template),
+         "Item {item_name} must have an Item Tax Template because other items have one.",
+         when=lambda c, f: f.any_item_tax_template),
+    rule("IBT-151", "item",
+         _vat_category_known,
+         "Invalid VAT Category: {vat_category}. Must be one of S, Z, E, AE, O, N."),
+)
+
+
+def compile_rules(rules):
+    """Groups the rule table into per-doctype (invoice_rules, item_rules) tuples evaluated in one pass."""
+    compiled = {}
+    for doctype in ALL_DOCTYPES:
+        applicable = [r for r in rules if doctype in r.doctypes]
+        compiled[doctype] = (
+            tuple(r for r in applicable if r.scope == "invoice"),
+            tuple(r for r in applicable if r.scope == "item"),
+        )
+    return compiled
+
+
+COMPILED_RULES = compile_rules(RULES)
+
+
+def get_invoice_facts(context):
+    """Values several rules branch on, derived once per invoice."""
+    invoice = context.invoice
+    raw_transaction_code = (invoice.custom_invoice_transaction_type_code or "").strip()
+    transaction_code = raw_transaction_code.split(":")[0].strip() if raw_transaction_code else None
+
+    return frappe._dict(
+        party_label=context.spec.party_doctype,
+        party_name=(context.party or {}).get(context.spec.party_name_field),
+        peppol_id=((context.party or {}).get("custom_peppol_id") or "").strip(),
+        currency=invoice.currency or "",
+        description_code=invoice.custom_frequency_billing_code_list,
+        transaction_code=transaction_code,
+        is_credit_note=invoice.is_return == 1,
+        is_out_of_scope=invoice.custom_vat_category == OUT_OF_SCOPE,
+        is_deemed=raw_transaction_code == DEEMED_SUPPLY,
+        is_export=transaction_code == "XXXXXXX1",
+        is_ftz=bool(transaction_code and transaction_code.startswith("1")),
+        any_item_tax_template=any(item.item_tax_template for item in invoice.lines),
+    )
+
+
+def collect_violations(context):
+    """Evaluates every applicable rule once and returns all violation messages, in rule order."""
+    invoice_rules, item_rules = COMPILED_RULES[context.doctype]
+    facts = get_invoice_facts(context)
+    violations = []
+
+    for r in invoice_rules:
+        if r.when and not r.when(context, facts):
+            continue
+        if not r.check(context, facts):
+            violations.append(_(r.message).format(**facts))
+
+    active_item_rules = [r for r in item_rules if not r.when or r.when(context, facts)]
+    for item in context.invoice.lines:
+        for r in active_item_rules:
+            if not r.check(context, facts, item):
+                violations.append(
+                    _(r.message).format(
+                        item_name=item.item_name,
+                        item_type=item.custom_item_type_codes,
+                        vat_category=_item_vat_category(context, item),
+                        **facts,
+                    )
+                )
+
+    return violations
+
+
+def validate_invoice(context):
+    """Throws every violation of the invoice at once."""
+    violations = collect_violations(context)
+    if violations:
+        frappe.throw("<br>".join(violations), title=_("UAE E-Invoice Validation"))
+
+
+@frappe.whitelist()
+def validate_invoices(names: list | str, doctype: str = "Sales Invoice"):
+    """Validate-only pre-check of many invoices; nothing is generated, attached or sent."""
+    if isinstance(names, str):
+        names = frappe.parse_json(names)
+    if doctype not in ALL_DOCTYPES:
+        frappe.throw(_("UAE E-Invoicing is not supported for {0}").format(doctype))
+    frappe.has_permission(doctype, "read", throw=True)
+
+    valid = []
+    invalid = {}
+
+    for name, context, error in iter_invoice_contexts(doctype, names):
+        violations = [error] if error else collect_violations(context)
+        if violations:
+            invalid[name] = violations
+        else:
+            valid.append(name)
+
+    return {
+        "checked": len(names),
+        "valid": valid,
+        "invalid": invalid,
+    }
@@ -0,0 +1,111 @@
+"""
+JSON encoding for e-invoice payloads and Flick responses.
+
+Wire and storage use compact JSON, through orjson when it is importable
+(Frappe ships it) and the standard library otherwise. Pretty-printing is only
+done on demand, for display. Stored text can optionally be zlib-compressed by
+setting uae_einvoice_compress_stored_json in the site config.
+"""
+
+import base64
+import json
+import zlib
+
+import frappe
+from frappe import _
+from frappe.utils import cint
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional accelerated backend
+    orjson = None
+
+
+BACKEND = "orjson" if orjson else "json"
+
+# Marks stored text holding base64 of zlib-compressed JSON
+COMPRESSED_PREFIX = "zlib:"
+# Smaller texts are stored as plain compact JSON even when compression is on
+DEFAULT_COMPRESS_THRESHOLD = 2048
+COMPRESS_LEVEL = 6
+
+
+def dumps_bytes(obj):
+    """Compact UTF-8 JSON bytes, as sent on the wire."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=str, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False, default=str).encode("utf-8")
+
+
+def dumps(obj):
+    """Compact JSON text."""
+    if orjson is not None:
+        return dumps_bytes(obj).decode("utf-8")
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def loads(data):
+    """Parses JSON text or bytes."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def pretty(obj):
+    """Indented JSON for display only; accepts a value, JSON text or stored (compressed) text."""
+    if isinstance(obj, (str, bytes)):
+        obj = load_stored(obj)
+    return json.dumps(obj, indent=4, ensure_ascii=False, default=str)
+
+
+def compression_enabled():
+    return bool(cint(frappe.conf.get("uae_einvoice_compress_stored_json", 0)))
+
+
+def pack(obj, compress=None):
+    """
+    Text to store in a Long Text field or log: compact JSON, or the compressed
+    form when compression is enabled and the text is large enough to benefit.
+    """
+    text = obj if isinstance(obj, str) else dumps(obj)
+    if compress is None:
+        compress = compression_enabled()
+    threshold = cint(frappe.conf.get("uae_einvoice_compress_threshold", DEFAULT_COMPRESS_THRESHOLD))
+    if not compress or len(text) < threshold:
+        return text
+    packed = zlib.compress(text.encode("utf-8"), COMPRESS_LEVEL)
+    return COMPRESSED_PREFIX + base64.b64encode(packed).decode("ascii")
+
+
+def unpack(stored):
+    """Inverse of pack: the stored text with any compression removed."""
+    if isinstance(stored, bytes):
+        stored = stored.decode("utf-8")
+    if stored and stored.startswith(COMPRESSED_PREFIX):
+        packed = base64.b64decode(stored[len(COMPRESSED_PREFIX):])
+        return zlib.decompress(packed).decode("utf-8")
+    return stored
+
+
+def load_stored(stored):
+    """Parses text written by pack (compressed or not), or by older versions with indent=4."""
+    text = unpack(stored)
+    if not text:
+        return None
+    return loads(text)
+
+
+@frappe.whitelist()
+def get_stored_json(doctype: str, name: str, fieldname: str = "custom_submit_response"):
+    """Pretty-printed content of a stored JSON field, for display."""
+    if fieldname not in ("custom_submit_response", "custom_document_status_response", "submit_response"):
+        frappe.throw(_("Field {0} does not hold a stored UAE E-Invoice response").format(fieldname))
+    frappe.has_permission(doctype, "read", doc=name, throw=True)
+
+    stored = frappe.db.get_value(doctype, name, fieldname)
+    if not stored:
+        return None
+    try:
+        return pretty(stored)
+    except (ValueError, zlib.error):
+        return unpack(stored)
@@ -0,0 +1,169 @@
+"""
+Offline spool for invoice submissions made while Flick is unreachable.
+
+send_einvoice spools the built payload instead of failing when the request
+could not reach Flick (circuit breaker open, connection error or timeout).
+drain_spool runs every minute: for each base URL with queued entries it sends
+the oldest one as a probe while the breaker is not closed, and once Flick
+answers it fans the rest out to uae_einvoice_spool_concurrency drain jobs.
+"""
+
+import frappe
+import requests
+from frappe import _
+from frappe.utils import add_to_date, cint, now_datetime
+from uae_erpgulf.uae_erpgulf.circuit_breaker import CircuitBreaker, CircuitOpen
+from uae_erpgulf.uae_erpgulf.rate_limiter import RateLimitExceeded
+from uae_erpgulf.uae_erpgulf.serialization import load_stored, pack
+
+
+SPOOL_DOCTYPE = "UAE E-Invoice Spool"
+SENDERS = {
+    "Sales Invoice": "uae_erpgulf.uae_erpgulf.test.send_einvoice",
+    "Purchase Invoice": "uae_erpgulf.uae_erpgulf.send_purchase.send_einvoice",
+}
+# Failures where Flick never received the invoice, so sending it again later cannot duplicate it
+SPOOLABLE_ERRORS = (CircuitOpen, RateLimitExceeded, requests.exceptions.ConnectionError)
+DEFAULT_CONCURRENCY = 4
+DRAIN_LIMIT = 500  # entries one drain job sends before handing over to the next run
+STALE_SENDING_MINUTES = 15
+
+
+def spool_invoice(doctype, doc, invoice_json, error=None):
+    """Queues the invoice's payload for later submission and marks the invoice Queued."""
+    base_url = (frappe.get_cached_value("Company", doc.company, "custom_base_url") or "").rstrip("/")
+    existing = frappe.db.get_value(
+        SPOOL_DOCTYPE,
+        {"reference_doctype": doctype, "reference_name": doc.name, "status": ["in", ["Queued", "Sending"]]},
+        ["name", "attempts"],
+        as_dict=True,
+    )
+    values = {
+        "status": "Queued",
+        "base_url": base_url,
+        "payload": pack(invoice_json),
+        "last_error": str(error or "")[:1000],
+    }
+
+    if existing:
+        values["attempts"] = cint(existing.attempts) + 1
+        frappe.db.set_value(SPOOL_DOCTYPE, existing.name, values, update_modified=False)
+    else:
+        frappe.get_doc(
+            dict(
+                values,
+                doctype=SPOOL_DOCTYPE,
+                reference_doctype=doctype,
+                reference_name=doc.name,
+                company=doc.company,
+                attempts=0,
+            )
+        ).insert(ignore_permissions=True)
+
+    doc.db_set("custom_uae_einvoice_status", "Queued")
+    frappe.db.commit()  # nosemgrep: frappe-manual-commit
+
+    frappe.msgprint(
+        _("Flick is unreachable. Invoice {0} was queued and will be submitted automatically.").format(doc.name),
+        indicator="orange",
+    )
+
+
+def claim_next(base_url):
+    """Moves the oldest Queued entry of the base URL to Sending; concurrent drain jobs skip each other's rows."""
+    rows = frappe.db.sql(
+        """
+        select name from `tabUAE E-Invoice Spool`
+        where status = 'Queued' and base_url = %s
+        order by creation
+        limit 1
+        for update skip locked
+        """,
+        base_url,
+    )
+    if not rows:
+        frappe.db.commit()  # nosemgrep: frappe-manual-commit
+        return None
+
+    frappe.db.set_value(
+        SPOOL_DOCTYPE, rows[0][0], {"status": "Sending", "last_attempt": now_datetime()}, update_modified=False
+    )
+    frappe.db.commit()  # nosemgrep: frappe-manual-commit
+    return frappe.get_doc(SPOOL_DOCTYPE, rows[0][0])
+
+
+def send_spooled(entry):
+    """Submits one claimed entry. Returns False when it went back to the spool because Flick is still down."""
+    invoice = frappe.get_doc(entry.reference_doctype, entry.reference_name)
+    if invoice.docstatus != 1:
+        entry.db_set({"status": "Failed", "last_error": _("Invoice is not submitted")})
+        frappe.db.commit()  # nosemgrep: frappe-manual-commit
+        return True
+
+    frappe.get_attr(SENDERS[entry.reference_doctype])(invoice, load_stored(entry.payload))
+
+    if frappe.db.get_value(SPOOL_DOCTYPE, entry.name, "status") == "Queued":
+        return False
+
+    invoice_status = frappe.db.get_value(entry.reference_doctype, entry.reference_name, "custom_uae_einvoice_status")
+    if invoice_status == "Success":
+        entry.db_set({"status": "Sent", "last_error": None})
+    else:
+        entry.db_set({
+            "status": "Failed",
+            "attempts": cint(entry.attempts) + 1,
+            "last_error": _("Flick did not accept the invoice (status {0})").format(invoice_status),
+        })
+    frappe.db.commit()  # nosemgrep: frappe-manual-commit
+    return True
+
+
+def drain_base_url(base_url, limit=DRAIN_LIMIT):
+    """Background job: sends queued entries of one base URL until the spool is empty or Flick fails again."""
+    breaker = CircuitBreaker(base_url)
+    for _ in range(limit):
+        if breaker.is_open():
+            break
+        entry = claim_next(base_url)
+        if not entry or not send_spooled(entry):
+            break
+
+
+def release_stale_entries():
+    """Entries left in Sending by a drain job that died go back to the queue."""
+    stale = frappe.get_all(
+        SPOOL_DOCTYPE,
+        filters={
+            "status": "Sending",
+            "last_attempt": ["<", add_to_date(now_datetime(), minutes=-STALE_SENDING_MINUTES)],
+        },
+        pluck="name",
+    )
+    for name in stale:
+        frappe.db.set_value(SPOOL_DOCTYPE, name, "status", "Queued", update_modified=False)
+
+
+def drain_spool():
+    """Scheduler entry point: probes each base URL that has queued entries and fans out the drain."""
+    release_stale_entries()
+    concurrency = cint(frappe.conf.get("uae_einvoice_spool_concurrency")) or DEFAULT_CONCURRENCY
+
+    base_urls = frappe.get_all(SPOOL_DOCTYPE, filters={"status": "Queued"}, pluck="base_url", distinct=True)
+    for base_url in base_urls:
+        breaker = CircuitBreaker(base_url)
+        if breaker.is_open():
+            continue
+        if breaker.state() != "closed":
+            # Half-open: the oldest entry is the probe; the rest waits until it gets through
+            entry = claim_next(base_url)
+            if not entry or not send_spooled(entry) or breaker.state() != "closed":
+                continue
+
+        for index in range(concurrency):
+            frappe.enqueue(
+                "uae_erpgulf.uae_erpgulf.spool.drain_base_url",
+                queue="long",
+                job_id=f"uae_einvoice_spool_drain|{base_url}|{index}",
+                deduplicate=True,
+                base_url=base_url,
+            )
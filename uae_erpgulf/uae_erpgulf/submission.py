@@ -0,0 +1,85 @@
+"""
+Background submission of invoices to Flick.
+
+The on_submit hooks still build and validate the payload, so validation
+messages show at submit time, but the Flick round trip, the XML / PDF
+downloads and the success log run on a worker. The payload is written to the
+UAE E-Invoice Outbox in the submit transaction (outbox.py), the invoice is
+marked Queued, and outbox.deliver is enqueued after commit; when a delivery
+finishes, the new status is pushed to open forms with frappe.publish_realtime
+(event uae_einvoice_status).
+
+Jobs go to the uae_einvoice queue when the bench defines a worker for it
+(common_site_config "workers": {"uae_einvoice": {"timeout": 600}}) and to
+"long" otherwise; site config uae_einvoice_submit_queue picks another queue.
+Set uae_einvoice_async_submit to 0 to submit inline again.
+"""
+
+import frappe
+from frappe import _
+from frappe.utils import cint
+
+
+DEFAULT_QUEUE = "uae_einvoice"
+FALLBACK_QUEUE = "long"
+STANDARD_QUEUES = ("short", "default", "long")
+JOB_TIMEOUT = 600  # seconds; Flick submit plus XML / PDF downloads
+REALTIME_EVENT = "uae_einvoice_status"
+
+
+def is_async():
+    return bool(cint(frappe.conf.get("uae_einvoice_async_submit", 1)))
+
+
+def get_submit_queue():
+    queue = frappe.conf.get("uae_einvoice_submit_queue") or DEFAULT_QUEUE
+    if queue in STANDARD_QUEUES or queue in (frappe.conf.get("workers") or {}):
+        return queue
+    return FALLBACK_QUEUE
+
+
+def queue_einvoice(doc, build):
+    """on_submit path: builds and validates the payload now and leaves the Flick call to a worker."""
+    try:
+        invoice_json = build(doc.name)
+    except Exception:
+        frappe.log_error(frappe.get_traceback(), "UAE eInvoice Submit Error")
+        frappe.msgprint(_("E-Invoice processing failed. Check Submit Response field."))
+        return
+
+    enqueue_submission(doc, invoice_json)
+    frappe.msgprint(_("Invoice queued for UAE E-Invoice submission."), indicator="blue", alert=True)
+
+
+def enqueue_submission(doc, invoice_json):
+    """Records the payload in the outbox, marks the invoice Queued and delivers it once the transaction commits."""
+    from uae_erpgulf.uae_erpgulf.outbox import add_to_outbox
+
+    name = add_to_outbox(doc, invoice_json)
+    doc.db_set("custom_uae_einvoice_status", "Queued")
+    frappe.enqueue(
+        "uae_erpgulf.uae_erpgulf.outbox.deliver",
+        queue=get_submit_queue(),
+        timeout=JOB_TIMEOUT,
+        enqueue_after_commit=True,
+        job_id=f"uae_einvoice_outbox|{name}",
+        deduplicate=True,
+        name=name,
+    )
+
+
+def publish_status(doctype, name):
+    status = frappe.db.get_value(
+        doctype, name, ["custom_uae_einvoice_status", "custom_reporting_status"], as_dict=True
+    ) or {}
+    frappe.publish_realtime(
+        REALTIME_EVENT,
+        {
+            "doctype": doctype,
+            "name": name,
+            "status": status.get("custom_uae_einvoice_status"),
+            "reporting_status": status.get("custom_reporting_status"),
+        },
+        doctype=doctype,
+        docname=name,
+    )
@@ -1,84 +1,33 @@
 
 
 import frappe
-import json
 import requests
 from frappe import _
-from datetime import timedelta
-from datetime import datetime
-import pytz
-from uae_erpgulf.uae_erpgulf.json_einvoice import send_invoice_json
-from uae_erpgulf.uae_erpgulf.verify_token import get_valid_flick_token
+from uae_erpgulf.uae_erpgulf.json_einvoice import build_uae_invoice_json, build_uae_invoice_json_many
+from uae_erpgulf.uae_erpgulf.invoice_payload import attach_invoice_json, get_payload_hash
+from uae_erpgulf.uae_erpgulf.serialization import pack
+from uae_erpgulf.uae_erpgulf.credentials import get_credentials
+from uae_erpgulf.uae_erpgulf.flick_client import FlickClient
+from uae_erpgulf.uae_erpgulf.spool import SPOOLABLE_ERRORS, spool_invoice
+from uae_erpgulf.uae_erpgulf.submission import is_async, queue_einvoice
 from uae_erpgulf.uae_erpgulf.attach import get_document_xml
 from uae_erpgulf.uae_erpgulf.attach import get_document_pdf
 from uae_erpgulf.uae_erpgulf.validation import success_log
 
-def send_invoice_to_flick(doc, method=None):
+def send_invoice_to_flick(doc, invoice_json=None):
     """
-    On Sales Invoice Submit and after JSON generation then submission to Flick API
+    Submits the Sales Invoice payload to Flick API, straight from memory
+    (built here unless the caller already has it)
     """
 
     try:
-        files = frappe.get_all(
-            "File",
-            filters={
-                "attached_to_doctype": "Sales Invoice",
-                "attached_to_name": doc.name
-            },
-            fields=["file_url", "file_name"]
-        )
-        json_file = None
-        for f in files:
-            if f.file_name.lower().endswith(".json"):
-                json_file = f
-                break
-
-        if not json_file:
-            frappe.throw(_("No JSON attachment found."))
-        file_doc = frappe.get_doc("File", {"file_url": json_file.file_url})
-        file_path = file_doc.get_full_path()
-
-        with open(file_path, "r", encoding="utf-8") as f: # nosemgrep: frappe-security-file-traversal
-            json_data = json.load(f)
-        company_doc = frappe.get_doc("Company", doc.company)
-        participant_id = company_doc.custom_participant_id
+        json_data = invoice_json if invoice_json is not None else build_uae_invoice_json(doc.name)
+        client = FlickClient.for_company(doc.company)
+        client.require_participant()
         payload = {
             "document": json_data
         }
-        base_url = company_doc.custom_base_url
-        url =  f"{base_url}/v1/{participant_id}/documents"
-        # frappe.throw(_(url))
-        auth_key = company_doc.custom_xflickauthkey
-        
-        access_token = get_valid_flick_token(company_doc.name)
-
-        if not participant_id:
-            frappe.throw(_("Participant ID is missing in Company"))
-
-        # Case 1: Use X-Flick Auth Key
-        if auth_key:
-            headers = {
-                "Content-Type": "application/json",
-                "X-Flick-Auth-Key": auth_key
-            }
-
-        # Case 2: Fallback to Access Token
-        elif access_token:
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {access_token}"
-            }
-
-        # Case 3: Neither available
-        else:
-            frappe.throw(_("Both X-Flick Auth Key and Access Token are missing in Company"))
-       
-        response = requests.post(
-            url,
-            headers=headers,
-            json=payload,
-            timeout=120
-        )
+        response = client.post(client.participant_path("/documents"), endpoint="submit", json=payload)
 
         try:
             response_data = response.json()
@@ -132,6 +81,8 @@ def send_invoice_to_flick(doc, method=None):
     
         
         return response.status_code, response_data
+    except SPOOLABLE_ERRORS:
+        raise
     except Exception:
         frappe.log_error(frappe.get_traceback(), "Flick API Error")
         frappe.throw(_("Error while sending invoice to Flick API."))
@@ -153,14 +104,47 @@ def generate_and_send_einvoice(doc: Union[Document, str], method: Optional[str]
     if doc.doctype != "Sales Invoice":
         return
 
+    if method == "on_submit" and is_async():
+        queue_einvoice(doc, build_uae_invoice_json)
+        return
+
+    send_einvoice(doc)
+
+
+def send_einvoice(doc, invoice_json=None, spool=True):
+    """
+    Builds the invoice JSON (unless a prebuilt payload is passed), submits it to
+    Flick from memory and stores the response on the invoice. The JSON
+    attachment is written separately by attach_invoice_json. With spool=False,
+    transport failures and read timeouts are raised to the caller (the outbox)
+    instead of spooled. Returns the HTTP status of the submission, if one was made.
+    """
     try:
-        json_response = send_invoice_json(doc.name)
+        if invoice_json is None:
+            invoice_json = build_uae_invoice_json(doc.name)
 
-        if not json_response:
+        if not invoice_json:
             frappe.throw(_("Failed to generate eInvoice JSON"))
-        status_code, response_data = send_invoice_to_flick(doc)
+
+        # The exact same payload was already accepted: resubmitting would only create a duplicate
+        if (
+            doc.custom_uae_einvoice_status == "Success"
+            and doc.get("custom_uae_payload_hash") == get_payload_hash(invoice_json)
+        ):
+            frappe.msgprint(_("Invoice unchanged since its successful submission; not sent again."))
+            return
+
+        attach_invoice_json("Sales Invoice", doc.name, invoice_json)
+        try:
+            status_code, response_data = send_invoice_to_flick(doc, invoice_json)
+        except SPOOLABLE_ERRORS as e:
+            if not spool:
+                raise
+            # Flick is unreachable: keep the payload and let the spool drain submit it
+            spool_invoice("Sales Invoice", doc, invoice_json, e)
+            return
         if isinstance(response_data, dict):
-            response_text = json.dumps(response_data, indent=4)
+            response_text = pack(response_data)
         else:
             response_text = str(response_data)
         
@@ -180,30 +164,35 @@ def generate_and_send_einvoice(doc: Union[Document, str], method: Optional[str]
                     
             else:
                 invoice_status = "Success"
+        elif status_code == 429:
+            # Still throttled after the client's own retries; bulk resubmission picks it up again
+            invoice_status = "Rate Limited"
         # Save 
         
         doc.db_set("custom_submit_response", response_text)
-        if status_code == 200:
-            get_document_xml("Sales Invoice",doc.name)
-            get_document_pdf("Sales Invoice",doc.name)
         doc.db_set("custom_uae_einvoice_status", invoice_status)
         if reporting_status:
             doc.db_set("custom_reporting_status", reporting_status)
         if document_id:
             doc.db_set("custom_document_id", document_id)
         frappe.db.commit()
+        if status_code == 200:
+            # Flick has the invoice now: a failed download must not make it look unsent
+            try:
+                get_document_xml("Sales Invoice", doc.name)
+                get_document_pdf("Sales Invoice", doc.name)
+            except Exception:
+                frappe.log_error(frappe.get_traceback(), "UAE E-Invoice Document Download Error")
         exchange_status = None
 
         if isinstance(response_data, dict):
             data = response_data.get("data", {})
             exchange_status = data.get("exchange_status")
         if status_code == 200:
-            company_doc = frappe.get_doc("Company", doc.company)
-            
             success_log(
                 title="UAE E-Invoice Submitted Successfully",
                 document_id=document_id,
-                participant_id=company_doc.custom_participant_id,
+                participant_id=get_credentials(doc.company).custom_participant_id,
                 invoice_number=doc.name,
                 reporting_status=reporting_status,
                 exchange_status=exchange_status,
@@ -213,8 +202,15 @@ def generate_and_send_einvoice(doc: Union[Document, str], method: Optional[str]
         # frappe.msgprint(
         #     _("Flick Response Stored. Status: {0}").format(invoice_status)
         # )
-
-    except Exception:
+        return status_code
+
+    except SPOOLABLE_ERRORS:
+        # Only reaches here with spool=False
+        raise
+    except Exception as e:
+        # The request went out but got no answer: the outbox must not send it blindly again
+        if not spool and isinstance(e, requests.exceptions.ReadTimeout):
+            raise
         frappe.log_error(frappe.get_traceback(), "UAE eInvoice Submit Error")
 
         frappe.msgprint(
@@ -231,33 +227,64 @@ def bulk_send_invoices(invoices: list | str):
     success = []
     skipped = []
     failed = []
+    to_send = []
+
+    rows = {
+        row.name: row
+        for row in frappe.get_all(
+            "Sales Invoice",
+            filters={"name": ["in", invoices]},
+            fields=["name", "company", "docstatus", "custom_uae_einvoice_status"],
+        )
+    }
+    enabled_companies = set(
+        frappe.get_all(
+            "Company",
+            filters={
+                "name": ["in", list({row.company for row in rows.values()})],
+                "custom_uae_einvoice_enabled": 1,
+            },
+            pluck="name",
+        )
+    )
 
     for invoice in invoices:
-        try:
-            # Load documents
-            doc = frappe.get_doc("Sales Invoice", invoice)
-            company_doc = frappe.get_doc("Company", doc.company)
-
-            status = doc.custom_uae_einvoice_status
-
-            # Skip already submitted invoices
-            if status == "Success":
-                skipped.append(invoice)
-                continue
-
-            # If invoice is Draft → Submit first
-            if doc.docstatus == 0 and company_doc.custom_uae_einvoice_enabled == 1:
-                doc.submit()
+        row = rows.get(invoice)
+        if not row:
+            failed.append(f"{invoice} : " + _("Sales Invoice {0} not found").format(invoice))
+            continue
+
+        # Skip already submitted invoices
+        if row.custom_uae_einvoice_status == "Success":
+            skipped.append(invoice)
+            continue
+
+        if row.company not in enabled_companies:
+            continue
+
+        # If invoice is Draft → Submit first (on_submit sends it to FTA)
+        if row.docstatus == 0:
+            try:
+                frappe.get_doc("Sales Invoice", invoice).submit()
                 success.append(invoice)
-
-            # If invoice is Submitted → Send to FTA
-            elif doc.docstatus == 1 and company_doc.custom_uae_einvoice_enabled == 1:
-                generate_and_send_einvoice(doc)
-                success.append(invoice)
-
+            except Exception as e:
+                frappe.log_error(frappe.get_traceback(), f"FTA Bulk Submission Error: {invoice}")
+                failed.append(f"{invoice} : {str(e)}")
+
+        # If invoice is Submitted → Send to FTA, with the payloads built in batches
+        elif row.docstatus == 1:
+            to_send.append(invoice)
+
+    for result in build_uae_invoice_json_many(to_send):
+        if result.error:
+            failed.append(f"{result.name} : {result.error}")
+            continue
+        try:
+            send_einvoice(frappe.get_doc("Sales Invoice", result.name), result.payload)
+            success.append(result.name)
         except Exception as e:
-            frappe.log_error(frappe.get_traceback(), f"FTA Bulk Submission Error: {invoice}")
-            failed.append(f"{invoice} : {str(e)}")
+            frappe.log_error(frappe.get_traceback(), f"FTA Bulk Submission Error: {result.name}")
+            failed.append(f"{result.name} : {str(e)}")
 
     return {
         "success": success,
@@ -0,0 +1,320 @@
+"""
+Flick OAuth access tokens, shared by every worker through Redis.
+
+A token is cached per Company for the lifetime Flick reports (expires_in).
+Once less than uae_flick_token_renew_before seconds of it remain, the next
+caller renews it while everyone else keeps using the current one. A missing
+or expired token is requested by a single caller holding a Redis lock; the
+others wait for its result instead of requesting their own. The token is also
+written to the Company, for display and as a fallback when the cache is empty.
+
+prewarm_tokens runs every minute and renews the tokens of all e-invoicing
+companies shortly before the lazy renewal would, with random jitter, so the
+submit path finds a warm token. Its failures are logged on the first miss of
+a streak and kept in Redis for get_token_states.
+
+Refresh and wait times are recorded with the HTTP metrics (endpoints
+token:refresh and token:wait).
+"""
+
+import math
+import random
+import time
+import uuid
+from datetime import timedelta
+
+import frappe
+from frappe import _
+from frappe.utils import cint, get_datetime, now_datetime
+from redis.exceptions import RedisError
+from uae_erpgulf.uae_erpgulf.flick_client import FlickClient
+from uae_erpgulf.uae_erpgulf.metrics import MetricsRecorder
+from uae_erpgulf.uae_erpgulf.response_cache import clear_cached
+
+
+DEFAULT_LIFETIME = 3600  # seconds, when the token response has no expires_in
+DEFAULT_RENEW_BEFORE = 300  # seconds before expiry a token is renewed
+LOCK_TIMEOUT = 30  # seconds a refresh may hold the lock
+WAIT_TIMEOUT = 20  # seconds a caller waits for another caller's refresh
+POLL_INTERVAL = 0.05
+PREWARM_AHEAD = 120  # seconds before the renewal point the pre-warmer renews
+PREWARM_JITTER = 60  # up to this many more seconds, drawn per company and run
+MAX_PREWARM_BACKOFF = 30  # minutes between retries of a failing company
+
+# KEYS: lock; ARGV: owner. Deletes the lock only when this caller still holds it.
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def _token_key(company):
+    return f"uae_flick_token|{company}"
+
+
+def _status_key(company):
+    return f"uae_flick_token_status|{company}"
+
+
+def _lock_key(company):
+    return frappe.cache.make_key(f"uae_flick_token_lock|{company}")
+
+
+def get_renew_before(lifetime):
+    renew_before = cint(frappe.conf.get("uae_flick_token_renew_before")) or DEFAULT_RENEW_BEFORE
+    return min(renew_before, lifetime / 2)
+
+
+def get_cached_token(company):
+    """The cached entry ({access_token, expires_at, renew_at, fetched_at}, epoch seconds) or None."""
+    try:
+        # expires=True reads Redis every time: set_value with expires_in_sec does not
+        # update the per-request copy, which would hide other callers' refreshes
+        return frappe.cache.get_value(_token_key(company), expires=True)
+    except RedisError:
+        return None
+
+
+def cache_token(company, access_token, lifetime, fetched_at=None):
+    fetched_at = fetched_at or time.time()
+    entry = {
+        "access_token": access_token,
+        "fetched_at": fetched_at,
+        "expires_at": fetched_at + lifetime,
+        "renew_at": fetched_at + lifetime - get_renew_before(lifetime),
+    }
+    try:
+        frappe.cache.set_value(_token_key(company), entry, expires_in_sec=max(math.ceil(lifetime), 1))
+    except RedisError:
+        pass
+    return entry
+
+
+def load_stored_token(company):
+    """Seeds the cache from the token stored on the Company while it is still valid."""
+    stored = frappe.db.get_value(
+        "Company", company, ["custom_access_token", "custom_token_expiry_time"], as_dict=True
+    )
+    if not stored or not stored.custom_access_token or not stored.custom_token_expiry_time:
+        return None
+    remaining = (get_datetime(stored.custom_token_expiry_time) - now_datetime()).total_seconds()
+    if remaining <= 0:
+        return None
+    return cache_token(company, stored.custom_access_token, remaining)
+
+
+def fetch_token(company):
+    """Requests a new token with the Company's client credentials and caches it."""
+    company_doc = frappe.get_doc("Company", company)
+    if not company_doc.custom_base_url or not company_doc.custom_client_id or not company_doc.custom_client_secret:
+        frappe.throw(_("Please enter Base URL, Client ID and Client Secret in Company."))
+
+    payload = {
+        "grant_type": "client_credentials",
+        "client_id": company_doc.custom_client_id,
+        "client_secret": company_doc.custom_client_secret,
+    }
+    response = FlickClient(company_doc).post("/v1/oauth/token", endpoint="auth", json=payload, auth=False)
+    response.raise_for_status()
+    response_json = response.json()
+
+    access_token = response_json.get("access_token")
+    if not access_token:
+        frappe.throw(_("Access token not found in response"))
+    lifetime = cint(response_json.get("expires_in")) or DEFAULT_LIFETIME
+
+    entry = cache_token(company, access_token, lifetime)
+    frappe.db.set_value(
+        "Company",
+        company,
+        {
+            "custom_access_token": access_token,
+            "custom_token_expiry_time": now_datetime() + timedelta(seconds=lifetime),
+        },
+        update_modified=False,
+    )
+    # A cached verification belongs to the previous token
+    clear_cached(company, "/v1/auth/verify")
+    return entry
+
+
+class TokenLock:
+    """Redis lock of one Company's token refresh."""
+
+    def __init__(self, company):
+        self.key = _lock_key(company)
+        self.owner = uuid.uuid4().hex
+        self.redis = frappe.cache
+
+    def acquire(self):
+        """True when acquired, False when another caller holds it, None when Redis is unavailable."""
+        try:
+            return bool(self.redis.execute_command("SET", self.key, self.owner, "NX", "PX", LOCK_TIMEOUT * 1000))
+        except RedisError:
+            return None
+
+    def is_held(self):
+        try:
+            return bool(self.redis.execute_command("EXISTS", self.key))
+        except RedisError:
+            return False
+
+    def release(self):
+        try:
+            self.redis.register_script(RELEASE_SCRIPT)(keys=[self.key], args=[self.owner])
+        except RedisError:
+            pass
+
+
+def _timed(company, template, fn):
+    metrics = MetricsRecorder(company)
+    started = time.perf_counter()
+    status = "error"
+    try:
+        result = fn()
+        status = "ok"
+        return result
+    finally:
+        metrics.record("TOKEN", template, status, (time.perf_counter() - started) * 1000)
+
+
+def _refresh_holding_lock(company, lock, force, requested_at):
+    try:
+        entry = get_cached_token(company)
+        # Another caller may have refreshed between our read and taking the lock
+        if entry and time.time() < entry["renew_at"] and (not force or entry["fetched_at"] >= requested_at):
+            return entry
+        return _timed(company, "token:refresh", lambda: fetch_token(company))
+    finally:
+        lock.release()
+
+
+def _wait_for_refresh(company, lock, requested_at):
+    """Waits for the lock holder's refresh. Returns its entry, or None when the lock came free without one."""
+    deadline = time.monotonic() + WAIT_TIMEOUT
+    while lock.is_held():
+        if time.monotonic() > deadline:
+            frappe.throw(_("Timed out waiting for the Flick access token refresh"))
+        time.sleep(POLL_INTERVAL)
+
+    entry = get_cached_token(company)
+    if entry and entry["fetched_at"] >= requested_at and time.time() < entry["expires_at"]:
+        return entry
+    return None
+
+
+def refresh_token(company, force=False):
+    """Single-flight refresh: one caller requests a token, concurrent callers get the same one."""
+    requested_at = time.time()
+    lock = TokenLock(company)
+    while True:
+        acquired = lock.acquire()
+        if acquired is None:
+            return _timed(company, "token:refresh", lambda: fetch_token(company))
+        if acquired:
+            return _refresh_holding_lock(company, lock, force, requested_at)
+
+        entry = _timed(company, "token:wait", lambda: _wait_for_refresh(company, lock, requested_at))
+        if entry:
+            return entry
+
+
+def get_access_token(company, force=False):
+    """A valid access token of the Company, renewed ahead of expiry."""
+    if force:
+        return refresh_token(company, force=True)["access_token"]
+
+    entry = get_cached_token(company) or load_stored_token(company)
+    now = time.time()
+    if entry and now < entry["renew_at"]:
+        return entry["access_token"]
+
+    if entry and now < entry["expires_at"]:
+        # Still valid: renew only when no one else is, and keep the current token if renewal fails
+        lock = TokenLock(company)
+        if not lock.acquire():
+            return entry["access_token"]
+        try:
+            return _refresh_holding_lock(company, lock, False, now)["access_token"]
+        except Exception:
+            frappe.log_error(frappe.get_traceback(), "Flick Token Renewal Error")
+            return entry["access_token"]
+
+    return refresh_token(company)["access_token"]
+
+
+def get_prewarm_companies():
+    """E-invoicing companies that authenticate with client credentials rather than an auth key."""
+    return frappe.get_all(
+        "Company",
+        filters={
+            "custom_uae_einvoice_enabled": 1,
+            "custom_base_url": ["is", "set"],
+            "custom_client_id": ["is", "set"],
+            "custom_client_secret": ["is", "set"],
+            "custom_xflickauthkey": ["is", "not set"],
+        },
+        pluck="name",
+    )
+
+
+def needs_prewarm(entry, status, now):
+    if status and not status.get("ok"):
+        backoff = min(2 ** (status.get("failures", 1) - 1), MAX_PREWARM_BACKOFF) * 60
+        if now < status["failed_at"] + backoff:
+            return False
+    if not entry:
+        return True
+    return now >= entry["renew_at"] - PREWARM_AHEAD - random.uniform(0, PREWARM_JITTER)
+
+
+def prewarm_token(company):
+    """Renews one company's token unless another caller is already doing it. Returns the new status or None."""
+    now = time.time()
+    status = frappe.cache.get_value(_status_key(company))
+    if not needs_prewarm(get_cached_token(company) or load_stored_token(company), status, now):
+        return None
+
+    lock = TokenLock(company)
+    acquired = lock.acquire()
+    if acquired is False:
+        return None
+    try:
+        if acquired:
+            entry = _refresh_holding_lock(company, lock, True, now)
+        else:
+            entry = _timed(company, "token:refresh", lambda: fetch_token(company))
+        new_status = {"ok": True, "refreshed_at": entry["fetched_at"], "expires_at": entry["expires_at"]}
+    except Exception as e:
+        failures = status["failures"] + 1 if status and not status.get("ok") else 1
+        new_status = {"ok": False, "failed_at": now, "failures": failures, "error": str(e)}
+        if failures == 1:
+            frappe.log_error(frappe.get_traceback(), f"Flick Token Pre-warm Error: {company}")
+
+    frappe.cache.set_value(_status_key(company), new_status)
+    return new_status
+
+
+def prewarm_tokens():
+    """Scheduled every minute: keeps a valid token cached for every e-invoicing company."""
+    for company in get_prewarm_companies():
+        prewarm_token(company)
+    frappe.db.commit()  # nosemgrep: frappe-manual-commit
+
+
+@frappe.whitelist()
+def get_token_states():
+    """Token expiry and last pre-warm result of every e-invoicing company."""
+    frappe.only_for("System Manager")
+
+    states = {}
+    for company in get_prewarm_companies():
+        entry = get_cached_token(company) or {}
+        states[company] = {
+            "cached": bool(entry),
+            "expires_in": max(round(entry["expires_at"] - time.time()), 0) if entry else None,
+            "prewarm": frappe.cache.get_value(_status_key(company)),
+        }
+    return states
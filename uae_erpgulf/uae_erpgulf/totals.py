@@ -0,0 +1,120 @@
+from dataclasses import dataclass
+from decimal import Decimal, ROUND_HALF_UP
+
+
+CENT = Decimal("0.01")
+HUNDRED = Decimal(100)
+ZERO = Decimal(0)
+
+
+def to_decimal(value):
+    """Converts a stored float / int / string to Decimal exactly once, via its shortest repr."""
+    if isinstance(value, Decimal):
+        return value
+    return Decimal(str(value or 0))
+
+
+def round_amount(value):
+    return value.quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def format_amount(value):
+    return str(round_amount(value))
+
+
+@dataclass(frozen=True)
+class InvoiceTotals:
+    """All monetary totals of one invoice, computed by TotalsAccumulator.finish."""
+
+    currency: str
+    line_extension_amount: Decimal
+    tax_exclusive_amount: Decimal
+    tax_inclusive_amount: Decimal
+    discount_amount: Decimal
+    allowance_total_amount: Decimal
+    charge_total_amount: Decimal
+    payable_amount: Decimal
+    payable_rounding_amount: Decimal
+    lines_net_amount: Decimal
+    lines_tax_amount: Decimal
+
+    def legal_monetary_total(self):
+        """IBG-22 document totals, derived from the invoice header amounts."""
+        return {
+            "line_extension_amount": format_amount(self.line_extension_amount),
+            "tax_exclusive_amount": format_amount(self.tax_exclusive_amount),
+            "tax_inclusive_amount": format_amount(self.tax_inclusive_amount),
+            "allowance_total_amount": format_amount(self.allowance_total_amount),
+            "charge_total_amount": format_amount(self.charge_total_amount),
+            "prepaid_amount": 0,
+            "payable_rounding_amount": float(self.payable_rounding_amount),
+            "payable_amount": float(round_amount(self.payable_amount)),
+            "currency_id": self.currency,
+        }
+
+    def invoice_totals(self):
+        """Totals summed from the invoice lines."""
+        lines_total = self.lines_net_amount + self.lines_tax_amount
+        return {
+            "line_extension_amount": format_amount(self.lines_net_amount),
+            "tax_exclusive_amount": format_amount(self.lines_net_amount - self.discount_amount),
+            "tax_inclusive_amount": format_amount(lines_total),
+            "allowance_total_amount": format_amount(self.allowance_total_amount),
+            "payable_amount": format_amount(lines_total),
+            "currency_id": self.currency,
+        }
+
+
+class TotalsAccumulator:
+    """Sums the invoice lines while they are built, then derives every total in one pass."""
+
+    __slots__ = ("net", "tax")
+
+    def __init__(self):
+        self.net = ZERO
+        self.tax = ZERO
+
+    def add_line(self, item, tax_rate):
+        """Adds one invoice line and returns its line extension amount (qty × rate, excluding VAT)."""
+        net = to_decimal(item.amount)
+        self.net += net
+        self.tax += net * to_decimal(tax_rate) / HUNDRED
+        return format_amount(to_decimal(item.qty) * to_decimal(item.rate))
+
+    def finish(self, invoice, charge_field="base_change_amount"):
+        """
+        Builds the immutable InvoiceTotals. The header amounts depend on whether
+        the first tax row is included in the print rate, exactly as the former
+        get_line_extension_amount / get_tax_exc / get_tax_inclusive / get_payable_amount did.
+        """
+        taxes = invoice.taxes
+        included_in_print_rate = bool(taxes and taxes[0].included_in_print_rate)
+        tax_rate = to_decimal(taxes[0].rate) if taxes else ZERO
+        discount = to_decimal(invoice.get("discount_amount"))
+
+        if included_in_print_rate:
+            base_net_total = to_decimal(invoice.base_net_total)
+            line_extension = abs(base_net_total + discount) if discount else abs(base_net_total)
+            tax_exclusive = abs(base_net_total)
+            taxable = base_net_total - discount
+        else:
+            total = to_decimal(invoice.total)
+            line_extension = abs(total)
+            tax_exclusive = abs(total - discount)
+            taxable = total - discount
+
+        tax_inclusive = round_amount(tax_exclusive + abs(taxable * tax_rate / HUNDRED))
+
+        return InvoiceTotals(
+            currency=invoice.currency,
+            line_extension_amount=line_extension,
+            tax_exclusive_amount=tax_exclusive,
+            tax_inclusive_amount=tax_inclusive,
+            discount_amount=discount,
+            allowance_total_amount=abs(discount),
+            charge_total_amount=abs(to_decimal(invoice.get(charge_field))),
+            payable_amount=tax_inclusive,
+            payable_rounding_amount=ZERO,
+            lines_net_amount=self.net,
+            lines_tax_amount=self.tax,
+        )
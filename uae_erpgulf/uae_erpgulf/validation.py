@@ -1,6 +1,7 @@
 
 import frappe
 from frappe import _
+from uae_erpgulf.uae_erpgulf.serialization import pack
 
 def validate_accredited_service_provider(doc, method=None):
     company_doc = frappe.get_doc("Company", doc.company)
@@ -44,7 +45,7 @@ def success_log(
                 "exchange_status": exchange_status,
                 "status": status,
                 "submit_response": (
-                    frappe.as_json(submit_response)
+                    pack(submit_response)
                     if isinstance(submit_response, (dict, list))
                     else submit_response
                 ),
@@ -1,14 +1,15 @@
 
 
 import frappe
-import http.client
 import json
 import requests
 # from pydoc import doc
 from frappe import _
 # from datetime import now_datetime
-from frappe.utils import now_datetime 
-import pytz
+from uae_erpgulf.uae_erpgulf.flick_client import FlickClient
+from uae_erpgulf.uae_erpgulf.response_cache import cached_get, set_if_changed
+from uae_erpgulf.uae_erpgulf.serialization import load_stored, pack
+from uae_erpgulf.uae_erpgulf.token_cache import get_access_token
 
 
 
@@ -18,36 +19,18 @@ def verify_flick_token(company:str):
 
     doc = frappe.get_doc("Company", company)
 
-    base_url = doc.custom_base_url
-    auth_key = doc.custom_xflickauthkey
-
-    if not base_url :
+    if not doc.custom_base_url :
         frappe.throw(_("Please enter Base URL ."))
-    access_token = doc.custom_access_token
-    if auth_key:
-        headers = {
-            "X-Flick-Auth-Key": auth_key
-        }
-
-    # Case 2: Fallback to Access Token
-    elif access_token:
-        headers = {
-            "Authorization": f"Bearer {access_token}"
-        }
-
-    # Case 3: Neither available
-    else:
-        frappe.throw(_("Both X-Flick Auth Key and Access Token are missing in Company"))
+    client = FlickClient.for_company(company)
+    headers = client.auth_headers(refresh_token=False)
     try:
-        url = f"{base_url}/v1/auth/verify"
-        response = requests.get(url, headers=headers)
+        response = cached_get(client, "/v1/auth/verify", endpoint="auth", auth=False, headers=headers)
        
         try:
             response_text = json.dumps(response.json())  # compact clean JSON string
         except Exception:
             response_text = response.text 
-        doc.custom_token_response = response_text # nosemgrep: frappe-monkey-patching-not-allowed
-        doc.save(ignore_permissions=True)
+        set_if_changed(doc, "custom_token_response", response_text)
         return {
             "status": "success",
             "response": response_text
@@ -64,35 +47,14 @@ def verify_flick_token(company:str):
 def get_participant_details(company:str):
     """Fetch participant details from Flick API and save response in Company DocType"""
     company_doc = frappe.get_doc("Company", company)
-    base_url = company_doc.custom_base_url
-    if not base_url:
+    if not company_doc.custom_base_url:
         frappe.throw(_("Please enter Base URL and X-Flick-Auth-Key in Company."))
-    participant_id = company_doc.custom_participant_id
-    auth_key = company_doc.custom_xflickauthkey
-    if not participant_id:
-        frappe.throw(_("Participant ID is missing in Company"))
-    
-    url = f"{base_url}/v1/participants/{participant_id}"
-    access_token = get_valid_flick_token(company_doc.name)
-    if auth_key:
-        headers = {
-            "X-Flick-Auth-Key": auth_key
-        }
-
-    # Case 2: Fallback to Access Token
-    elif access_token:
-        headers = {
-            "Authorization": f"Bearer {access_token}"
-        }
-
-    # Case 3: Neither available
-    else:
-        frappe.throw(_("Both X-Flick Auth Key and Access Token are missing in Company"))
+    client = FlickClient.for_company(company)
+    participant_id = client.require_participant()
 
-    response = requests.get(url, headers=headers)
+    response = cached_get(client, f"/v1/participants/{participant_id}", endpoint="participant")
     data = response.json()
-    company_doc.custom_participant_details_response = json.dumps(data)
-    company_doc.save(ignore_permissions=True)
+    set_if_changed(company_doc, "custom_participant_details_response", json.dumps(data))
     return {
         "status": "success",
         "response": data
@@ -100,51 +62,11 @@ def get_participant_details(company:str):
 
 
 
-from frappe.utils import get_datetime, now_datetime
-from datetime import timedelta
-
-
 @frappe.whitelist(allow_guest=False)
 def get_flick_access_token(company:str):
-    """Fetch access token from Flick API using Client ID and Client Secret stored in Company DocType"""
-    doc = frappe.get_doc("Company", company)
-    base_url = doc.custom_base_url
-    client_id = doc.custom_client_id
-    if not base_url or not client_id or not doc.custom_client_secret:
-        frappe.throw(_("Please enter Base URL, Client ID and Client Secret in Company."))
-    client_secret = doc.custom_client_secret
-    url = f"{base_url}/v1/oauth/token"
-    headers = {
-        "Content-Type": "application/json"
-    }
-    
-    payload = {
-        "grant_type": "client_credentials",
-        "client_id": client_id,
-        "client_secret": client_secret
-    }
-
+    """Fetch a new access token from Flick API using Client ID and Client Secret stored in Company DocType"""
     try:
-        response = requests.post(url, headers=headers, json=payload)
-        response.raise_for_status()  # raises error for bad responses
-        response_json = response.json()
-        # frappe.msgprint(f"Token Response: {response_json}")
-        access_token = response_json.get("access_token")
-
-        if not access_token:
-            frappe.throw(_("Access token not found in response"))
-          # default 1 hour
-        dubai_tz = pytz.timezone("Asia/Dubai")
-        current_time = now_datetime().astimezone(dubai_tz)
-
-        # ✅ Store ACTUAL expiry
-        expiry_time = current_time + timedelta(hours=1)
-
-        doc.db_set("custom_access_token", access_token)
-        doc.db_set("custom_token_expiry_time", expiry_time)
-
-
-        frappe.db.commit()
+        access_token = get_access_token(company, force=True)
         return {"access_token": access_token}
 
     except requests.exceptions.RequestException as e:
@@ -155,92 +77,47 @@ def get_flick_access_token(company:str):
 
 
 def get_valid_flick_token(company):
-    company_doc = frappe.get_doc("Company", company)
-
-    current_time = now_datetime()
-    expiry_time = get_datetime(company_doc.custom_token_expiry_time)
-
-    # ✅ If token is valid → return it
-    if (
-        company_doc.custom_access_token
-        and expiry_time
-        and current_time < expiry_time
-    ):
-        return company_doc.custom_access_token
-
-    # ❌ Token expired → fetch new
-    response = get_flick_access_token(company)
-
-    access_token = response.get("access_token")
+    """Cached access token of the Company, renewed before it expires (see token_cache.py)."""
+    return get_access_token(company)
+
+def save_document_status(doc, response_json):
+    """Stores a Flick document status response and its reporting status on the invoice."""
+    data = response_json.get("data", {})
+    reporting_status = data.get("reporting_status")
+    doc.db_set(
+        "custom_document_status_response",
+        pack(response_json)
+    )
+    if reporting_status:
+        doc.db_set(
+            "custom_reporting_status",
+            reporting_status)
 
-    if not access_token:
-        frappe.throw(_("Failed to refresh access token"))
-
-    return access_token
 
 @frappe.whitelist()
 def get_document_status(invoice_name: str):
     """Fetch document status from Flick API and save response in Sales Invoice DocType"""
     try:
         sales_invoice_doc = frappe.get_doc("Sales Invoice", invoice_name)
-        company_doc = frappe.get_doc("Company", sales_invoice_doc.company)
-
-        participant_id = company_doc.custom_participant_id
-        auth_key = company_doc.custom_xflickauthkey
-
-        if not participant_id:
-            frappe.throw(_("Participant ID is missing in Company"))
+        client = FlickClient.for_company(sales_invoice_doc.company)
+        client.require_participant()
 
 
         if not sales_invoice_doc.custom_submit_response:
             frappe.throw(_("Submit response not found in Sales Invoice"))
 
         # Extract document ID
-        response_data = json.loads(sales_invoice_doc.custom_submit_response)
+        response_data = load_stored(sales_invoice_doc.custom_submit_response)
         document_id = response_data.get("data", {}).get("id")
 
         if not document_id:
             frappe.throw(_("Document ID not found in submit response"))
-        base_url = company_doc.custom_base_url
-        if not base_url:
-            frappe.throw(_("Base URL is missing in Company"))
-        url = f"{base_url}/v1/{participant_id}/documents/{document_id}"
-
-        access_token = get_valid_flick_token(company_doc.name)
-        if auth_key:
-            headers = {
-                "X-Flick-Auth-Key": auth_key
-            }
-
-        # Case 2: Fallback to Access Token
-        elif access_token:
-            headers = {
-                "Authorization": f"Bearer {access_token}"
-            }
-
-        # Case 3: Neither available
-        else:
-            frappe.throw(_("Both X-Flick Auth Key and Access Token are missing in Company"))
-        # headers = {
-        #     "X-Flick-Auth-Key": auth_key
-        # }
-
-        response = requests.get(url, headers=headers)
+        response = client.get(client.participant_path(f"/documents/{document_id}"), endpoint="status")
 
       
         if response.status_code == 200:
             response_json = response.json()
-            data = response_json.get("data", {})
-            reporting_status = data.get("reporting_status")
-            sales_invoice_doc.db_set(
-                "custom_document_status_response",
-                json.dumps(response_json)
-            )
-            if reporting_status:
-                sales_invoice_doc.db_set(
-                    "custom_reporting_status",
-                    reporting_status)
-                
+            save_document_status(sales_invoice_doc, response_json)
             return response_json
 
         else:
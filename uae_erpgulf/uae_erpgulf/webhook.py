@@ -1,10 +1,10 @@
 import frappe
-import requests
 import json
 from frappe import _
 from frappe.utils import get_datetime, now_datetime
 from datetime import timedelta
-from uae_erpgulf.uae_erpgulf.verify_token import get_valid_flick_token
+from uae_erpgulf.uae_erpgulf.flick_client import FlickClient
+from uae_erpgulf.uae_erpgulf.response_cache import cached_get, set_if_changed
 
 
 @frappe.whitelist(allow_guest=True)# nosemgrep: frappe-semgrep-rules.rules.security.guest-whitelisted-method
@@ -115,29 +115,9 @@ def update_webhook_logs():
 @frappe.whitelist(allow_guest=False)
 def register_flick_webhook(company: str = None):
     company_doc = frappe.get_doc("Company", company)
-    base_url = company_doc.custom_base_url
-    url = f"{base_url}/v1/webhooks/subscriptions"
-    participant_id = company_doc.custom_participant_id
-    
-
-    access_token = get_valid_flick_token(company_doc.name)
-    if company_doc.custom_xflickauthkey :
-        headers = {
-            "Content-Type": "application/json",
-            "X-Flick-Auth-Key": company_doc.custom_xflickauthkey 
-        }
-
-    # Case 2: Fallback to Access Token
-    elif access_token:
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {access_token}"
-        }
+    client = FlickClient.for_company(company)
+    participant_id = client.participant_id
 
-    # Case 3: Neither available
-    else:
-        frappe.throw(_("Both X-Flick Auth Key and Access Token are missing in Company"))
-        
     endpoint = frappe.utils.get_url(
         "/api/method/uae_erpgulf.uae_erpgulf.webhook.flick_webhook_listener"
         )
@@ -156,7 +136,7 @@ def register_flick_webhook(company: str = None):
         "participant_ids": [participant_id]
     }
 
-    response = requests.post(url, headers=headers, json=payload)
+    response = client.post("/v1/webhooks/subscriptions", endpoint="webhook", json=payload)
 
     # Log response for debugging
     # frappe.log_error(
@@ -182,68 +162,29 @@ def register_flick_webhook(company: str = None):
 def custom_get_subscription(company: str = None):
     company_doc = frappe.get_doc("Company", company)
 
-    base_url = company_doc.custom_base_url
     uuid = company_doc.custom_uuid_of_webhook  # you must store this when creating webhook
 
     if not uuid:
         frappe.throw(_("Webhook UUID not found. Please create subscription first."))
 
-    url = f"{base_url}/v1/webhooks/subscriptions/{uuid}"
-    access_token = get_valid_flick_token(company_doc.name)
-    if company_doc.custom_xflickauthkey :
-        headers = {
-            "X-Flick-Auth-Key": company_doc.custom_xflickauthkey 
-        }
-
-    # Case 2: Fallback to Access Token
-    elif access_token:
-        headers = {
-            "Authorization": f"Bearer {access_token}"
-        }
-
-    # Case 3: Neither available
-    else:
-        frappe.throw(_("Both X-Flick Auth Key and Access Token are missing in Company"))
-    
-
-    response = requests.get(url, headers=headers)
+    client = FlickClient.for_company(company)
+    response = cached_get(client, f"/v1/webhooks/subscriptions/{uuid}", endpoint="webhook")
 
     try:
         response_data = response.json()
     except Exception:
         response_data = {"raw_response": response.text}
 
-    company_doc.custom_get_subscription_response = json.dumps(response_data)
-    company_doc.save(ignore_permissions=True)
+    set_if_changed(company_doc, "custom_get_subscription_response", json.dumps(response_data))
 
     return response_data
 
 @frappe.whitelist()
 def get_webhook_deliveries(company: str = None):
-    company_doc = frappe.get_doc("Company", company)
-
-    base_url = company_doc.custom_base_url
-    uuid = company_doc.custom_uuid_of_webhook
-
-    url = f"{base_url}/v1/webhooks/subscriptions/{uuid}/deliveries"
-    access_token = get_valid_flick_token(company_doc.name)
-    
-    if company_doc.custom_xflickauthkey :
-        headers = {
-            "X-Flick-Auth-Key": company_doc.custom_xflickauthkey 
-        }
-
-    # Case 2: Fallback to Access Token
-    elif access_token:
-        headers = {
-            "Authorization": f"Bearer {access_token}"
-        }
+    uuid = frappe.db.get_value("Company", company, "custom_uuid_of_webhook")
 
-    # Case 3: Neither available
-    else:
-        frappe.throw(_("Both X-Flick Auth Key and Access Token are missing in Company"))
-    
-    response = requests.get(url, headers=headers)
+    client = FlickClient.for_company(company)
+    response = client.get(f"/v1/webhooks/subscriptions/{uuid}/deliveries", endpoint="webhook")
 
     try:
         response_data = response.json()
@@ -252,7 +193,7 @@ def get_webhook_deliveries(company: str = None):
 
     frappe.db.set_value(
         "Company",
-        company_doc.name,
+        company,
         "custom_webhook_delivery_logs",
         json.dumps(response_data),
         update_modified=False